@@ -7,6 +7,7 @@ from datetime import datetime
 from heygen.session_manager import HeyGenSessionManager
 from heygen.config import Config
 from pipecat_integration.heygen_processor import HeyGenFrameProcessor
+from pipecat_integration.session_pool import HeyGenSessionPool
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,15 @@ class ConsoleAvatarChat:
         self.keep_alive_task = None
         self.is_running = False
         self.session_active = False
+        
+        # Пул прогретых сессий (включается через SESSION_POOL_SIZE > 0)
+        self.session_pool = HeyGenSessionPool() if Config.SESSION_POOL_SIZE > 0 else None
+        self.pooled_session = None
+    
+    @property
+    def active_manager(self) -> HeyGenSessionManager:
+        """Менеджер текущей рабочей сессии (собственный или выданный пулом)"""
+        return self.frame_processor.session_manager
     
     def print_welcome(self):
         """Показать приветствие"""
@@ -76,6 +86,9 @@ class ConsoleAvatarChat:
             
         print("\n� Создание рабочей сессии...")
         
+        if self.session_pool:
+            return await self._start_pooled_session()
+        
         try:
             # Сначала очищаем любые зависшие сессии
             await self.session_manager.close_all_active_sessions()
@@ -108,6 +121,28 @@ class ConsoleAvatarChat:
             print(f"❌ Ошибка: {e}")
             return False
 
+    async def _start_pooled_session(self):
+        """Взять готовую сессию из пула"""
+        try:
+            pooled = await self.session_pool.acquire()
+            if not pooled:
+                print("❌ Не удалось получить сессию из пула")
+                return False
+            
+            self.pooled_session = pooled
+            self.frame_processor.attach_session(pooled.session_manager, pooled.livekit_client)
+            self.session_active = True
+            self.current_session_id = pooled.session_id
+            print(f"✅ Сессия готова: {pooled.session_id}")
+            print(f"⏱️  Лимит времени: {pooled.session_manager.session_duration_limit}s")
+            print("\n🎉 Теперь можете отправлять сообщения аватару!")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения сессии из пула: {e}")
+            print(f"❌ Ошибка: {e}")
+            return False
+
     async def stop_session(self):
         """Закрыть текущую рабочую сессию"""
         if not self.session_active:
@@ -117,7 +152,12 @@ class ConsoleAvatarChat:
         print("\n🔒 Закрытие текущей сессии...")
         
         try:
-            if self.session_manager.is_active:
+            if self.pooled_session:
+                await self.session_pool.release(self.pooled_session)
+                self.frame_processor.detach_session(self.session_manager)
+                self.pooled_session = None
+                print("✅ Сессия закрыта")
+            elif self.session_manager.is_active:
                 success = await self.session_manager.close_session()
                 if success:
                     print("✅ Сессия закрыта")
@@ -134,7 +174,7 @@ class ConsoleAvatarChat:
     async def send_message_to_avatar(self, message: str):
         """Отправить сообщение аватару и скачать видео ответ"""
         # Проверяем реальное состояние сессии в менеджере
-        if not hasattr(self.session_manager, 'session_id') or not self.session_manager.session_id:
+        if not self.active_manager.session_id:
             print("❌ Нет активной сессии. Используйте /start для создания сессии.")
             self.session_active = False
             return
@@ -169,11 +209,11 @@ class ConsoleAvatarChat:
         print("-" * 30)
         
         # Синхронизируем состояние с реальным
-        real_active = hasattr(self.session_manager, 'session_id') and self.session_manager.session_id
+        real_active = self.active_manager.session_id
         
         if real_active:
             self.session_active = True
-            self.current_session_id = self.session_manager.session_id
+            self.current_session_id = self.active_manager.session_id
             print(f"🟢 Активная сессия: {self.current_session_id}")
             # Убираем проблемный метод get_remaining_time пока он не реализован
             # remaining = self.session_manager.get_remaining_time()
@@ -237,7 +277,8 @@ class ConsoleAvatarChat:
                 else:
                     prompt = "\n💬 Введите команду: "
                     
-                user_input = input(prompt).strip()
+                # Читаем ввод в отдельном потоке, чтобы фоновые задачи (пул сессий) не блокировались
+                user_input = (await asyncio.to_thread(input, prompt)).strip()
                 
                 if not user_input:
                     continue
@@ -270,6 +311,13 @@ class ConsoleAvatarChat:
         if self.session_active:
             await self.stop_session()
         
+        # Останавливаем пул прогретых сессий
+        if self.session_pool:
+            await self.session_pool.close()
+        
+        # Закрываем общий HTTP клиент менеджера сессий
+        await self.session_manager.close_http_session()
+        
         print("✅ Очистка завершена")
 
     async def run(self):
@@ -277,6 +325,10 @@ class ConsoleAvatarChat:
         try:
             self.print_welcome()
             
+            # Прогреваем сессии заранее, чтобы /start отвечал мгновенно
+            if self.session_pool:
+                await self.session_pool.start()
+            
             print("\n🎉 Готов к работе!")
             print("    Введите /help для списка команд")
             print("    Используйте /start для создания сессии с аватаром")
@@ -21,6 +21,65 @@ class Config:
     IDLE_TIMEOUT = int(os.getenv('IDLE_TIMEOUT', '120'))
     KEEP_ALIVE_INTERVAL = int(os.getenv('KEEP_ALIVE_INTERVAL', '60'))
     
+    # Session Pool Settings (пул заранее подготовленных сессий)
+    SESSION_POOL_SIZE = int(os.getenv('SESSION_POOL_SIZE', '0'))
+    SESSION_POOL_MAX_SIZE = int(os.getenv('SESSION_POOL_MAX_SIZE', '2'))
+    SESSION_POOL_DEMAND_WINDOW = int(os.getenv('SESSION_POOL_DEMAND_WINDOW', '300'))
+    MAX_CONCURRENT_SESSIONS = int(os.getenv('MAX_CONCURRENT_SESSIONS', '3'))
+    
+    # HTTP Client Settings (общий пул соединений к HeyGen API)
+    HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', '100'))
+    HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '10'))
+    HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))
+    HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '30'))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '20'))
+    HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', '30'))
+    
+    # Downloads (скачивание результатов задач параллельными Range-запросами)
+    DOWNLOAD_SEGMENT_MB = int(os.getenv('DOWNLOAD_SEGMENT_MB', '8'))
+    DOWNLOAD_MAX_PARALLEL = int(os.getenv('DOWNLOAD_MAX_PARALLEL', '4'))
+    
+    # Media Workers (обработка кадров и кодирование вне event loop)
+    MEDIA_WORKER_THREADS = int(os.getenv('MEDIA_WORKER_THREADS', '4'))
+    
+    # Frame Queues (очереди кадров между LiveKit и записью)
+    # Политики: drop_oldest, drop_newest, block (без потерь)
+    VIDEO_FRAME_QUEUE_SIZE = int(os.getenv('VIDEO_FRAME_QUEUE_SIZE', '60'))
+    VIDEO_FRAME_QUEUE_POLICY = os.getenv('VIDEO_FRAME_QUEUE_POLICY', 'drop_oldest')
+    AUDIO_FRAME_QUEUE_SIZE = int(os.getenv('AUDIO_FRAME_QUEUE_SIZE', '500'))
+    AUDIO_FRAME_QUEUE_POLICY = os.getenv('AUDIO_FRAME_QUEUE_POLICY', 'block')
+    
+    # Pre-roll: сколько секунд до start_recording вклеивается в запись (0 - отключено)
+    # Включается явно: запись начинается раньше start_recording (например, 1.0)
+    PREROLL_SECONDS = float(os.getenv('PREROLL_SECONDS', '0'))
+    
+    # Вырезать клипы задач из записи сессии после ее завершения
+    EXTRACT_TASK_CLIPS = os.getenv('EXTRACT_TASK_CLIPS', 'false').lower() == 'true'
+    
+    # Длительность сегмента в режиме записи "segmented" (секунды)
+    SEGMENT_DURATION = float(os.getenv('SEGMENT_DURATION', '4'))
+    
+    # Хранилище кадров режима "buffered": бюджет памяти (МБ), сверх него - выгрузка в файл
+    FRAME_STORE_MEMORY_MB = int(os.getenv('FRAME_STORE_MEMORY_MB', '512'))
+    FRAME_STORE_SPILL_DIR = os.getenv('FRAME_STORE_SPILL_DIR', '')
+    
+    # Схлопывание кадров простоя: порог разницы яркости по блокам (0 - отключено)
+    # Включается явно: кадры простоя в записи заменяются повтором предыдущего (например, 2.0)
+    FRAME_DEDUP_THRESHOLD = float(os.getenv('FRAME_DEDUP_THRESHOLD', '0'))
+    
+    # Профиль кодирования видео: realtime-cheap, balanced, archive-small, compat (OpenCV mp4v)
+    # По умолчанию H.264 через FFmpeg libx264; если он недоступен - OpenCV mp4v
+    VIDEO_ENCODER_PROFILE = os.getenv('VIDEO_ENCODER_PROFILE', 'realtime-cheap')
+    
+    # Публикация последнего кадра в разделяемую память для других процессов (пусто - отключено)
+    FRAME_SHM_NAME = os.getenv('FRAME_SHM_NAME', '')
+    FRAME_SHM_SLOTS = int(os.getenv('FRAME_SHM_SLOTS', '3'))
+    
+    # Локальная трансляция аватара зрителям (MJPEG/WebSocket), 0 - отключено
+    VIEWER_HOST = os.getenv('VIEWER_HOST', '127.0.0.1')
+    VIEWER_PORT = int(os.getenv('VIEWER_PORT', '0'))
+    
     @classmethod
     def validate(cls):
         """Проверка обязательных настроек"""
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+from typing import Optional, List, Tuple
+
+import aiohttp
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+class FileWriter:
+    """
+    Запись в файл по смещению без блокировки event loop
+
+    Данные копятся в буфере и пишутся большими блоками в пуле потоков
+    (os.pwrite, поэтому сегменты можно писать параллельно в один файл).
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1024 * 1024):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        # Без os.pwrite (Windows) позиционирование и запись разделяют одну блокировку
+        self._lock = threading.Lock()
+        self.bytes_written = 0
+
+    def _write_at(self, offset: int, data: bytes):
+        if hasattr(os, 'pwrite'):
+            os.pwrite(self._fd, data, offset)
+        else:
+            with self._lock:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                os.write(self._fd, data)
+
+    async def write_at(self, offset: int, data: bytes):
+        await asyncio.to_thread(self._write_at, offset, data)
+        self.bytes_written += len(data)
+
+    async def truncate(self, size: int):
+        await asyncio.to_thread(os.ftruncate, self._fd, size)
+
+    def stream(self, offset: int) -> "BufferedStream":
+        """Последовательная запись с offset через буфер"""
+        return BufferedStream(self, offset)
+
+    async def close(self):
+        if self._fd is not None:
+            await asyncio.to_thread(os.fsync, self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+class BufferedStream:
+    """Буфер последовательной записи одного сегмента"""
+
+    def __init__(self, writer: FileWriter, offset: int):
+        self.writer = writer
+        self.offset = offset
+        self._buffer = bytearray()
+
+    async def write(self, chunk: bytes):
+        self._buffer += chunk
+        if len(self._buffer) >= self.writer.buffer_size:
+            await self.flush()
+
+    async def flush(self):
+        if self._buffer:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            await self.writer.write_at(self.offset, data)
+            self.offset += len(data)
+
+class DownloadState:
+    """Состояние недокачанного файла (<файл>.part.json): размер, версия ресурса, готовые сегменты"""
+
+    def __init__(self, path: str, total_size: int, validator: Optional[str]):
+        self.path = path
+        self.total_size = total_size
+        self.validator = validator
+        self.completed: List[int] = []
+        # Сегменты завершаются параллельно: файл состояния сохраняется по одному
+        self._save_lock = asyncio.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DownloadState"]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            state = cls(path, data["total_size"], data.get("validator"))
+            state.completed = list(data.get("completed", []))
+            return state
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Поврежден файл состояния загрузки {path}: {e}")
+            return None
+
+    def _save(self, completed: List[int]):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "total_size": self.total_size,
+                "validator": self.validator,
+                "completed": completed
+            }, f)
+        os.replace(temp_path, self.path)
+
+    async def mark_completed(self, segment_start: int):
+        self.completed.append(segment_start)
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(self._save, sorted(self.completed))
+            except OSError as e:
+                # Сегмент уже скачан, теряется только возможность докачки после сбоя
+                logger.warning(f"Не удалось сохранить состояние загрузки {self.path}: {e}")
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class RangedDownloader:
+    """
+    Загрузка файла параллельными Range-запросами с возобновлением
+
+    Файл делится на сегменты, которые скачиваются одновременно (не больше
+    max_parallel) через общий пул соединений и пишутся по своим смещениям в
+    <файл>.part. Готовые сегменты отмечаются в <файл>.part.json, поэтому после
+    сбоя повторный вызов докачивает только недостающие. Если сервер не
+    поддерживает Range, файл скачивается одним потоком. Итоговый размер
+    сверяется с заявленным сервером до переименования в output_path.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        segment_size: Optional[int] = None,
+        max_parallel: Optional[int] = None,
+        retries: int = 3,
+        chunk_size: int = 256 * 1024
+    ):
+        self.session = session
+        self.segment_size = segment_size or Config.DOWNLOAD_SEGMENT_MB * 1024 * 1024
+        self.max_parallel = max_parallel or Config.DOWNLOAD_MAX_PARALLEL
+        self.retries = retries
+        self.chunk_size = chunk_size
+        # Для скачивания снимаем общий таймаут, оставляя таймаут чтения
+        self.timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=Config.HTTP_CONNECT_TIMEOUT,
+            sock_read=Config.HTTP_READ_TIMEOUT
+        )
+
+    async def _probe(self, url: str) -> Tuple[Optional[int], bool, Optional[str]]:
+        """
+        Размер файла, поддержка Range и версия ресурса (ETag/Last-Modified)
+
+        Запрос первого байта вместо HEAD: подписанные ссылки на хранилище часто разрешают только GET.
+        """
+        async with self.session.get(url, headers={'Range': 'bytes=0-0'}, timeout=self.timeout) as response:
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            if response.status == 206:
+                match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+                if match and match.group(3) != '*':
+                    return int(match.group(3)), True, validator
+            elif response.status != 200:
+                raise aiohttp.ClientResponseError(
+                    response.request_info, response.history, status=response.status,
+                    message=f"Ошибка скачивания видео: {response.status}"
+                )
+            return response.content_length, False, validator
+
+    def _segments(self, total_size: int) -> List[Tuple[int, int]]:
+        return [
+            (start, min(start + self.segment_size, total_size) - 1)
+            for start in range(0, total_size, self.segment_size)
+        ]
+
+    async def _fetch_segment(self, url: str, writer: FileWriter, start: int, end: int):
+        headers = {'Range': f'bytes={start}-{end}'}
+        async with self.session.get(url, headers=headers, timeout=self.timeout) as response:
+            if response.status != 206:
+                raise aiohttp.ClientPayloadError(f"Ожидался ответ 206 на Range запрос, получен {response.status}")
+
+            stream = writer.stream(start)
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                await stream.write(chunk)
+            await stream.flush()
+
+        received = stream.offset - start
+        if received != end - start + 1:
+            raise aiohttp.ClientPayloadError(f"Сегмент {start}-{end}: получено {received} байт")
+
+    async def _download_segment(self, url: str, writer: FileWriter, state: DownloadState,
+                                segment: Tuple[int, int], semaphore: asyncio.Semaphore):
+        start, end = segment
+        async with semaphore:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    await self._fetch_segment(url, writer, start, end)
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(f"Сегмент {start}-{end}: {e}, повтор {attempt}/{self.retries - 1}")
+                    await asyncio.sleep(attempt)
+        await state.mark_completed(start)
+
+    async def _download_ranged(self, url: str, part_path: str, total_size: int, validator: Optional[str]) -> bool:
+        state_path = f"{part_path}.json"
+        state = DownloadState.load(state_path)
+        if state is None or state.total_size != total_size or state.validator != validator or not os.path.exists(part_path):
+            # Нет состояния или файл на сервере изменился: начинаем заново
+            state = DownloadState(state_path, total_size, validator)
+
+        segments = [s for s in self._segments(total_size) if s[0] not in state.completed]
+        if state.completed:
+            logger.info(f"Возобновление загрузки: готово {len(state.completed)} сегментов, осталось {len(segments)}")
+
+        writer = FileWriter(part_path)
+        try:
+            await writer.truncate(total_size)
+            semaphore = asyncio.Semaphore(self.max_parallel)
+            results = await asyncio.gather(
+                *(self._download_segment(url, writer, state, segment, semaphore) for segment in segments),
+                return_exceptions=True
+            )
+        finally:
+            await writer.close()
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            logger.error(f"❌ Не скачано сегментов: {len(errors)} (первая ошибка: {errors[0]}), "
+                         f"повторный вызов продолжит загрузку")
+            return False
+
+        state.remove()
+        return True
+
+    async def _download_single(self, url: str, part_path: str) -> Optional[int]:
+        """Загрузка одним потоком (сервер без Range); возвращает заявленный размер"""
+        writer = FileWriter(part_path)
+        try:
+            await writer.truncate(0)
+            async with self.session.get(url, timeout=self.timeout) as response:
+                if response.status != 200:
+                    logger.error(f"Ошибка скачивания видео: {response.status}")
+                    return None
+                stream = writer.stream(0)
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await stream.write(chunk)
+                await stream.flush()
+                return response.content_length if response.content_length is not None else stream.offset
+        finally:
+            await writer.close()
+
+    async def download(self, url: str, output_path: str) -> bool:
+        """Скачать url в output_path (True - файл скачан и его размер совпал с заявленным)"""
+        part_path = f"{output_path}.part"
+        try:
+            total_size, ranges, validator = await self._probe(url)
+
+            if ranges and total_size:
+                if not await self._download_ranged(url, part_path, total_size, validator):
+                    return False
+            else:
+                total_size = await self._download_single(url, part_path)
+                if total_size is None:
+                    return False
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.error(f"Ошибка при скачивании видео: {e}")
+            return False
+
+        actual_size = os.path.getsize(part_path)
+        if actual_size != total_size:
+            logger.error(f"❌ Размер файла {actual_size} не совпадает с ожидаемым {total_size}")
+            return False
+
+        os.replace(part_path, output_path)
+        logger.info(f"Видео сохранено: {output_path} ({actual_size / 1024 / 1024:.1f} МБ)")
+        return True
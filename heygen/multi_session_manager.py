@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List
+
+from .config import Config
+from .session_manager import HeyGenSessionManager
+
+logger = logging.getLogger(__name__)
+
+class SessionState:
+    """Состояние одной streaming сессии в HeyGenMultiSessionManager"""
+
+    def __init__(self, manager: HeyGenSessionManager, label: Optional[str] = None):
+        self.manager = manager
+        self.label = label
+        self.opened_at = time.time()
+        self.last_keep_alive = self.opened_at
+        self.last_keep_alive_attempt = self.opened_at
+        self.last_activity = self.opened_at
+        self.keep_alive_failures = 0
+        self.tasks_sent = 0
+
+        limit = manager.session_duration_limit
+        self.expires_at = self.opened_at + limit if limit else None
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return self.manager.session_id
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def next_keep_alive(self, interval: float, retry_interval: float) -> float:
+        """Момент следующего keep-alive: задачи аватару тоже продлевают сессию, неудачный повторяется через retry_interval"""
+        if self.keep_alive_failures:
+            return self.last_keep_alive_attempt + retry_interval
+        return max(self.last_keep_alive, self.last_activity) + interval
+
+    async def send_task(self, text: str, task_type: str = "repeat", task_mode: str = "sync") -> Optional[Dict[str, Any]]:
+        """Отправить задачу аватару этой сессии"""
+        result = await self.manager.send_task(text, task_type, task_mode)
+        if result is not None:
+            self.last_activity = time.time()
+            self.tasks_sent += 1
+        return result
+
+    async def interrupt_task(self) -> bool:
+        """Прервать текущую задачу аватара этой сессии"""
+        return await self.manager.interrupt_task()
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        return {
+            "label": self.label,
+            "age": round(now - self.opened_at, 1),
+            "idle": round(now - self.last_activity, 1),
+            "tasks_sent": self.tasks_sent,
+            "keep_alive_failures": self.keep_alive_failures,
+            "expires_in": round(self.expires_at - now, 1) if self.expires_at else None
+        }
+
+class HeyGenMultiSessionManager:
+    """
+    Одновременная работа со многими streaming сессиями HeyGen
+
+    В отличие от HeyGenSessionManager (одна сессия, close_all_active_sessions
+    закрывает все остальные), каждая сессия получает свой SessionState, а
+    общими остаются HTTP клиент с пулом соединений и один планировщик
+    keep-alive для всех сессий. Число одновременных сессий ограничено квотой
+    (MAX_CONCURRENT_SESSIONS): запросы сверх нее ждут в очереди (FIFO), пока
+    другая сессия не будет закрыта.
+
+    Пример:
+        manager = HeyGenMultiSessionManager()
+        async with manager.session(label="user-42") as state:
+            await state.send_task("Привет!")
+        await manager.close()
+    """
+
+    # После стольких неудачных keep-alive подряд сессия считается потерянной
+    MAX_KEEP_ALIVE_FAILURES = 3
+
+    def __init__(self, api_key: str = None, max_concurrent: int = None, keep_alive_interval: float = None):
+        self.api_key = api_key or Config.HEYGEN_API_KEY
+        self.max_concurrent = Config.MAX_CONCURRENT_SESSIONS if max_concurrent is None else max_concurrent
+        self.keep_alive_interval = Config.KEEP_ALIVE_INTERVAL if keep_alive_interval is None else keep_alive_interval
+
+        # Менеджер-владелец общего HTTP клиента для всех сессий
+        self._control_manager = HeyGenSessionManager(self.api_key)
+
+        self._sessions: Dict[str, SessionState] = {}
+        self._quota = asyncio.Semaphore(self.max_concurrent)
+        self._waiting = 0
+        # Место в квоте уже занято, сессия еще создается
+        self._opening = 0
+
+        self._keep_alive_task: Optional[asyncio.Task] = None
+        self._is_closing = False
+
+        # Статистика
+        self.opened_count = 0
+        self.failed_count = 0
+        self.expired_count = 0
+        self.lost_count = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def active_count(self) -> int:
+        return len(self._sessions)
+
+    @property
+    def free_slots(self) -> int:
+        """Свободные места в квоте (без учета ожидающих в очереди)"""
+        return max(0, self.max_concurrent - self.active_count - self._opening)
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        """Состояние сессии по ID"""
+        return self._sessions.get(session_id)
+
+    def list_sessions(self) -> List[SessionState]:
+        return list(self._sessions.values())
+
+    async def open_session(
+        self,
+        avatar_id: str = None,
+        quality: str = None,
+        voice_settings: Dict[str, Any] = None,
+        label: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Optional[SessionState]:
+        """
+        Создать и запустить сессию, дождавшись свободного места в квоте
+
+        timeout ограничивает ожидание в очереди (None - ждать без ограничения).
+        """
+        if self._is_closing:
+            logger.error("Менеджер сессий закрывается")
+            return None
+
+        started = time.monotonic()
+        self._waiting += 1
+        if self._quota.locked():
+            logger.info(f"Квота сессий занята ({self.max_concurrent}), в очереди: {self._waiting}")
+        try:
+            await asyncio.wait_for(self._quota.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Не дождались свободной сессии за {timeout} сек")
+            return None
+        finally:
+            self._waiting -= 1
+            self.wait_seconds += time.monotonic() - started
+
+        manager: Optional[HeyGenSessionManager] = None
+        self._opening += 1
+        try:
+            http_session = await self._control_manager.get_http_session()
+            manager = HeyGenSessionManager(self.api_key, http_session=http_session)
+            if not await manager.create_session(avatar_id, quality, voice_settings):
+                raise RuntimeError("не удалось создать сессию")
+            if not await manager.start_session():
+                raise RuntimeError("не удалось запустить сессию")
+        except BaseException as e:
+            # Включая отмену: место в квоте освобождается, созданная сессия закрывается
+            self.failed_count += 1
+            self._quota.release()
+            if manager is not None and manager.session_id:
+                try:
+                    await asyncio.shield(manager.close_session())
+                except Exception as close_error:
+                    logger.error(f"Ошибка закрытия сессии {manager.session_id}: {close_error}")
+            if not isinstance(e, Exception):
+                raise
+            logger.error(f"Ошибка открытия сессии: {e}")
+            return None
+        finally:
+            self._opening -= 1
+
+        state = SessionState(manager, label)
+        self._sessions[state.session_id] = state
+        self.opened_count += 1
+        self._ensure_keep_alive()
+        logger.info(f"Открыта сессия {state.session_id}"
+                    f"{f' ({label})' if label else ''}, активных: {self.active_count}/{self.max_concurrent}")
+        return state
+
+    async def close_session(self, session_id: str) -> bool:
+        """Закрыть сессию и освободить место в квоте"""
+        state = self._sessions.pop(session_id, None)
+        if state is None:
+            return False
+
+        try:
+            closed = await state.manager.close_session()
+        except Exception as e:
+            logger.error(f"Ошибка закрытия сессии {session_id}: {e}")
+            closed = False
+        finally:
+            self._quota.release()
+
+        logger.info(f"Сессия {session_id} освобождена, активных: {self.active_count}/{self.max_concurrent}")
+        return closed
+
+    @asynccontextmanager
+    async def session(self, **kwargs):
+        """
+        Сессия на время блока async with (закрывается при выходе)
+
+        Если сессию открыть не удалось, возбуждается RuntimeError.
+        """
+        state = await self.open_session(**kwargs)
+        if state is None:
+            raise RuntimeError("Не удалось открыть сессию HeyGen")
+        try:
+            yield state
+        finally:
+            await self.close_session(state.session_id)
+
+    async def close_orphaned_sessions(self) -> int:
+        """Закрыть активные на стороне HeyGen сессии, которых нет в менеджере (например, после падения процесса)"""
+        closed = 0
+        for session in await self._control_manager.list_active_sessions():
+            session_id = session.get('session_id') if isinstance(session, dict) else None
+            if session_id and session_id not in self._sessions:
+                await self._control_manager._close_session_by_id(session_id)
+                logger.info(f"Закрыта сессия без владельца: {session_id}")
+                closed += 1
+        return closed
+
+    def _ensure_keep_alive(self):
+        if self._keep_alive_task is None or self._keep_alive_task.done():
+            self._keep_alive_task = asyncio.create_task(self._keep_alive_loop())
+
+    async def _keep_alive_one(self, state: SessionState):
+        state.last_keep_alive_attempt = time.time()
+        try:
+            ok = await state.manager.keep_alive()
+        except Exception as e:
+            logger.error(f"Ошибка keep-alive сессии {state.session_id}: {e}")
+            ok = False
+
+        if ok:
+            state.last_keep_alive = time.time()
+            state.keep_alive_failures = 0
+            return
+
+        state.keep_alive_failures += 1
+        if state.keep_alive_failures >= self.MAX_KEEP_ALIVE_FAILURES:
+            self.lost_count += 1
+            logger.error(f"Сессия {state.session_id} не отвечает на keep-alive, закрываем")
+            await self.close_session(state.session_id)
+
+    async def _keep_alive_loop(self):
+        """Единый планировщик keep-alive: спит до ближайшего срока и обслуживает все созревшие сессии"""
+        # Неудачный keep-alive повторяется через четверть интервала
+        retry_interval = max(1.0, self.keep_alive_interval / 4)
+
+        while not self._is_closing:
+            now = time.time()
+            due, expired = [], []
+            next_run = now + self.keep_alive_interval
+
+            for state in list(self._sessions.values()):
+                if state.is_expired:
+                    expired.append(state)
+                    continue
+                run_at = state.next_keep_alive(self.keep_alive_interval, retry_interval)
+                if run_at <= now:
+                    due.append(state)
+                else:
+                    next_run = min(next_run, run_at)
+                if state.expires_at is not None:
+                    # Сессия закрывается в момент истечения лимита, а не на следующем keep-alive
+                    next_run = min(next_run, state.expires_at)
+
+            for state in expired:
+                self.expired_count += 1
+                logger.info(f"Сессия {state.session_id} достигла лимита длительности, закрываем")
+            if due or expired:
+                await asyncio.gather(
+                    *(self._keep_alive_one(state) for state in due),
+                    *(self.close_session(state.session_id) for state in expired),
+                    return_exceptions=True
+                )
+                continue
+
+            # Новые сессии созревают не раньше чем через интервал, поэтому будить цикл не нужно
+            await asyncio.sleep(max(0.0, next_run - now))
+
+    def get_stats(self) -> dict:
+        """Получить статистику сессий"""
+        return {
+            "active": self.active_count,
+            "waiting": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "opened": self.opened_count,
+            "failed": self.failed_count,
+            "expired": self.expired_count,
+            "lost": self.lost_count,
+            "avg_wait": round(self.wait_seconds / (self.opened_count + self.failed_count), 3)
+                        if self.opened_count + self.failed_count else 0.0,
+            "sessions": {session_id: state.get_stats() for session_id, state in self._sessions.items()}
+        }
+
+    async def close(self):
+        """Закрыть все сессии, остановить keep-alive и общий HTTP клиент"""
+        self._is_closing = True
+
+        if self._keep_alive_task:
+            self._keep_alive_task.cancel()
+            try:
+                await self._keep_alive_task
+            except asyncio.CancelledError:
+                pass
+            self._keep_alive_task = None
+
+        if self._sessions:
+            await asyncio.gather(*(self.close_session(session_id) for session_id in list(self._sessions)),
+                                 return_exceptions=True)
+
+        await self._control_manager.close_http_session()
+        logger.info("Менеджер сессий остановлен")
@@ -2,15 +2,31 @@ import asyncio
 import aiohttp
 import json
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from .config import Config
+from .downloader import RangedDownloader
 
 logger = logging.getLogger(__name__)
 
+# Найденный шаблон endpoint результата задач для каждого base_url (общий для всех менеджеров)
+_task_result_endpoints: Dict[str, str] = {}
+
+# Статусы задачи, после которых результат больше не изменится
+TASK_FINAL_STATUSES = ('completed', 'success', 'done', 'failed', 'error')
+
 class HeyGenSessionManager:
     """Менеджер для управления HeyGen streaming сессиями"""
     
-    def __init__(self, api_key: str = None):
+    # Возможные endpoints результата задачи (рабочий определяется один раз на base_url)
+    TASK_RESULT_ENDPOINTS = (
+        "/streaming.task.result/{task_id}",
+        "/streaming/task/{task_id}",
+        "/streaming/task/{task_id}/result",
+        "/streaming.task/{task_id}/status",
+        "/task/{task_id}",
+    )
+    
+    def __init__(self, api_key: str = None, http_session: Optional[aiohttp.ClientSession] = None):
         self.api_key = api_key or Config.HEYGEN_API_KEY
         self.base_url = Config.HEYGEN_BASE_URL
         self.session_id: Optional[str] = None
@@ -20,6 +36,16 @@ class HeyGenSessionManager:
         self.realtime_endpoint: Optional[str] = None
         self.is_active = False
         
+        # Общий HTTP клиент с пулом соединений (создается лениво или передается извне)
+        self._http_session: Optional[aiohttp.ClientSession] = http_session
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._owns_http_session = http_session is None
+        
+        # Поиск endpoint результата задач выполняется одним запросом за раз
+        # (блокировка создается лениво для текущего event loop, как и HTTP клиент)
+        self._discovery_lock: Optional[asyncio.Lock] = None
+        self._discovery_loop: Optional[asyncio.AbstractEventLoop] = None
+        
         if not self.api_key:
             raise ValueError("API ключ HeyGen не найден")
     
@@ -32,59 +58,126 @@ class HeyGenSessionManager:
             'x-api-key': self.api_key
         }
     
+    async def get_http_session(self) -> aiohttp.ClientSession:
+        """Получить общий HTTP клиент с keep-alive, DNS кэшем и лимитами соединений"""
+        if not self._owns_http_session:
+            # Внешний клиент: его жизненным циклом управляет владелец
+            return self._http_session
+        
+        loop = asyncio.get_running_loop()
+        
+        if self._http_session is not None and not self._http_session.closed:
+            if self._http_loop is loop:
+                return self._http_session
+            # Клиент привязан к другому event loop (например, asyncio.run в рабочем потоке)
+            logger.debug("HTTP клиент создан в другом event loop, создаем новый")
+            await self._close_foreign_http_session()
+        
+        connector = aiohttp.TCPConnector(
+            limit=Config.HTTP_POOL_LIMIT,
+            limit_per_host=Config.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=Config.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=Config.HTTP_KEEPALIVE_TIMEOUT
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=Config.HTTP_TOTAL_TIMEOUT,
+            connect=Config.HTTP_CONNECT_TIMEOUT,
+            sock_read=Config.HTTP_READ_TIMEOUT
+        )
+        self._http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self._http_loop = loop
+        return self._http_session
+    
+    async def _close_foreign_http_session(self):
+        """Закрыть клиент, созданный в другом event loop"""
+        session, loop = self._http_session, self._http_loop
+        self._http_session = None
+        self._http_loop = None
+        if session is None or session.closed:
+            return
+        
+        try:
+            if loop is not None and loop.is_running():
+                # Loop еще работает (например, в другом потоке): закрываем клиент в нем
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+            else:
+                # Loop завершен: освобождаем клиент и коннектор из текущего loop
+                await session.close()
+        except Exception as e:
+            logger.debug(f"Ошибка закрытия HTTP клиента другого event loop: {e}")
+    
+    async def close_http_session(self):
+        """Закрыть общий HTTP клиент"""
+        if not self._owns_http_session:
+            return
+        
+        if self._http_loop is not None and self._http_loop is not asyncio.get_running_loop():
+            await self._close_foreign_http_session()
+            return
+        
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+        self._http_loop = None
+    
     async def get_available_avatars(self) -> List[Dict[str, Any]]:
         """Получить список доступных аватаров"""
         url = f"{self.base_url}/streaming/avatar.list"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get('data', [])
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка получения аватаров: {response.status} - {error_text}")
-                    return []
+        session = await self.get_http_session()
+        async with session.get(url, headers=self.headers) as response:
+            if response.status == 200:
+                data = await response.json()
+                return data.get('data', [])
+            else:
+                error_text = await response.text()
+                logger.error(f"Ошибка получения аватаров: {response.status} - {error_text}")
+                return []
     
     async def list_active_sessions(self) -> List[Dict[str, Any]]:
         """Получить список активных сессий"""
         url = f"{self.base_url}/streaming.list"
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers) as response:
-                try:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.debug(f"Ответ от API: {data}")
+        session = await self.get_http_session()
+        async with session.get(url, headers=self.headers) as response:
+            try:
+                if response.status == 200:
+                    data = await response.json()
+                    logger.debug(f"Ответ от API: {data}")
                         
-                        # Проверяем тип данных
-                        if isinstance(data, dict):
-                            sessions_data = data.get('data', {})
-                            if isinstance(sessions_data, dict) and 'sessions' in sessions_data:
-                                # Формат: {'data': {'sessions': [...]}}
-                                return sessions_data['sessions']
-                            elif isinstance(sessions_data, list):
-                                # Формат: {'data': [...]}
-                                return sessions_data
-                            else:
-                                return data.get('data', [])
-                        elif isinstance(data, list):
-                            return data
+                    # Проверяем тип данных
+                    if isinstance(data, dict):
+                        sessions_data = data.get('data', {})
+                        if isinstance(sessions_data, dict) and 'sessions' in sessions_data:
+                            # Формат: {'data': {'sessions': [...]}}
+                            return sessions_data['sessions']
+                        elif isinstance(sessions_data, list):
+                            # Формат: {'data': [...]}
+                            return sessions_data
                         else:
-                            logger.warning(f"Неожиданный тип данных от API: {type(data)}")
-                            return []
+                            return data.get('data', [])
+                    elif isinstance(data, list):
+                        return data
                     else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка получения активных сессий: {response.status} - {error_text}")
+                        logger.warning(f"Неожиданный тип данных от API: {type(data)}")
                         return []
-                except Exception as e:
-                    logger.error(f"Ошибка парсинга ответа от API: {e}")
+                else:
                     error_text = await response.text()
-                    logger.error(f"Содержимое ответа: {error_text}")
+                    logger.error(f"Ошибка получения активных сессий: {response.status} - {error_text}")
                     return []
+            except Exception as e:
+                logger.error(f"Ошибка парсинга ответа от API: {e}")
+                error_text = await response.text()
+                logger.error(f"Содержимое ответа: {error_text}")
+                return []
     
     async def close_all_active_sessions(self):
-        """Закрыть все активные сессии (для обеспечения единственной сессии)"""
+        """
+        Закрыть все активные сессии (для обеспечения единственной сессии)
+        
+        Закрывает и чужие сессии аккаунта; для нескольких одновременных сессий
+        используйте HeyGenMultiSessionManager.close_orphaned_sessions().
+        """
         try:
             active_sessions = await self.list_active_sessions()
             logger.info(f"Найдено активных сессий: {len(active_sessions)}")
@@ -108,10 +201,10 @@ class HeyGenSessionManager:
         url = f"{self.base_url}/streaming.stop"
         data = {"session_id": session_id}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=data) as response:
-                if response.status != 200:
-                    logger.error(f"Ошибка закрытия сессии {session_id}: {response.status}")
+        session = await self.get_http_session()
+        async with session.post(url, headers=self.headers, json=data) as response:
+            if response.status != 200:
+                logger.error(f"Ошибка закрытия сессии {session_id}: {response.status}")
     
     async def create_session(
         self, 
@@ -140,40 +233,40 @@ class HeyGenSessionManager:
         
         logger.info(f"Создание сессии с параметрами: {request_data}")
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=request_data) as response:
-                try:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.debug(f"Ответ создания сессии: {data}")
+        session = await self.get_http_session()
+        async with session.post(url, headers=self.headers, json=request_data) as response:
+            try:
+                if response.status == 200:
+                    data = await response.json()
+                    logger.debug(f"Ответ создания сессии: {data}")
                         
-                        if isinstance(data, dict):
-                            session_data = data.get('data', {})
-                        else:
-                            logger.error(f"Неожиданный формат ответа: {type(data)}")
-                            return False
+                    if isinstance(data, dict):
+                        session_data = data.get('data', {})
+                    else:
+                        logger.error(f"Неожиданный формат ответа: {type(data)}")
+                        return False
                         
-                        self.session_id = session_data.get('session_id')
-                        self.websocket_url = session_data.get('url')
-                        self.access_token = session_data.get('access_token')
-                        self.session_duration_limit = session_data.get('session_duration_limit')
-                        self.realtime_endpoint = session_data.get('realtime_endpoint')
+                    self.session_id = session_data.get('session_id')
+                    self.websocket_url = session_data.get('url')
+                    self.access_token = session_data.get('access_token')
+                    self.session_duration_limit = session_data.get('session_duration_limit')
+                    self.realtime_endpoint = session_data.get('realtime_endpoint')
                         
-                        if self.session_id:
-                            logger.info(f"Сессия создана: {self.session_id}")
-                            return True
-                        else:
-                            logger.error("Не получен session_id от API")
-                            return False
+                    if self.session_id:
+                        logger.info(f"Сессия создана: {self.session_id}")
+                        return True
                     else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка создания сессии: {response.status} - {error_text}")
+                        logger.error("Не получен session_id от API")
                         return False
-                except Exception as e:
-                    logger.error(f"Ошибка при создании сессии: {e}")
+                else:
                     error_text = await response.text()
-                    logger.error(f"Содержимое ответа: {error_text}")
+                    logger.error(f"Ошибка создания сессии: {response.status} - {error_text}")
                     return False
+            except Exception as e:
+                logger.error(f"Ошибка при создании сессии: {e}")
+                error_text = await response.text()
+                logger.error(f"Содержимое ответа: {error_text}")
+                return False
     
     async def start_session(self) -> bool:
         """Запустить созданную сессию"""
@@ -184,16 +277,16 @@ class HeyGenSessionManager:
         url = f"{self.base_url}/streaming.start"
         data = {"session_id": self.session_id}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=data) as response:
-                if response.status == 200:
-                    self.is_active = True
-                    logger.info(f"Сессия запущена: {self.session_id}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка запуска сессии: {response.status} - {error_text}")
-                    return False
+        session = await self.get_http_session()
+        async with session.post(url, headers=self.headers, json=data) as response:
+            if response.status == 200:
+                self.is_active = True
+                logger.info(f"Сессия запущена: {self.session_id}")
+                return True
+            else:
+                error_text = await response.text()
+                logger.error(f"Ошибка запуска сессии: {response.status} - {error_text}")
+                return False
     
     async def send_task(
         self, 
@@ -216,51 +309,181 @@ class HeyGenSessionManager:
         
         logger.info(f"Отправка задачи: {text[:50]}...")
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    logger.info(f"Задача отправлена, ответ API: {result}")
-                    return result
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Ошибка отправки задачи: {response.status} - {error_text}")
-                    return None
+        session = await self.get_http_session()
+        async with session.post(url, headers=self.headers, json=data) as response:
+            if response.status == 200:
+                result = await response.json()
+                logger.info(f"Задача отправлена, ответ API: {result}")
+                return result
+            else:
+                error_text = await response.text()
+                logger.error(f"Ошибка отправки задачи: {response.status} - {error_text}")
+                return None
 
-    async def get_task_result(self, task_id: str) -> Optional[Dict[str, Any]]:
-        """Получить результат выполнения задачи"""
+    async def _fetch_task_result(self, template: str, task_id: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Запросить результат задачи по шаблону endpoint: (HTTP статус, ответ при 200)"""
+        url = f"{self.base_url}{template.format(task_id=task_id)}"
+        session = await self.get_http_session()
+        async with session.get(url, headers=self.headers) as response:
+            if response.status == 200:
+                return response.status, await response.json()
+            logger.debug(f"Endpoint {url} недоступен: {response.status}")
+            return response.status, None
+    
+    def _get_discovery_lock(self) -> asyncio.Lock:
+        """Блокировка поиска endpoint, привязанная к текущему event loop"""
+        loop = asyncio.get_running_loop()
+        if self._discovery_lock is None or self._discovery_loop is not loop:
+            self._discovery_lock = asyncio.Lock()
+            self._discovery_loop = loop
+        return self._discovery_lock
+    
+    def _forget_task_result_endpoint(self, template: str):
+        if _task_result_endpoints.get(self.base_url) == template:
+            _task_result_endpoints.pop(self.base_url, None)
+    
+    async def _fetch_known_task_result(self, template: str, task_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Запрос по найденному endpoint: (endpoint еще рабочий, результат)
+        
+        404 по уже отвечавшему endpoint означает, что результата пока нет:
+        endpoint остается в кэше. Забывается он только при 410 (Gone).
+        """
+        status, result = await self._fetch_task_result(template, task_id)
+        if status == 200:
+            logger.debug(f"Результат задачи {task_id}: {result}")
+            return True, result
+        if status == 404:
+            logger.debug(f"Результат задачи {task_id} еще не готов")
+            return True, None
+        if status != 410:
+            logger.error(f"Ошибка получения результата задачи {task_id}: {status}")
+            return True, None
+        logger.info(f"Endpoint результата задач вернул {status}, повторный поиск")
+        self._forget_task_result_endpoint(template)
+        return False, None
+    
+    async def _discover_task_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Опросить все варианты endpoint одновременно: первый успешный побеждает,
+        остальные запросы отменяются, найденный шаблон запоминается для base_url
+        """
+        async def probe(template: str):
+            status, result = await self._fetch_task_result(template, task_id)
+            return template, status, result
+        
+        probes = [asyncio.create_task(probe(template)) for template in self.TASK_RESULT_ENDPOINTS]
+        try:
+            for next_done in asyncio.as_completed(probes):
+                try:
+                    template, status, result = await next_done
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.debug(f"Ошибка запроса результата задачи: {e}")
+                    continue
+                if status == 200:
+                    _task_result_endpoints[self.base_url] = template
+                    logger.info(f"Endpoint результата задач: {self.base_url}{template}")
+                    return result
+        finally:
+            for task in probes:
+                task.cancel()
+        return None
+    
+    async def get_task_result(self, task_id: str, rediscover: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Получить результат выполнения задачи
+        
+        rediscover=True перебирает все endpoint даже при известном; если и
+        перебор ничего не нашел, известный endpoint считается устаревшим.
+        """
         if not self.session_id:
             logger.error("Сессия не активна")
             return None
         
-        # Пробуем разные возможные endpoints
-        possible_urls = [
-            f"{self.base_url}/streaming.task.result/{task_id}",
-            f"{self.base_url}/streaming/task/{task_id}",
-            f"{self.base_url}/streaming/task/{task_id}/result",
-            f"{self.base_url}/streaming.task/{task_id}/status",
-            f"{self.base_url}/task/{task_id}",
-        ]
-        
-        for url in possible_urls:
-            logger.debug(f"Пробуем endpoint: {url}")
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.debug(f"Результат задачи {task_id} с {url}: {result}")
-                        return result
-                    else:
-                        logger.debug(f"Endpoint {url} недоступен: {response.status}")
+        # Рабочий endpoint известен: один запрос вместо перебора вариантов
+        stale = _task_result_endpoints.get(self.base_url)
+        if stale is not None and not rediscover:
+            valid, result = await self._fetch_known_task_result(stale, task_id)
+            if valid:
+                return result
         
-        logger.error(f"Не найден рабочий endpoint для получения результата задачи {task_id}")
-        return None
+        async with self._get_discovery_lock():
+            # Пока ждали блокировку, endpoint мог найти параллельный запрос
+            template = _task_result_endpoints.get(self.base_url)
+            if template is not None and template != stale:
+                valid, result = await self._fetch_known_task_result(template, task_id)
+                if valid:
+                    return result
+            result = await self._discover_task_result(task_id)
+            if result is None and rediscover and stale is not None:
+                logger.info("Известный endpoint результата задач не отвечает, повторный поиск при следующем запросе")
+                self._forget_task_result_endpoint(stale)
+        
+        if result is None:
+            logger.warning(f"Результат задачи {task_id} не получен ни по одному endpoint")
+        return result
+    
+    @staticmethod
+    def _task_state(result: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """Статус задачи из ответа API и признак завершения (готово или ошибка)"""
+        data = result.get('data') or {}
+        status = str(data.get('status', '')).lower() or None
+        has_video = bool(data.get('video_url') or data.get('url') or data.get('result_url'))
+        return status, has_video or status in TASK_FINAL_STATUSES
+    
+    async def wait_for_task_result(
+        self,
+        task_id: str,
+        timeout: float = 60.0,
+        initial_delay: float = 0.5,
+        max_delay: float = 5.0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Опрашивать результат задачи до завершения с адаптивной паузой
+        
+        Пауза растет в 1.5 раза, пока статус не меняется, и сбрасывается до
+        initial_delay при смене статуса (задача продвигается - проверяем чаще).
+        Отсутствие результата (endpoint отвечает 404) считается "еще не готово":
+        опрос идет по известному endpoint, перебор всех вариантов повторяется
+        только один раз по истечении timeout.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = initial_delay
+        last_status = None
+        
+        while True:
+            result = await self.get_task_result(task_id)
+            if result is None:
+                status, finished = None, False
+            else:
+                status, finished = self._task_state(result)
+            if finished:
+                return result
+            
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                if result is None and _task_result_endpoints.get(self.base_url) is not None:
+                    # Известный endpoint так и не ответил: возможно, он устарел
+                    result = await self.get_task_result(task_id, rediscover=True)
+                    if result is not None:
+                        status, finished = self._task_state(result)
+                        if finished:
+                            return result
+                logger.warning(f"Задача {task_id} не завершилась за {timeout:.0f} с (статус: {status})")
+                return result
+            
+            if status != last_status:
+                delay = initial_delay
+                last_status = status
+            logger.debug(f"Задача {task_id}: {status}, следующий опрос через {delay:.1f} с")
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, max_delay)
 
     async def download_task_video(self, task_id: str, output_path: str) -> bool:
         """Скачать видео результат задачи"""
-        # Сначала получаем информацию о задаче
-        task_result = await self.get_task_result(task_id)
+        # Сначала получаем информацию о задаче (дожидаясь, пока видео будет готово)
+        task_result = await self.wait_for_task_result(task_id)
         if not task_result:
             logger.error(f"Не удалось получить информацию о задаче {task_id}")
             return False
@@ -277,18 +500,9 @@ class HeyGenSessionManager:
         logger.info(f"Скачивание видео с {video_url} в {output_path}")
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url) as response:
-                    if response.status == 200:
-                        with open(output_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(8192):
-                                f.write(chunk)
-                        
-                        logger.info(f"Видео сохранено: {output_path}")
-                        return True
-                    else:
-                        logger.error(f"Ошибка скачивания видео: {response.status}")
-                        return False
+            session = await self.get_http_session()
+            # Сегменты качаются параллельно через общий пул, после сбоя повторный вызов докачивает файл
+            return await RangedDownloader(session).download(video_url, output_path)
         except Exception as e:
             logger.error(f"Ошибка при скачивании видео: {e}")
             return False
@@ -302,14 +516,14 @@ class HeyGenSessionManager:
         url = f"{self.base_url}/streaming.interrupt"
         data = {"session_id": self.session_id}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=data) as response:
-                if response.status == 200:
-                    logger.info("Задача прервана")
-                    return True
-                else:
-                    logger.error(f"Ошибка прерывания задачи: {response.status}")
-                    return False
+        session = await self.get_http_session()
+        async with session.post(url, headers=self.headers, json=data) as response:
+            if response.status == 200:
+                logger.info("Задача прервана")
+                return True
+            else:
+                logger.error(f"Ошибка прерывания задачи: {response.status}")
+                return False
     
     async def keep_alive(self) -> bool:
         """Поддержать сессию активной"""
@@ -319,14 +533,14 @@ class HeyGenSessionManager:
         url = f"{self.base_url}/streaming.keep_alive"
         data = {"session_id": self.session_id}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=data) as response:
-                if response.status == 200:
-                    logger.debug("Keep-alive отправлен")
-                    return True
-                else:
-                    logger.error(f"Ошибка keep-alive: {response.status}")
-                    return False
+        session = await self.get_http_session()
+        async with session.post(url, headers=self.headers, json=data) as response:
+            if response.status == 200:
+                logger.debug("Keep-alive отправлен")
+                return True
+            else:
+                logger.error(f"Ошибка keep-alive: {response.status}")
+                return False
     
     async def close_session(self) -> bool:
         """Закрыть текущую сессию"""
@@ -336,15 +550,15 @@ class HeyGenSessionManager:
         url = f"{self.base_url}/streaming.stop"
         data = {"session_id": self.session_id}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=self.headers, json=data) as response:
-                if response.status == 200:
-                    logger.info(f"Сессия закрыта: {self.session_id}")
-                    self._reset_session()
-                    return True
-                else:
-                    logger.error(f"Ошибка закрытия сессии: {response.status}")
-                    return False
+        session = await self.get_http_session()
+        async with session.post(url, headers=self.headers, json=data) as response:
+            if response.status == 200:
+                logger.info(f"Сессия закрыта: {self.session_id}")
+                self._reset_session()
+                return True
+            else:
+                logger.error(f"Ошибка закрытия сессии: {response.status}")
+                return False
     
     def _reset_session(self):
         """Сбросить данные сессии"""
@@ -358,3 +572,5 @@ class HeyGenSessionManager:
         """Очистка ресурсов"""
         if self.is_active:
             await self.close_session()
+        
+        await self.close_http_session()
@@ -0,0 +1,123 @@
+import logging
+import wave
+from typing import Optional, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class AudioBuffer:
+    """
+    Компактный буфер PCM int16 аудио с параллельным массивом временных меток
+
+    Растущая арена: добавление кадра - только копирование байтов в заранее
+    выделенный массив (с удвоением емкости при нехватке), а экспорт
+    возвращает view без копирования.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 48000,
+        channels: int = 1,
+        initial_seconds: float = 10.0
+    ):
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+        capacity = max(1, int(initial_seconds * sample_rate)) * channels
+        self._data = np.empty(capacity, dtype=np.int16)
+        # Число записанных сэмплов (int16 значений)
+        self._written = 0
+
+        # Начало каждого кадра: смещение в сэмплах и временная метка
+        self._frame_offsets = np.empty(256, dtype=np.int64)
+        self._frame_timestamps = np.empty(256, dtype=np.float64)
+        self._frame_count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self._data.size
+
+    @property
+    def samples(self) -> int:
+        """Число int16 значений в буфере (с учетом всех каналов)"""
+        return self._written
+
+    @property
+    def duration(self) -> float:
+        return self.samples / (self.sample_rate * self.channels)
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes + self._frame_offsets.nbytes + self._frame_timestamps.nbytes
+
+    def __len__(self) -> int:
+        """Число кадров в буфере"""
+        return self._frame_count
+
+    def clear(self):
+        self._written = 0
+        self._frame_count = 0
+
+    def _grow(self, needed: int):
+        new_capacity = self.capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        data = np.empty(new_capacity, dtype=np.int16)
+        data[:self._written] = self._data[:self._written]
+        self._data = data
+
+    def _record_frame(self, offset: int, timestamp: float):
+        if self._frame_count == self._frame_offsets.size:
+            self._frame_offsets = np.resize(self._frame_offsets, self._frame_offsets.size * 2)
+            self._frame_timestamps = np.resize(self._frame_timestamps, self._frame_timestamps.size * 2)
+
+        self._frame_offsets[self._frame_count] = offset
+        self._frame_timestamps[self._frame_count] = timestamp
+        self._frame_count += 1
+
+    def append(self, pcm, timestamp: float):
+        """Добавить кадр PCM s16le (bytes, memoryview или int16 массив)"""
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        count = samples.size
+        if count == 0:
+            return
+
+        self._record_frame(self._written, timestamp)
+
+        if self._written + count > self.capacity:
+            self._grow(self._written + count)
+        self._data[self._written:self._written + count] = samples
+        self._written += count
+
+    def segments(self) -> List[np.ndarray]:
+        """Данные в виде списка view без копирования (для записи без объединения)"""
+        return [self._data[:self._written]]
+
+    def view(self) -> np.ndarray:
+        """Все аудио одним массивом (без копирования)"""
+        return self._data[:self._written]
+
+    def timestamps(self) -> np.ndarray:
+        """Временные метки кадров в буфере"""
+        return self._frame_timestamps[:self._frame_count]
+
+    @property
+    def first_timestamp(self) -> Optional[float]:
+        return float(self._frame_timestamps[0]) if len(self) else None
+
+    def write_wav(self, path: str, leading_silence: float = 0.0) -> bool:
+        """Записать буфер в WAV без промежуточного объединения кадров"""
+        if self.samples == 0:
+            return False
+
+        silence = int(round(leading_silence * self.sample_rate)) * self.channels
+        with wave.open(path, 'wb') as wav_file:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(2)  # 16-bit
+            wav_file.setframerate(self.sample_rate)
+            if silence > 0:
+                wav_file.writeframes(bytes(silence * 2))
+            for part in self.segments():
+                wav_file.writeframes(memoryview(part).cast('B'))
+        return True
@@ -0,0 +1,63 @@
+from typing import Optional
+
+import numpy as np
+
+from pipecat_integration.frame_formats import YUVFrame, VideoFrameData
+
+class FrameChangeDetector:
+    """
+    Дешевый детектор изменений кадра для схлопывания простоя аватара
+
+    Яркость кадра уменьшается усреднением блоков до сетки grid (векторизовано
+    в numpy) и сравнивается с последним сохраненным кадром. Если средняя
+    абсолютная разница ни в одном блоке не превышает порог, кадр считается
+    повтором. Сравнение по блокам, а не по всему кадру, не пропускает
+    локальные изменения (моргание, движение губ).
+    """
+
+    def __init__(self, threshold: float = 2.0, grid: tuple = (32, 18)):
+        self.threshold = threshold
+        self.grid = grid
+        self._reference: Optional[np.ndarray] = None
+
+        self.frames_checked = 0
+        self.duplicates = 0
+
+    def _luma(self, frame: VideoFrameData) -> np.ndarray:
+        if isinstance(frame, YUVFrame):
+            return frame.data[:frame.width * frame.height].reshape((frame.height, frame.width))
+        # Для BGR зеленый канал - достаточное приближение яркости
+        return frame[:, :, 1]
+
+    def _thumbnail(self, frame: VideoFrameData) -> np.ndarray:
+        # Каждый второй пиксель: вчетверо меньше данных, на средние по блокам почти не влияет
+        luma = self._luma(frame)[::2, ::2]
+        grid_w, grid_h = self.grid
+        block_h, block_w = luma.shape[0] // grid_h, luma.shape[1] // grid_w
+        if block_h == 0 or block_w == 0:
+            return luma.astype(np.float32)
+
+        blocks = luma[:block_h * grid_h, :block_w * grid_w].reshape(grid_h, block_h, grid_w, block_w)
+        return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+    def is_duplicate(self, frame: VideoFrameData) -> bool:
+        """Проверить кадр; не повтор - кадр становится новым эталоном"""
+        self.frames_checked += 1
+        thumbnail = self._thumbnail(frame)
+
+        reference = self._reference
+        if reference is not None and reference.shape == thumbnail.shape:
+            if float(np.abs(thumbnail - reference).max()) <= self.threshold:
+                self.duplicates += 1
+                return True
+
+        self._reference = thumbnail
+        return False
+
+    def get_stats(self) -> dict:
+        """Получить статистику детектора"""
+        return {
+            "frames_checked": self.frames_checked,
+            "duplicates": self.duplicates,
+            "threshold": self.threshold
+        }
@@ -0,0 +1,79 @@
+from typing import Union
+
+import cv2
+import numpy as np
+
+class YUVFrame:
+    """
+    Кадр в нативном формате I420 (YUV 4:2:0, плоскости подряд)
+
+    Занимает в 2 раза меньше памяти, чем BGR, и передается кодировщикам,
+    принимающим YUV, без преобразований. BGR создается только по запросу.
+    """
+
+    __slots__ = ('data', 'width', 'height')
+
+    def __init__(self, data: np.ndarray, width: int, height: int):
+        self.data = data
+        self.width = width
+        self.height = height
+
+    @property
+    def shape(self) -> tuple:
+        """Форма эквивалентного BGR кадра (для совместимости с numpy кадрами)"""
+        return (self.height, self.width, 3)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def to_bgr(self) -> np.ndarray:
+        if self.width % 2 == 0 and self.height % 2 == 0:
+            planar = self.data.reshape((self.height * 3 // 2, self.width))
+            return cv2.cvtColor(planar, cv2.COLOR_YUV2BGR_I420)
+
+        # Нечетный размер: плоскости цветности округлены вверх, собираем YUV 4:4:4 вручную
+        chroma_w, chroma_h = (self.width + 1) // 2, (self.height + 1) // 2
+        luma_size = self.width * self.height
+        chroma_size = chroma_w * chroma_h
+        y = self.data[:luma_size].reshape((self.height, self.width))
+        u = self.data[luma_size:luma_size + chroma_size].reshape((chroma_h, chroma_w))
+        v = self.data[luma_size + chroma_size:luma_size + 2 * chroma_size].reshape((chroma_h, chroma_w))
+        size = (self.width, self.height)
+        yuv = cv2.merge([y, cv2.resize(u, size), cv2.resize(v, size)])
+        return cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR)
+
+
+VideoFrameData = Union[np.ndarray, YUVFrame]
+
+
+def to_bgr(frame: VideoFrameData) -> np.ndarray:
+    """Получить BGR кадр (ленивое преобразование для YUV кадров)"""
+    if isinstance(frame, YUVFrame):
+        return frame.to_bgr()
+    return frame
+
+
+def bgr_to_i420(bgr: np.ndarray) -> np.ndarray:
+    """
+    BGR кадр в плоскости I420 (одномерный массив)
+
+    Для нечетных размеров раскладка совпадает с кадрами LiveKit: яркость
+    width x height, плоскости цветности округлены вверх. cvtColor принимает
+    только четные размеры, поэтому кадр дополняется краевыми пикселями.
+    """
+    height, width = bgr.shape[:2]
+    even_h, even_w = height + height % 2, width + width % 2
+    if (even_h, even_w) == (height, width):
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420).reshape(-1)
+
+    padded = cv2.copyMakeBorder(bgr, 0, even_h - height, 0, even_w - width, cv2.BORDER_REPLICATE)
+    planar = cv2.cvtColor(padded, cv2.COLOR_BGR2YUV_I420).reshape(-1)
+    luma = planar[:even_w * even_h].reshape((even_h, even_w))[:height, :width]
+    return np.concatenate([luma.reshape(-1), planar[even_w * even_h:]])
+
+
+def raw_bytes(frame: VideoFrameData) -> memoryview:
+    """Сырые байты кадра в его собственном формате (без копирования)"""
+    data = frame.data if isinstance(frame, YUVFrame) else frame
+    return memoryview(np.ascontiguousarray(data)).cast('B')
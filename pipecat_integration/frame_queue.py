@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Callable, Any
+
+logger = logging.getLogger(__name__)
+
+_CLOSED = object()
+
+class BoundedFrameQueue:
+    """
+    Ограниченная очередь кадров одного трека между LiveKit и записью
+
+    Политики переполнения:
+    "drop_oldest" - вытеснить самый старый кадр (видео: важнее свежесть),
+    "drop_newest" - отбросить новый кадр,
+    "block" - ждать места в очереди, ничего не теряя (аудио: разрыв слышен).
+    Счетчики показывают, отстает ли наш обработчик: потери в сети видны
+    по пропускам во временных метках, а здесь - только наши собственные.
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        policy: str = "drop_oldest",
+        on_drop: Optional[Callable[[Any], None]] = None
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Неизвестная политика очереди: {policy}")
+
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.on_drop = on_drop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.maxsize)
+
+        # Статистика
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _drop(self, item: Any):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(item)
+        if self.dropped == 1 or self.dropped % 100 == 0:
+            logger.warning(f"Очередь {self.name} переполнена ({self.policy}), отброшено кадров: {self.dropped}")
+
+    def _make_room(self):
+        """Освободить место, вытеснив самый старый кадр"""
+        self._drop(self._queue.get_nowait())
+
+    async def put(self, item: Any) -> bool:
+        """Поставить кадр в очередь (False - кадр отброшен)"""
+        if self._queue.full():
+            if self.policy == "drop_newest":
+                self._drop(item)
+                return False
+            if self.policy == "drop_oldest":
+                self._make_room()
+            else:
+                started = time.monotonic()
+                await self._queue.put(item)
+                self.blocked_seconds += time.monotonic() - started
+                self._count_enqueued()
+                return True
+
+        self._queue.put_nowait(item)
+        self._count_enqueued()
+        return True
+
+    def _count_enqueued(self):
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def get(self) -> Optional[Any]:
+        """Следующий кадр (None - очередь закрыта)"""
+        item = await self._queue.get()
+        if item is _CLOSED:
+            return None
+        self.dequeued += 1
+        return item
+
+    async def close(self):
+        """Закрыть очередь: обработчик получит None после оставшихся кадров"""
+        await self._queue.put(_CLOSED)
+
+    def get_stats(self) -> dict:
+        """Получить статистику очереди"""
+        return {
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "dequeued": self.dequeued,
+            "dropped": self.dropped,
+            "blocked_seconds": round(self.blocked_seconds, 3)
+        }
@@ -0,0 +1,178 @@
+import logging
+import os
+import tempfile
+from typing import Optional, List
+
+import cv2
+import numpy as np
+
+from pipecat_integration.frame_formats import YUVFrame, VideoFrameData, bgr_to_i420, to_bgr
+
+logger = logging.getLogger(__name__)
+
+class FrameStore:
+    """
+    Хранилище сырых кадров записи с бюджетом памяти
+
+    Пока кадры помещаются в бюджет, они хранятся в памяти. После превышения
+    новые кадры пишутся в файл на диске с фиксированным шагом (один кадр -
+    один слот) и читаются обратно через mmap без копирования. Временные
+    метки всех кадров хранятся отдельным индексом, поэтому доступ к любому
+    кадру по номеру остается O(1).
+    """
+
+    def __init__(self, memory_budget: int, spill_dir: Optional[str] = None):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir or tempfile.gettempdir()
+
+        self._memory_frames: List[VideoFrameData] = []
+        self.memory_bytes = 0
+
+        self._timestamps = np.empty(1024, dtype=np.float64)
+        # Сколько повторов кадра простоя схлопнуто в каждый сохраненный кадр
+        self._repeats = np.zeros(1024, dtype=np.int32)
+        self._count = 0
+
+        # Файл выгрузки: геометрия задается первым выгруженным кадром
+        self.spill_path: Optional[str] = None
+        self._spill_file = None
+        self._spill_map: Optional[np.memmap] = None
+        self._spill_capacity = 0
+        self._spill_count = 0
+        self._spill_is_yuv = False
+        self._spill_size: Optional[tuple] = None
+        self._spill_stride = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def spilled_frames(self) -> int:
+        return self._spill_count
+
+    @property
+    def disk_bytes(self) -> int:
+        return self._spill_capacity * self._spill_stride
+
+    @property
+    def repeated_frames(self) -> int:
+        return int(self._repeats[:self._count].sum())
+
+    def timestamps(self) -> np.ndarray:
+        """Временные метки всех кадров (view без копирования)"""
+        return self._timestamps[:self._count]
+
+    def repeats(self) -> np.ndarray:
+        """Число схлопнутых повторов каждого кадра (view без копирования)"""
+        return self._repeats[:self._count]
+
+    def add_repeat(self):
+        """Учесть повтор последнего кадра без его хранения"""
+        if self._count:
+            self._repeats[self._count - 1] += 1
+
+    def append(self, frame: VideoFrameData, timestamp: float):
+        """Добавить кадр (в память или, при превышении бюджета, на диск)"""
+        if self._count == self._timestamps.size:
+            self._timestamps = np.resize(self._timestamps, self._timestamps.size * 2)
+            self._repeats = np.concatenate([self._repeats, np.zeros_like(self._repeats)])
+
+        if self._spill_map is None and self.memory_bytes + frame.nbytes <= self.memory_budget:
+            self._memory_frames.append(frame)
+            self.memory_bytes += frame.nbytes
+        else:
+            self._spill(frame)
+
+        self._timestamps[self._count] = timestamp
+        self._repeats[self._count] = 0
+        self._count += 1
+
+    def _open_spill(self, frame: VideoFrameData):
+        self._spill_is_yuv = isinstance(frame, YUVFrame)
+        self._spill_size = (frame.shape[1], frame.shape[0])
+        self._spill_stride = frame.nbytes
+
+        self._spill_file = tempfile.NamedTemporaryFile(
+            prefix="frames_", suffix=".raw", dir=self.spill_dir, delete=False
+        )
+        self.spill_path = self._spill_file.name
+        logger.info(f"Бюджет памяти кадров исчерпан, выгрузка на диск: {self.spill_path}")
+
+    def _grow_spill(self):
+        capacity = max(64, self._spill_capacity * 2)
+        self._spill_file.truncate(capacity * self._spill_stride)
+        self._spill_file.flush()
+        # Старое отображение остается живым, пока на него есть ссылки из выданных view
+        self._spill_map = np.memmap(
+            self._spill_file, dtype=np.uint8, mode='r+', shape=(capacity, self._spill_stride)
+        )
+        self._spill_capacity = capacity
+
+    def _fit(self, frame: VideoFrameData) -> np.ndarray:
+        """Сырые байты кадра в геометрии файла выгрузки"""
+        size = (frame.shape[1], frame.shape[0])
+        if size == self._spill_size and isinstance(frame, YUVFrame) == self._spill_is_yuv:
+            return frame.data if isinstance(frame, YUVFrame) else frame
+
+        # Разрешение потока изменилось: приводим к размеру слота
+        bgr = cv2.resize(to_bgr(frame), self._spill_size)
+        if self._spill_is_yuv:
+            # Нечетные размеры допустимы: раскладка как у захваченных кадров I420
+            return bgr_to_i420(bgr)
+        return bgr
+
+    def _spill(self, frame: VideoFrameData):
+        if self._spill_file is None:
+            self._open_spill(frame)
+        if self._spill_count == self._spill_capacity:
+            self._grow_spill()
+
+        data = np.ascontiguousarray(self._fit(frame)).reshape(-1)
+        if data.size != self._spill_stride:
+            raise ValueError(f"Размер кадра {data.size} не совпадает с шагом файла выгрузки {self._spill_stride}")
+        self._spill_map[self._spill_count] = data
+        self._spill_count += 1
+
+    def __getitem__(self, index: int) -> VideoFrameData:
+        """Кадр по номеру: из памяти или view на mmap (без копирования)"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+
+        if index < len(self._memory_frames):
+            return self._memory_frames[index]
+
+        row = self._spill_map[index - len(self._memory_frames)]
+        width, height = self._spill_size
+        if self._spill_is_yuv:
+            return YUVFrame(row, width, height)
+        return row.reshape((height, width, 3))
+
+    def get_stats(self) -> dict:
+        """Получить статистику хранилища"""
+        return {
+            "frames": self._count,
+            "memory_bytes": self.memory_bytes,
+            "memory_budget": self.memory_budget,
+            "spilled_frames": self._spill_count,
+            "repeated_frames": self.repeated_frames,
+            "disk_bytes": self.disk_bytes
+        }
+
+    def close(self):
+        """Освободить кадры и удалить файл выгрузки"""
+        self._memory_frames = []
+        self.memory_bytes = 0
+        self._count = 0
+        self._spill_map = None
+
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            try:
+                os.remove(self.spill_path)
+            except OSError as e:
+                logger.warning(f"Не удалось удалить файл выгрузки кадров {self.spill_path}: {e}")
+        self._spill_capacity = 0
+        self._spill_count = 0
@@ -19,6 +19,11 @@ class HeyGenFrameProcessor:
     и управления записью ответов аватара.
     """
     
+    # Таймауты ожидания события завершения задачи (секунды)
+    TASK_TIMEOUT_MARGIN = 5.0
+    TASK_COMPLETION_TIMEOUT = 30.0
+    TALKING_START_TIMEOUT = 10.0
+    
     def __init__(self, session_manager):
         # Инициализация компонентов
         self.session_manager = session_manager
@@ -28,6 +33,18 @@ class HeyGenFrameProcessor:
         self.current_task_id: Optional[str] = None
         self.current_recording_path: Optional[str] = None
     
+    def attach_session(self, session_manager, livekit_client: HeyGenLiveKitClient):
+        """Использовать уже подготовленную сессию (например, из пула)"""
+        self.session_manager = session_manager
+        self.livekit_client = livekit_client
+        self.stream_manager.session_manager = session_manager
+    
+    def detach_session(self, session_manager):
+        """Вернуться к собственной сессии после освобождения подготовленной"""
+        self.session_manager = session_manager
+        self.livekit_client = HeyGenLiveKitClient()
+        self.stream_manager.session_manager = session_manager
+    
     async def initialize(self) -> bool:
         """Инициализировать процессор"""
         logger.info("Инициализация HeyGen Frame Processor...")
@@ -79,30 +96,59 @@ class HeyGenFrameProcessor:
                     logger.error("Не удалось подключиться к LiveKit")
                     return None
             
-            # Начинаем запись перед отправкой задачи
-            task_id = f"task_{int(time.time())}"
-            recording_path = await self.livekit_client.start_recording(task_id)
-            if not recording_path:
-                logger.error("Не удалось начать запись")
-                return None
+            # С pre-roll запись начинается по событию avatar_start_talking:
+            # начало речи уже есть в буфере, а простой до него не записывается
+            task_sent_at = time.time()
+            task_id = f"task_{int(task_sent_at)}"
+            lazy_start = self.livekit_client.preroll_enabled and self.livekit_client.events_connected
+            
+            if not lazy_start:
+                # Начинаем запись перед отправкой задачи
+                recording_path = await self.livekit_client.start_recording(task_id)
+                if not recording_path:
+                    logger.error("Не удалось начать запись")
+                    return None
             
             # Отправляем задачу аватару через HTTP API
             result = await self.session_manager.send_task(text, task_type=task_type)
             if not result:
                 logger.error("Не удалось отправить задачу")
-                await self.livekit_client.stop_recording()
+                if self.livekit_client.is_recording:
+                    await self.livekit_client.stop_recording()
                 return None
             
             task_data = result.get('data', {})
             self.current_task_id = task_data.get('task_id', task_id)
-            duration_ms = task_data.get('duration_ms', 5000)  # По умолчанию 5 секунд
+            duration_ms = task_data.get('duration_ms')
             
-            logger.info(f"Задача отправлена, task_id: {self.current_task_id}, ожидание {duration_ms}ms...")
+            if lazy_start:
+                event = await self.livekit_client.wait_for_talking_start(
+                    self.current_task_id, timeout=self.TALKING_START_TIMEOUT, since=task_sent_at
+                )
+                if not event:
+                    logger.warning(f"Событие начала речи не получено за {self.TALKING_START_TIMEOUT:.1f} секунд")
+                
+                if not await self.livekit_client.start_recording(self.current_task_id):
+                    logger.error("Не удалось начать запись")
+                    return None
             
-            # Ждем завершения задачи (аватар генерирует ответ)
-            wait_time = (duration_ms / 1000) + 2.0  # +2 секунды для буфера
-            logger.info(f"Запись в течение {wait_time:.1f} секунд...")
-            await asyncio.sleep(wait_time)
+            logger.info(f"Задача отправлена, task_id: {self.current_task_id}, ожидание завершения...")
+            
+            if self.livekit_client.events_connected:
+                # Останавливаем запись точно по событию аватара, таймаут - страховка
+                timeout = (duration_ms / 1000) + self.TASK_TIMEOUT_MARGIN if duration_ms else self.TASK_COMPLETION_TIMEOUT
+                event = await self.livekit_client.wait_for_task_completion(
+                    self.current_task_id, timeout=timeout, since=task_sent_at
+                )
+                if event:
+                    logger.info(f"Получено событие {event.type} для задачи {self.current_task_id}")
+                else:
+                    logger.warning(f"Событие завершения задачи не получено за {timeout:.1f} секунд")
+            else:
+                # Без WebSocket событий ждем по оценке длительности
+                wait_time = ((duration_ms or 5000) / 1000) + 2.0  # +2 секунды для буфера
+                logger.info(f"Запись в течение {wait_time:.1f} секунд...")
+                await asyncio.sleep(wait_time)
             
             # Останавливаем запись и получаем путь к файлу
             video_path = await self.livekit_client.stop_recording()
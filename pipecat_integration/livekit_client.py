@@ -5,44 +5,351 @@ import cv2
 import numpy as np
 import time
 import websockets
-from typing import Optional, Callable
+from collections import deque
+from enum import Enum
+from typing import Optional, Callable, Dict, Any, Iterable, List, Set
 from datetime import datetime
 import os
 from urllib.parse import urlencode
 import tempfile
-import wave
-import subprocess
 
 from livekit import rtc
 from livekit.rtc import Room, RoomOptions, VideoFrame, AudioFrame, TrackKind, VideoBufferType
 import aiohttp
 
-try:
-    from scipy.io import wavfile
-    SCIPY_AVAILABLE = True
-except ImportError:
-    SCIPY_AVAILABLE = False
+from heygen.config import Config
+from pipecat_integration.media_writer import StreamingVideoWriter
+from pipecat_integration.video_encoders import EncoderBackend, select_encoder, open_video_writer
+from pipecat_integration.media_workers import MediaWorkerPool, get_media_workers
+from pipecat_integration.frame_queue import BoundedFrameQueue
+from pipecat_integration.frame_store import FrameStore
+from pipecat_integration.frame_dedup import FrameChangeDetector
+from pipecat_integration.preroll import PrerollBuffer
+from pipecat_integration.shared_frames import SharedFramePublisher
+from pipecat_integration.task_index import TaskIndex
+from pipecat_integration.audio_buffer import AudioBuffer
+from pipecat_integration.frame_formats import YUVFrame, bgr_to_i420, to_bgr, raw_bytes
+from utils.video_audio_merge import FFmpegPipeMuxer, encode_pcm_audio, merge_video_audio, check_ffmpeg_available
+from utils.clip_extract import extract_task_clips
+from utils.av_sync import cfr_frame_indices, VideoTimestampMapper
 
 logger = logging.getLogger(__name__)
 
+class AvatarEventType(str, Enum):
+    """Типы событий аватара из WebSocket HeyGen"""
+    AVATAR_START_TALKING = 'avatar_start_talking'
+    AVATAR_STOP_TALKING = 'avatar_stop_talking'
+    TASK_FINISHED = 'task_finished'
+
+class AvatarEvent:
+    """Событие аватара с привязкой к задаче"""
+    
+    def __init__(self, event_type: str, data: Dict[str, Any], timestamp: float = None):
+        self.type = event_type
+        self.task_id: Optional[str] = data.get('task_id')
+        self.data = data
+        self.timestamp = timestamp or time.time()
+    
+    def __repr__(self) -> str:
+        return f"AvatarEvent(type={self.type!r}, task_id={self.task_id!r})"
+
+class AvatarEventBus:
+    """Шина событий аватара: подписчики и ожидание событий по task_id"""
+    
+    def __init__(self, history_size: int = 64):
+        # Недавние события храним, чтобы не потерять событие, пришедшее до начала ожидания
+        self._history = deque(maxlen=history_size)
+        self._waiters: List[tuple] = []
+        self._subscribers: List[Callable[[AvatarEvent], None]] = []
+    
+    def subscribe(self, callback: Callable[[AvatarEvent], None]):
+        """Подписаться на все события"""
+        self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback: Callable[[AvatarEvent], None]):
+        """Отписаться от событий"""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+    
+    @staticmethod
+    def _matches(event: AvatarEvent, types: set, task_id: Optional[str], since: Optional[float]) -> bool:
+        if event.type not in types:
+            return False
+        if since is not None and event.timestamp < since:
+            return False
+        # События без task_id (например, avatar_stop_talking) относим к текущей задаче
+        return task_id is None or event.task_id is None or event.task_id == task_id
+    
+    def publish(self, event: AvatarEvent):
+        """Опубликовать событие подписчикам и ожидающим"""
+        self._history.append(event)
+        
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Ошибка в подписчике событий аватара: {e}")
+        
+        for waiter in list(self._waiters):
+            types, task_id, since, future = waiter
+            if not future.done() and self._matches(event, types, task_id, since):
+                future.set_result(event)
+    
+    async def wait_for(
+        self,
+        event_types: Iterable[str],
+        task_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        since: Optional[float] = None
+    ) -> Optional[AvatarEvent]:
+        """Дождаться события одного из типов для задачи. None при таймауте"""
+        types = {getattr(t, 'value', t) for t in event_types}
+        
+        for event in self._history:
+            if self._matches(event, types, task_id, since):
+                return event
+        
+        future = asyncio.get_running_loop().create_future()
+        waiter = (types, task_id, since, future)
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiters.remove(waiter)
+
+class RecordingState:
+    """
+    Состояние одной записи
+
+    Отделено от клиента, чтобы новая запись могла начаться, пока предыдущая
+    еще сохраняется в фоне.
+    """
+    
+    def __init__(self, task_id: str, base_filename: str, start_time: float, mode: str):
+        self.task_id = task_id
+        self.base_filename = base_filename
+        self.start_time = start_time
+        self.mode = mode
+        
+        # Хранилище кадров и кодировщики
+        self.frame_store = FrameStore(Config.FRAME_STORE_MEMORY_MB * 1024 * 1024, Config.FRAME_STORE_SPILL_DIR or None)
+        self.audio_buffer = AudioBuffer()
+        self.video_writer: Optional[StreamingVideoWriter] = None
+        self.muxer: Optional[FFmpegPipeMuxer] = None
+        # Способ кодирования видео по профилю клиента (None - режим без видео)
+        self.encoder: Optional[EncoderBackend] = None
+        
+        # Часы записи: видео по timestamp_us LiveKit, аудио по счетчику сэмплов
+        self.video_clock = VideoTimestampMapper()
+        self.first_audio_time: Optional[float] = None
+        self.audio_sample_rate: Optional[int] = None
+        self.audio_samples_captured = 0
+        
+        self.captured_video_frames = 0
+        self.captured_audio_frames = 0
+        # Кадры, потерянные в наших очередях, и пропуски в метках отправителя (сеть)
+        self.dropped_frames = {"video": 0, "audio": 0}
+        self.source_gaps = 0
+        
+        # Индекс границ задач (только для непрерывной записи сессии)
+        self.task_index: Optional[TaskIndex] = None
+        
+        # Схлопывание повторяющихся кадров простоя (None - отключено)
+        self.dedup = FrameChangeDetector(Config.FRAME_DEDUP_THRESHOLD) if Config.FRAME_DEDUP_THRESHOLD > 0 else None
+        self.last_video_timestamp: Optional[float] = None
+        
+        # Кадры в очередях обработки: сохранение ждет, пока они будут записаны
+        self.pending_frames = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+    
+    def path(self, output_directory: str, suffix: str = "", extension: str = "mp4") -> str:
+        return os.path.join(output_directory, f"{self.base_filename}{suffix}.{extension}")
+    
+    @property
+    def video_extension(self) -> str:
+        """Контейнер видео, совместимый с кодеком (VP8/VP9 - WebM)"""
+        return self.encoder.extension if self.encoder is not None else "mp4"
+    
+    def frame_queued(self):
+        self.pending_frames += 1
+        self._drained.clear()
+    
+    def frame_done(self):
+        self.pending_frames -= 1
+        if self.pending_frames <= 0:
+            self._drained.set()
+    
+    async def wait_drained(self):
+        """Дождаться обработки кадров, поставленных в очередь до остановки записи"""
+        await self._drained.wait()
+    
+    def video_end_time(self, fps: float) -> Optional[float]:
+        """Конец видео по последнему полученному кадру (включая схлопнутые повторы)"""
+        if self.last_video_timestamp is None:
+            return None
+        return self.last_video_timestamp + 1.0 / fps
+    
+    def audio_leading_silence(self) -> float:
+        """Тишина в начале аудио, выравнивающая его по началу записи"""
+        if self.first_audio_time is None:
+            return 0.0
+        return max(0.0, self.first_audio_time - self.start_time)
+    
+    def audio_end_time(self) -> Optional[float]:
+        """Конец записанного аудио по счетчику сэмплов (ведущие часы записи)"""
+        if self.first_audio_time is None or not self.audio_sample_rate:
+            return None
+        leading = max(0.0, self.first_audio_time - self.start_time)
+        return self.start_time + leading + self.audio_samples_captured / self.audio_sample_rate
+
 class HeyGenLiveKitClient:
     """Клиент для подключения к HeyGen через LiveKit"""
     
-    def __init__(self):
+    # Режимы записи: "buffered" - сырые кадры (в памяти, сверх бюджета - на диске) до stop_recording,
+    # "streaming" - кодирование по мере поступления в фоновом потоке,
+    # "muxed" - видео и аудио через pipe в один процесс FFmpeg (итоговый файл за один проход),
+    # "segmented" - как muxed, но HLS плейлист и сегменты fMP4, которые сразу сохраняются на диск,
+    # "audio" - только речь аватара: видео треки не декодируются, файл пишется из аудио буфера.
+    # Записи VP8 потока без декодирования нет: rtc.VideoStream отдает только декодированные
+    # кадры, доступа к закодированным кадрам трека в Python SDK LiveKit нет
+    RECORDING_MODES = ("buffered", "streaming", "muxed", "segmented", "audio")
+    
+    # Форматы файла режима "audio" и их расширения
+    AUDIO_FORMATS = {"wav": "wav", "opus": "ogg", "aac": "m4a"}
+    
+    # Формат захвата кадров: "bgr" - преобразование при захвате,
+    # "i420" - нативный YUV без преобразований (BGR только по запросу)
+    PIXEL_FORMATS = ("bgr", "i420")
+    
+    # Постоянная частота кадров выходного видео
+    OUTPUT_FPS = 30
+    
+    # Интервал между метками кадров, который считается потерей в сети (мкс)
+    SOURCE_GAP_US = 200_000
+    
+    # Интервал ключевых кадров записи сессии, чтобы клипы задач резались точно (секунды)
+    SESSION_KEYFRAME_INTERVAL = 1.0
+    
+    def __init__(
+        self,
+        recording_mode: str = "buffered",
+        pixel_format: str = "bgr",
+        workers: Optional[MediaWorkerPool] = None,
+        preroll_seconds: Optional[float] = None,
+        audio_format: str = "wav",
+        encoder_profile: Optional[str] = None,
+        shared_frames_name: Optional[str] = None
+    ):
+        if recording_mode not in self.RECORDING_MODES:
+            raise ValueError(f"Неизвестный режим записи: {recording_mode}")
+        if audio_format not in self.AUDIO_FORMATS:
+            raise ValueError(f"Неизвестный формат аудио: {audio_format}")
+        if pixel_format not in self.PIXEL_FORMATS:
+            raise ValueError(f"Неизвестный формат кадров: {pixel_format}")
+        
+        self.recording_mode = recording_mode
+        self.pixel_format = pixel_format
+        self.audio_format = audio_format
+        # Профиль кодирования видео (см. pipecat_integration.video_encoders.PROFILES)
+        self.encoder_profile = encoder_profile or Config.VIDEO_ENCODER_PROFILE
         self.room: Optional[Room] = None
         self.websocket: Optional[websockets.WebSocketServerProtocol] = None
         self.is_connected = False
-        self.is_recording = False
-        self.current_task_id: Optional[str] = None
         self.output_directory = "outputs"
         
         # Создать директорию для выходных файлов
         os.makedirs(self.output_directory, exist_ok=True)
         
-        # Хранилище кадров для записи
-        self.video_frames = []
-        self.audio_frames = []
-        self.recording_start_time = None
+        # Текущая запись и записи, которые сохраняются в фоне
+        self.recording: Optional[RecordingState] = None
+        self._finalizing: Set[asyncio.Task] = set()
+        
+        # Очереди кадров подписанных треков (для статистики отставания)
+        self.frame_queues: Dict[str, BoundedFrameQueue] = {}
+        
+        # Pre-roll: последние секунды каждого трека вклеиваются в начало записи
+        self.preroll_seconds = Config.PREROLL_SECONDS if preroll_seconds is None else preroll_seconds
+        self.prerolls: Dict[str, PrerollBuffer] = {}
+        
+        # Преобразование и кодирование кадров выполняются вне event loop
+        self.workers = workers or get_media_workers()
+        
+        # События аватара из WebSocket
+        self.events = AvatarEventBus()
+        
+        # Последний кадр в разделяемой памяти для процессов предпросмотра и анализа
+        shared_frames_name = shared_frames_name or Config.FRAME_SHM_NAME
+        self.frame_publisher = SharedFramePublisher(shared_frames_name, Config.FRAME_SHM_SLOTS) if shared_frames_name else None
+        self._publish_task: Optional[asyncio.Task] = None
+        
+        # Подписчики декодированных кадров (трансляция зрителям и т.п.)
+        self._frame_subscribers: List[Callable[[VideoFrame, float], None]] = []
+    
+    def subscribe_frames(self, callback: Callable[[VideoFrame, float], None]):
+        """
+        Подписаться на декодированные кадры видео (callback(frame, время прихода))
+        
+        Вызывается в event loop на каждый кадр, поэтому должен только запоминать кадр,
+        а тяжелую обработку выполнять отдельно.
+        """
+        self._frame_subscribers.append(callback)
+    
+    def unsubscribe_frames(self, callback: Callable[[VideoFrame, float], None]):
+        """Отписаться от кадров"""
+        if callback in self._frame_subscribers:
+            self._frame_subscribers.remove(callback)
+    
+    @property
+    def is_recording(self) -> bool:
+        return self.recording is not None
+    
+    @property
+    def current_task_id(self) -> Optional[str]:
+        return self.recording.task_id if self.recording else None
+    
+    @property
+    def audio_only(self) -> bool:
+        return self.recording_mode == "audio"
+    
+    @property
+    def preroll_enabled(self) -> bool:
+        return self.preroll_seconds > 0
+    
+    @property
+    def events_connected(self) -> bool:
+        """Подключен ли WebSocket событий аватара"""
+        return self.websocket is not None
+    
+    async def wait_for_task_completion(
+        self,
+        task_id: Optional[str] = None,
+        timeout: float = 30.0,
+        since: Optional[float] = None
+    ) -> Optional[AvatarEvent]:
+        """Дождаться avatar_stop_talking или task_finished для задачи (None при таймауте)"""
+        return await self.events.wait_for(
+            (AvatarEventType.AVATAR_STOP_TALKING, AvatarEventType.TASK_FINISHED),
+            task_id=task_id,
+            timeout=timeout,
+            since=since
+        )
+    
+    async def wait_for_talking_start(
+        self,
+        task_id: Optional[str] = None,
+        timeout: float = 10.0,
+        since: Optional[float] = None
+    ) -> Optional[AvatarEvent]:
+        """Дождаться avatar_start_talking для задачи (None при таймауте)"""
+        return await self.events.wait_for(
+            (AvatarEventType.AVATAR_START_TALKING,),
+            task_id=task_id,
+            timeout=timeout,
+            since=since
+        )
     
     async def connect_websocket_events(self, session_id: str, session_token: str, server_url: str) -> bool:
         """Подключиться к WebSocket для мониторинга событий аватара"""
@@ -84,12 +391,15 @@ class HeyGenLiveKitClient:
                     
                     # Обработать различные типы событий
                     event_type = data.get('type')
-                    if event_type == 'avatar_start_talking':
+                    if event_type == AvatarEventType.AVATAR_START_TALKING:
                         logger.info("Аватар начал говорить")
-                    elif event_type == 'avatar_stop_talking':
+                    elif event_type == AvatarEventType.AVATAR_STOP_TALKING:
                         logger.info("Аватар закончил говорить")
-                    elif event_type == 'task_finished':
+                    elif event_type == AvatarEventType.TASK_FINISHED:
                         logger.info(f"Задача завершена: {data}")
+                    
+                    if event_type:
+                        self.events.publish(AvatarEvent(event_type, data))
                         
                 except json.JSONDecodeError:
                     logger.error(f"Не удалось парсить WebSocket сообщение: {message}")
@@ -109,7 +419,11 @@ class HeyGenLiveKitClient:
             @self.room.on("track_subscribed")
             def on_track_subscribed(track, publication, participant):
                 logger.info(f"Track subscribed: {track.kind} from {participant.identity}")
-                if track.kind == TrackKind.KIND_VIDEO:
+                if track.kind == TrackKind.KIND_VIDEO and self.audio_only:
+                    # Видео не нужно: отписываемся, чтобы не получать и не декодировать кадры
+                    publication.set_subscribed(False)
+                    logger.info("Режим audio: подписка на видео трек отменена")
+                elif track.kind == TrackKind.KIND_VIDEO:
                     asyncio.create_task(self._handle_video_track(track))
                 elif track.kind == TrackKind.KIND_AUDIO:
                     asyncio.create_task(self._handle_audio_track(track))
@@ -189,7 +503,7 @@ class HeyGenLiveKitClient:
             video_stream = rtc.VideoStream(track)
             
             # Запустить обработку кадров в фоне
-            asyncio.create_task(self._process_video_stream(video_stream))
+            asyncio.create_task(self._process_video_stream(video_stream, f"video:{track.sid}"))
                     
         except Exception as e:
             logger.error(f"Ошибка обработки видео трека: {e}")
@@ -203,81 +517,242 @@ class HeyGenLiveKitClient:
             audio_stream = rtc.AudioStream(track)
             
             # Запустить обработку кадров в фоне
-            asyncio.create_task(self._process_audio_stream(audio_stream))
+            asyncio.create_task(self._process_audio_stream(audio_stream, f"audio:{track.sid}"))
                     
         except Exception as e:
             logger.error(f"Ошибка обработки аудио трека: {e}")
     
-    async def _process_video_stream(self, video_stream):
+    def _create_frame_queue(self, name: str, kind: str) -> BoundedFrameQueue:
+        """Очередь кадров трека: видео вытесняет старые кадры, аудио не теряется"""
+        if kind == "video":
+            maxsize, policy = Config.VIDEO_FRAME_QUEUE_SIZE, Config.VIDEO_FRAME_QUEUE_POLICY
+        else:
+            maxsize, policy = Config.AUDIO_FRAME_QUEUE_SIZE, Config.AUDIO_FRAME_QUEUE_POLICY
+        
+        def on_drop(item):
+            recording = item[0]
+            recording.frame_done()
+            recording.dropped_frames[kind] += 1
+        
+        frame_queue = BoundedFrameQueue(name, maxsize, policy, on_drop=on_drop)
+        self.frame_queues[name] = frame_queue
+        return frame_queue
+    
+    def _create_preroll(self, name: str, kind: str) -> PrerollBuffer:
+        """Pre-roll трека: видео до 60 кадров/с, аудио до 100 кадров/с (10 мс)"""
+        frames_per_second = 60 if kind == "video" else 100
+        preroll = PrerollBuffer(self.preroll_seconds, int(self.preroll_seconds * frames_per_second) + 1)
+        self.prerolls[name] = preroll
+        return preroll
+    
+    def _take_frames(
+        self,
+        recording: Optional[RecordingState],
+        spliced: Optional[RecordingState],
+        preroll: PrerollBuffer,
+        frame,
+        timestamp_us: Optional[int],
+        arrival_time: float
+    ) -> List[tuple]:
+        """Кадры для постановки в очередь: при новой записи сначала вклеивается pre-roll"""
+        frames = preroll.drain(recording.start_time) if recording is not None and recording is not spliced else []
+        preroll.append(frame, timestamp_us, arrival_time)
+        if recording is not None:
+            frames.append((frame, timestamp_us, arrival_time))
+        return frames
+    
+    async def _process_video_stream(self, video_stream, name: str = "video"):
         """Обработка видео потока"""
+        # Кадры передаются обработчику через ограниченную очередь, чтобы чтение
+        # потока не ждало преобразования и кодирования
+        frame_queue = self._create_frame_queue(name, "video")
+        preroll = self._create_preroll(name, "video")
+        worker = asyncio.create_task(self._frame_worker(frame_queue, self._process_video_frame))
+        spliced: Optional[RecordingState] = None
+        last_timestamp_us = None
         try:
             async for frame_event in video_stream:
-                if self.is_recording:
-                    await self._process_video_frame(frame_event.frame)
+                arrival_time = time.time()
+                for callback in list(self._frame_subscribers):
+                    try:
+                        callback(frame_event.frame, arrival_time)
+                    except Exception as e:
+                        logger.error(f"Ошибка в подписчике кадров: {e}")
+                
+                publisher = self.frame_publisher
+                if publisher is not None and (self._publish_task is None or self._publish_task.done()):
+                    # Публикуется только последний кадр: пришедшие во время записи в слот пропускаются
+                    self._publish_task = asyncio.create_task(
+                        self.workers.run(self._publish_frame, publisher, frame_event.frame, arrival_time)
+                    )
+                
+                recording = self.recording
+                frames = self._take_frames(
+                    recording, spliced, preroll, frame_event.frame, frame_event.timestamp_us, arrival_time
+                )
+                if recording is not spliced:
+                    spliced, last_timestamp_us = recording, None
+                
+                for frame, timestamp_us, arrival_time in frames:
+                    # Пропуск во временных метках отправителя - потеря кадров до нас (сеть)
+                    if last_timestamp_us and timestamp_us and timestamp_us - last_timestamp_us > self.SOURCE_GAP_US:
+                        recording.source_gaps += 1
+                    last_timestamp_us = timestamp_us
+                    
+                    # Временная метка по часам отправителя, привязанным к настенным
+                    timestamp = recording.video_clock.to_wall_time(timestamp_us, arrival_time)
+                    recording.frame_queued()
+                    await frame_queue.put((recording, frame, timestamp))
         except Exception as e:
             logger.error(f"Ошибка обработки видео потока: {e}")
+        finally:
+            await frame_queue.close()
+            await worker
+            self.frame_queues.pop(name, None)
+            self.prerolls.pop(name, None)
     
-    async def _process_audio_stream(self, audio_stream):
+    async def _process_audio_stream(self, audio_stream, name: str = "audio"):
         """Обработка аудио потока"""
+        frame_queue = self._create_frame_queue(name, "audio")
+        preroll = self._create_preroll(name, "audio")
+        worker = asyncio.create_task(self._frame_worker(frame_queue, self._process_audio_frame))
+        spliced: Optional[RecordingState] = None
         try:
             async for frame_event in audio_stream:
-                if self.is_recording:
-                    await self._process_audio_frame(frame_event.frame)
+                # Время прихода фиксируется здесь: по нему выравнивается начало аудио
+                recording = self.recording
+                frames = self._take_frames(recording, spliced, preroll, frame_event.frame, None, time.time())
+                spliced = recording
+                
+                for frame, _, arrival_time in frames:
+                    recording.frame_queued()
+                    await frame_queue.put((recording, frame, arrival_time))
         except Exception as e:
             logger.error(f"Ошибка обработки аудио потока: {e}")
+        finally:
+            await frame_queue.close()
+            await worker
+            self.frame_queues.pop(name, None)
+            self.prerolls.pop(name, None)
     
-    async def _process_video_frame(self, frame: VideoFrame):
+    async def _frame_worker(self, frame_queue: BoundedFrameQueue, handler: Callable):
+        """Обработчик очереди кадров трека (порядок кадров сохраняется)"""
+        while True:
+            item = await frame_queue.get()
+            if item is None:
+                break
+            
+            recording, frame, timestamp = item
+            try:
+                await handler(recording, frame, timestamp)
+            finally:
+                recording.frame_done()
+    
+    def _capture_bgr(self, frame: VideoFrame) -> np.ndarray:
+        """Преобразовать VideoFrame в BGR кадр для OpenCV"""
+        # Конвертировать VideoFrame в RGB24 формат
+        rgb_frame = frame.convert(VideoBufferType.RGB24)
+        
+        # Получить данные как bytes и конвертировать в numpy array
+        frame_array = np.frombuffer(rgb_frame.data, dtype=np.uint8)
+        frame_array = frame_array.reshape((rgb_frame.height, rgb_frame.width, 3))
+        
+        # Конвертировать RGB в BGR для OpenCV
+        return cv2.cvtColor(frame_array, cv2.COLOR_RGB2BGR)
+    
+    def _capture_i420(self, frame: VideoFrame) -> YUVFrame:
+        """Взять кадр в нативном I420 без копирования и преобразования цвета"""
+        if frame.type != VideoBufferType.I420:
+            frame = frame.convert(VideoBufferType.I420)
+        
+        # Массив ссылается на буфер кадра, поэтому данные не копируются
+        data = np.frombuffer(frame.data, dtype=np.uint8)
+        return YUVFrame(data, frame.width, frame.height)
+    
+    def _publish_frame(self, publisher: SharedFramePublisher, frame: VideoFrame, timestamp: float):
+        """Записать кадр в разделяемую память (I420 - без преобразования цвета)"""
+        try:
+            publisher.publish(self._capture_i420(frame), timestamp)
+        except Exception as e:
+            logger.error(f"Ошибка публикации кадра: {e}")
+    
+    def _capture_frame(self, recording: RecordingState, frame: VideoFrame) -> tuple:
+        """Захватить кадр и проверить, не повторяет ли он предыдущий (в пуле потоков)"""
+        capture = self._capture_i420 if self.pixel_format == "i420" else self._capture_bgr
+        captured = capture(frame)
+        duplicate = recording.dedup is not None and recording.dedup.is_duplicate(captured)
+        return captured, duplicate
+    
+    async def _process_video_frame(self, recording: RecordingState, frame: VideoFrame, timestamp: float):
         """Обработать видео кадр"""
         try:
-            if self.is_recording:
-                # Конвертировать VideoFrame в RGB24 формат
-                rgb_frame = frame.convert(VideoBufferType.RGB24)
-                
-                # Получить данные кадра
-                width = rgb_frame.width
-                height = rgb_frame.height
-                
-                # Получить данные как bytes и конвертировать в numpy array
-                frame_data = rgb_frame.data
-                
-                # Создать numpy array из bytes данных
-                frame_array = np.frombuffer(frame_data, dtype=np.uint8)
-                frame_array = frame_array.reshape((height, width, 3))
-                
-                # Конвертировать RGB в BGR для OpenCV
-                img_bgr = cv2.cvtColor(frame_array, cv2.COLOR_RGB2BGR)
-                
-                # Добавить временную метку
-                timestamp = time.time()
-                self.video_frames.append({
-                    'frame': img_bgr,
-                    'timestamp': timestamp
-                })
-                
-                logger.debug(f"Захвачен видео кадр: {width}x{height}")
-                
+            width = frame.width
+            height = frame.height
+            
+            # Преобразование выполняется в пуле потоков (cv2, numpy и FFI освобождают GIL)
+            captured, duplicate = await self.workers.run(self._capture_frame, recording, frame)
+            recording.captured_video_frames += 1
+            recording.last_video_timestamp = timestamp
+            
+            if duplicate:
+                # Повтор кадра простоя не хранится и не кодируется: слоты CFR до следующего
+                # отличающегося кадра заполняются предыдущим кадром по временным меткам
+                if recording.muxer is None and recording.video_writer is None:
+                    recording.frame_store.add_repeat()
+                return
+            
+            if recording.muxer is not None:
+                # Режим мультиплексора: FFmpeg запускается, когда известно разрешение
+                if not recording.muxer.is_started:
+                    recording.muxer.start(width, height)
+                recording.muxer.write_video(raw_bytes(captured), timestamp)
+            elif recording.video_writer is not None:
+                # Потоковый режим: кадр сразу уходит в фоновый кодировщик
+                recording.video_writer.write(captured, timestamp)
+            else:
+                # Сверх бюджета памяти кадр пишется в файл выгрузки, поэтому - в пуле потоков
+                await self.workers.run(recording.frame_store.append, captured, timestamp)
+            
+            logger.debug(f"Захвачен видео кадр: {width}x{height}")
+            
         except Exception as e:
             logger.error(f"Ошибка обработки видео кадра: {e}")
     
-    async def _process_audio_frame(self, frame: AudioFrame):
+    async def _process_audio_frame(self, recording: RecordingState, frame: AudioFrame, timestamp: float):
         """Обработать аудио кадр"""
         try:
-            if self.is_recording:
-                # Сохранить аудио данные
-                timestamp = time.time()
-                self.audio_frames.append({
-                    'data': frame.data,
-                    'sample_rate': frame.sample_rate,
-                    'channels': frame.num_channels,
-                    'timestamp': timestamp
-                })
-                
-                logger.debug(f"Захвачен аудио кадр: {frame.sample_rate}Hz, {frame.num_channels} каналов")
-                
+            # Сохранить аудио данные
+            recording.captured_audio_frames += 1
+            
+            if recording.first_audio_time is None:
+                # Начало аудио: момент прихода первого кадра минус его длительность
+                recording.first_audio_time = timestamp - frame.samples_per_channel / frame.sample_rate
+                recording.audio_sample_rate = frame.sample_rate
+            recording.audio_samples_captured += frame.samples_per_channel
+            
+            if recording.muxer is not None:
+                recording.muxer.write_audio(frame.data, recording.first_audio_time)
+            else:
+                buffer = recording.audio_buffer
+                if len(buffer) == 0 and (buffer.sample_rate, buffer.channels) != (frame.sample_rate, frame.num_channels):
+                    recording.audio_buffer = AudioBuffer(frame.sample_rate, frame.num_channels)
+                recording.audio_buffer.append(frame.data, timestamp)
+            
+            logger.debug(f"Захвачен аудио кадр: {frame.sample_rate}Hz, {frame.num_channels} каналов")
+            
         except Exception as e:
             logger.error(f"Ошибка обработки аудио кадра: {e}")
     
-    async def start_recording(self, task_id: str) -> Optional[str]:
+    async def start_session_recording(self, session_task_id: str) -> Optional[str]:
+        """
+        Начать непрерывную запись всей сессии с индексом границ задач
+        
+        Клипы отдельных задач потом вырезаются из одного файла без
+        перекодирования (extract_task_clips) вместо отдельной записи на задачу.
+        """
+        return await self.start_recording(session_task_id, index_tasks=True)
+    
+    async def start_recording(self, task_id: str, index_tasks: bool = False) -> Optional[str]:
         """Начать запись видео/аудио"""
         if not self.is_connected:
             logger.error("LiveKit не подключен")
@@ -288,223 +763,277 @@ class HeyGenLiveKitClient:
             return None
         
         try:
-            self.current_task_id = task_id
-            self.is_recording = True
-            self.recording_start_time = time.time()
-            self.video_frames = []
-            self.audio_frames = []
+            recording_mode = self.recording_mode
+            # Первая проверка запускает ffmpeg (до 10 с), поэтому - вне event loop
+            if recording_mode in ("muxed", "segmented") and not await self.workers.run(FFmpegPipeMuxer.is_supported):
+                logger.warning("FFmpeg мультиплексор недоступен, используем потоковый режим")
+                recording_mode = "streaming"
             
-            logger.info(f"Начата запись для задачи: {task_id}")
-            return task_id
+            encoder = None
+            if recording_mode != "audio":
+                # Доступные кодировщики определяются один раз, дальше выбор берется из кэша
+                encoder = await self.workers.run(select_encoder, self.encoder_profile)
             
-        except Exception as e:
-            logger.error(f"Ошибка начала записи: {e}")
-            return None
-    
-    def _check_ffmpeg_available(self) -> bool:
-        """Проверить доступность FFmpeg в системе"""
-        try:
-            result = subprocess.run(['ffmpeg', '-version'], capture_output=True, timeout=5)
-            return result.returncode == 0
-        except:
-            return False
-
-    async def _merge_video_audio_with_ffmpeg(self, video_path: str, audio_path: str, output_path: str) -> bool:
-        """Объединить видео и аудио с помощью системного FFmpeg"""
-        try:
-            # Проверить наличие файлов
-            if not os.path.exists(video_path):
-                logger.error(f"Видео файл не найден: {video_path}")
-                return False
-                
-            if not os.path.exists(audio_path):
-                logger.error(f"Аудио файл не найден: {audio_path}")
-                return False
+            # Запись начинается с самого старого кадра pre-roll
+            start_time = time.time()
+            preroll_times = [p.oldest_time for p in self.prerolls.values() if len(p)]
+            if preroll_times:
+                start_time = min(min(preroll_times), start_time)
             
-            # Команда FFmpeg для объединения видео и аудио
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,  # Входное видео
-                '-i', audio_path,  # Входное аудио
-                '-c:v', 'copy',    # Копировать видео без перекодирования
-                '-c:a', 'aac',     # Кодировать аудио в AAC
-                '-shortest',       # Остановиться когда закончится самый короткий поток
-                '-y',              # Перезаписать выходной файл если существует
-                output_path
-            ]
-            
-            logger.info(f"Объединение видео и аудио с помощью FFmpeg...")
-            
-            # Выполнить команду
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30  # Таймаут 30 секунд
+            # Имена файлов определяем в начале записи, чтобы потоковый режим писал сразу на диск
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            task_suffix = f"_{task_id}" if task_id else ""
+            recording = RecordingState(
+                task_id,
+                f"avatar_response_{timestamp}{task_suffix}",
+                start_time,
+                recording_mode
             )
+            recording.encoder = encoder
             
-            if result.returncode == 0:
-                logger.info(f"✅ Видео с аудио создано: {output_path}")
-                return True
-            else:
-                logger.error(f"❌ Ошибка FFmpeg: {result.stderr}")
-                return False
+            if recording_mode in ("muxed", "segmented"):
+                if recording_mode == "segmented":
+                    # Плейлист и сегменты записи - в отдельном каталоге
+                    segment_dir = os.path.join(self.output_directory, recording.base_filename)
+                    os.makedirs(segment_dir, exist_ok=True)
+                    output_path = os.path.join(segment_dir, "playlist.m3u8")
+                else:
+                    output_path = recording.path(self.output_directory)
                 
-        except subprocess.TimeoutExpired:
-            logger.error("❌ Таймаут выполнения FFmpeg")
-            return False
-        except FileNotFoundError:
-            logger.error("❌ FFmpeg не найден в системе")
-            logger.info("💡 Установите FFmpeg: brew install ffmpeg")
-            return False
-        except Exception as e:
-            logger.error(f"❌ Ошибка объединения: {e}")
-            return False
-        """Сохранить аудио кадры в WAV файл"""
-        try:
-            if not self.audio_frames:
-                logger.warning("Нет аудио кадров для сохранения")
-                return False
+                # Параметры аудио совпадают с настройками rtc.AudioStream по умолчанию
+                recording.muxer = FFmpegPipeMuxer(
+                    output_path,
+                    fps=self.OUTPUT_FPS,
+                    pix_fmt='yuv420p' if self.pixel_format == "i420" else 'bgr24',
+                    sample_rate=48000,
+                    channels=1,
+                    start_time=recording.start_time,
+                    keyframe_interval=self.SESSION_KEYFRAME_INTERVAL if index_tasks else None,
+                    segment_duration=Config.SEGMENT_DURATION if recording_mode == "segmented" else None,
+                    # Итоговый файл - MP4/fMP4, поэтому параметры профиля берутся только для H.264
+                    video_options=recording.encoder.ffmpeg_options() if recording.encoder.codec == "libx264" else None
+                )
+            elif recording_mode == "streaming":
+                recording.video_writer = StreamingVideoWriter(
+                    recording.path(self.output_directory, "_video_only", recording.video_extension),
+                    fps=self.OUTPUT_FPS,
+                    encoder=recording.encoder,
+                    start_time=recording.start_time
+                )
+                recording.video_writer.start()
             
-            # Определить параметры аудио из первого кадра
-            if self.audio_frames:
-                first_frame = self.audio_frames[0]
-                sample_rate = first_frame['sample_rate']
-                channels = first_frame['channels']
-            else:
-                return False
+            if index_tasks:
+                recording.task_index = TaskIndex(recording.start_time)
+                self.events.subscribe(recording.task_index.on_event)
             
-            # Объединить все аудио данные
-            audio_data = []
-            for frame_info in self.audio_frames:
-                # Конвертировать bytes в numpy array
-                frame_data = np.frombuffer(frame_info['data'], dtype=np.int16)
-                audio_data.append(frame_data)
+            self.recording = recording
+            logger.info(f"Начата запись для задачи: {task_id}")
+            return task_id
             
-            if audio_data:
-                # Объединить все аудио кадры
-                combined_audio = np.concatenate(audio_data)
-                
-                # Сохранить как WAV файл
-                if SCIPY_AVAILABLE:
-                    from scipy.io import wavfile
-                    wavfile.write(audio_path, sample_rate, combined_audio)
-                else:
-                    # Альтернативный способ через wave модуль
-                    with wave.open(audio_path, 'wb') as wav_file:
-                        wav_file.setnchannels(channels)
-                        wav_file.setsampwidth(2)  # 16-bit
-                        wav_file.setframerate(sample_rate)
-                        wav_file.writeframes(combined_audio.tobytes())
-                
-                logger.info(f"Аудио сохранено: {audio_path} ({len(self.audio_frames)} кадров)")
-                return True
-            else:
-                logger.warning("Нет аудио данных для сохранения")
-                return False
-                
         except Exception as e:
-            logger.error(f"Ошибка сохранения аудио: {e}")
-            return False
+            logger.error(f"Ошибка начала записи: {e}")
+            return None
+    
+    def _check_ffmpeg_available(self) -> bool:
+        """Проверить доступность FFmpeg в системе (проверка кэшируется на процесс)"""
+        return check_ffmpeg_available()
+
+    async def _merge_video_audio_with_ffmpeg(
+        self,
+        video_path: str,
+        audio_path: str,
+        output_path: str,
+        duration: Optional[float] = None
+    ) -> bool:
+        """Объединить видео и аудио с помощью системного FFmpeg (без блокировки event loop)"""
+        logger.info(f"Объединение видео и аудио с помощью FFmpeg...")
+        return await merge_video_audio(video_path, audio_path, output_path, duration=duration)
 
-    async def _save_audio_to_wav(self, audio_path: str) -> bool:
+    async def _save_audio_to_wav(self, recording: RecordingState, audio_path: str) -> bool:
         """Сохранить аудио кадры в WAV файл"""
         try:
-            if not self.audio_frames:
+            if not len(recording.audio_buffer):
                 logger.warning("Нет аудио кадров для сохранения")
                 return False
             
-            # Определить параметры аудио из первого кадра
-            if self.audio_frames:
-                first_frame = self.audio_frames[0]
-                sample_rate = first_frame['sample_rate']
-                channels = first_frame['channels']
-            else:
-                return False
+            # Данные пишутся напрямую из буфера, без объединения кадров в памяти
+            await self.workers.run(recording.audio_buffer.write_wav, audio_path, recording.audio_leading_silence())
             
-            # Объединить все аудио данные
-            audio_data = []
-            for frame_info in self.audio_frames:
-                # Конвертировать bytes в numpy array
-                frame_data = np.frombuffer(frame_info['data'], dtype=np.int16)
-                audio_data.append(frame_data)
-            
-            if audio_data:
-                # Объединить все аудио кадры
-                combined_audio = np.concatenate(audio_data)
-                
-                # Сохранить как WAV файл
-                if SCIPY_AVAILABLE:
-                    from scipy.io import wavfile
-                    wavfile.write(audio_path, sample_rate, combined_audio)
-                else:
-                    # Альтернативный способ через wave модуль
-                    with wave.open(audio_path, 'wb') as wav_file:
-                        wav_file.setnchannels(channels)
-                        wav_file.setsampwidth(2)  # 16-bit
-                        wav_file.setframerate(sample_rate)
-                        wav_file.writeframes(combined_audio.tobytes())
-                
-                logger.info(f"Аудио сохранено: {audio_path} ({len(self.audio_frames)} кадров)")
-                return True
-            else:
-                logger.warning("Нет аудио данных для сохранения")
-                return False
+            logger.info(f"Аудио сохранено: {audio_path} ({len(recording.audio_buffer)} кадров)")
+            return True
                 
         except Exception as e:
             logger.error(f"Ошибка сохранения аудио: {e}")
             return False
-
-    async def stop_recording(self) -> Optional[str]:
-        """Остановить запись и сохранить файлы с аудио"""
-        if not self.is_recording:
-            logger.warning("Запись не активна")
+    
+    async def _save_audio_only(self, recording: RecordingState) -> Optional[str]:
+        """Сохранить запись режима audio напрямую из аудио буфера (WAV, Opus или AAC)"""
+        buffer = recording.audio_buffer
+        if not len(buffer):
+            logger.warning("Нет аудио кадров для сохранения")
             return None
         
+        audio_format = self.audio_format
+        if audio_format != "wav" and not await self.workers.run(self._check_ffmpeg_available):
+            logger.warning("FFmpeg недоступен, сохраняем аудио в WAV")
+            audio_format = "wav"
+        
+        audio_path = recording.path(self.output_directory, extension=self.AUDIO_FORMATS[audio_format])
+        if audio_format == "wav":
+            return audio_path if await self._save_audio_to_wav(recording, audio_path) else None
+        
+        encoded = await encode_pcm_audio(
+            buffer.segments(),
+            audio_path,
+            buffer.sample_rate,
+            buffer.channels,
+            audio_format,
+            recording.audio_leading_silence()
+        )
+        if not encoded:
+            return None
+        
+        logger.info(f"Аудио сохранено: {audio_path} ({recording.captured_audio_frames} кадров)")
+        return audio_path
+    
+    def _write_buffered_video(self, recording: RecordingState, video_only_path: str):
+        """Закодировать накопленные кадры в файл с постоянной частотой кадров"""
+        frame_store = recording.frame_store
+        height, width = frame_store[0].shape[:2]
+        fps = self.OUTPUT_FPS
+        
+        # Разложить кадры по слотам CFR: пропуски дублируются, лишние кадры отбрасываются
+        timestamps = frame_store.timestamps()
+        end_time = recording.audio_end_time() or recording.video_end_time(fps)
+        frame_indices = cfr_frame_indices(timestamps, fps, recording.start_time, end_time - recording.start_time)
+        
+        # Кодировщик FFmpeg принимает кадры I420 как есть, OpenCV - только BGR
+        yuv_input = recording.encoder.uses_ffmpeg and isinstance(frame_store[0], YUVFrame)
+        video_writer = open_video_writer(
+            recording.encoder, video_only_path, fps, (width, height),
+            pix_fmt='yuv420p' if yuv_input else 'bgr24'
+        )
+        
+        # Записать кадры в порядке слотов (каждый кадр преобразуется не больше одного раза,
+        # выгруженные на диск кадры читаются из mmap без копирования)
+        last_index, last_data = -1, None
+        for index in frame_indices:
+            if index != last_index:
+                frame = frame_store[index]
+                if (frame.shape[1], frame.shape[0]) != (width, height):
+                    # Разрешение потока изменилось: приводим к размеру записи
+                    frame = cv2.resize(to_bgr(frame), (width, height))
+                    if yuv_input:
+                        frame = YUVFrame(bgr_to_i420(frame), width, height)
+                last_index, last_data = index, frame.data if yuv_input else to_bgr(frame)
+            video_writer.write(last_data)
+        
+        video_writer.release()
+    
+    def stop_recording_nowait(self) -> "asyncio.Future[Optional[str]]":
+        """
+        Остановить запись и сразу вернуть future с путем к итоговому файлу
+        
+        Захват прекращается немедленно, а сохранение (кодирование, WAV, FFmpeg)
+        идет в фоне на пуле медиа-исполнителей. Новую запись можно начинать,
+        не дожидаясь результата.
+        """
+        recording = self.recording
+        if recording is None:
+            logger.warning("Запись не активна")
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            return future
+        
+        self.recording = None
+        if recording.task_index is not None:
+            self.events.unsubscribe(recording.task_index.on_event)
+            recording.task_index.close(time.time())
+        
+        task = asyncio.create_task(self._finalize_recording(recording))
+        self._finalizing.add(task)
+        task.add_done_callback(self._finalizing.discard)
+        return task
+    
+    async def stop_recording(self) -> Optional[str]:
+        """Остановить запись и дождаться сохранения файлов с аудио"""
+        return await self.stop_recording_nowait()
+    
+    async def wait_for_pending_recordings(self):
+        """Дождаться сохранения всех остановленных записей"""
+        if self._finalizing:
+            await asyncio.gather(*self._finalizing, return_exceptions=True)
+    
+    async def _finalize_recording(self, recording: RecordingState) -> Optional[str]:
+        """Сохранить остановленную запись и индекс задач рядом с ней"""
+        result_path = await self._save_recording(recording)
+        
+        if result_path and recording.task_index is not None:
+            index_path = TaskIndex.sidecar_path(result_path)
+            try:
+                await self.workers.run(recording.task_index.save, index_path)
+                logger.info(f"Индекс задач сохранен: {index_path} ({len(recording.task_index)} задач)")
+            except Exception as e:
+                logger.error(f"Ошибка сохранения индекса задач: {e}")
+        
+        return result_path
+    
+    async def _save_recording(self, recording: RecordingState) -> Optional[str]:
+        """Сохранить файлы остановленной записи"""
         try:
-            self.is_recording = False
+            # Дождаться кадров, которые еще обрабатываются
+            await recording.wait_drained()
             
-            if not self.video_frames:
-                logger.warning("Нет видео кадров для сохранения")
-                return None
+            if recording.mode == "audio":
+                return await self._save_audio_only(recording)
             
-            # Создать уникальные имена файлов
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            task_suffix = f"_{self.current_task_id}" if self.current_task_id else ""
-            base_filename = f"avatar_response_{timestamp}{task_suffix}"
-            
-            video_only_path = os.path.join(self.output_directory, f"{base_filename}_video_only.mp4")
-            audio_path = os.path.join(self.output_directory, f"{base_filename}.wav")
-            final_video_path = os.path.join(self.output_directory, f"{base_filename}.mp4")
-            
-            # Сохранить видео без аудио
-            if self.video_frames:
-                first_frame = self.video_frames[0]['frame']
-                height, width = first_frame.shape[:2]
-                fps = 30  # Предполагаемый FPS
-                
-                # Создать VideoWriter для видео без звука
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                video_writer = cv2.VideoWriter(video_only_path, fourcc, fps, (width, height))
-                
-                # Записать все кадры
-                for frame_data in self.video_frames:
-                    video_writer.write(frame_data['frame'])
+            video_only_path = recording.path(self.output_directory, "_video_only", recording.video_extension)
+            audio_path = recording.path(self.output_directory, extension="wav")
+            final_video_path = recording.path(self.output_directory, extension=recording.video_extension)
+            
+            if recording.muxer is not None:
+                # Итоговый файл (или плейлист с сегментами) уже пишется FFmpeg, остается закрыть входы
+                muxer = recording.muxer
+                recording.muxer = None
+                result_path = await self.workers.run(muxer.close)
+                if result_path:
+                    logger.info(f"Видео с аудио сохранено: {result_path}")
+                    logger.info(f"Записано видео кадров: {recording.captured_video_frames}")
+                    logger.info(f"Записано аудио кадров: {recording.captured_audio_frames}")
+                return result_path
+            
+            if recording.video_writer is not None:
+                # Потоковый режим: кадры уже закодированы, остается дописать очередь
+                writer = recording.video_writer
+                recording.video_writer = None
+                end_time = recording.audio_end_time() or recording.video_end_time(self.OUTPUT_FPS)
+                if not await self.workers.run(writer.close, end_time):
+                    logger.warning("Нет видео кадров для сохранения")
+                    return None
+                logger.info(f"Видео (без звука) сохранено: {video_only_path}")
+            else:
+                if not len(recording.frame_store):
+                    logger.warning("Нет видео кадров для сохранения")
+                    return None
                 
-                video_writer.release()
+                # Сохранить видео без аудио
+                await self.workers.run(self._write_buffered_video, recording, video_only_path)
                 logger.info(f"Видео (без звука) сохранено: {video_only_path}")
             
             # Сохранить аудио
-            audio_saved = await self._save_audio_to_wav(audio_path)
+            audio_saved = await self._save_audio_to_wav(recording, audio_path)
+            ffmpeg_available = await self.workers.run(self._check_ffmpeg_available)
+            audio_end = recording.audio_end_time()
             
             # Объединить видео и аудио, если доступен FFmpeg
-            if audio_saved and self._check_ffmpeg_available():
+            if audio_saved and ffmpeg_available:
                 try:
                     logger.info("Объединение видео и аудио...")
                     
                     # Объединить с помощью FFmpeg
                     merge_success = await self._merge_video_audio_with_ffmpeg(
-                        video_only_path, audio_path, final_video_path
+                        video_only_path, audio_path, final_video_path,
+                        duration=audio_end - recording.start_time if audio_end else None
                     )
                     
                     if merge_success:
@@ -515,8 +1044,8 @@ class HeyGenLiveKitClient:
                             os.remove(audio_path)
                         
                         logger.info(f"Видео с аудио сохранено: {final_video_path}")
-                        logger.info(f"Записано видео кадров: {len(self.video_frames)}")
-                        logger.info(f"Записано аудио кадров: {len(self.audio_frames)}")
+                        logger.info(f"Записано видео кадров: {recording.captured_video_frames}")
+                        logger.info(f"Записано аудио кадров: {recording.captured_audio_frames}")
                         
                         return final_video_path
                     else:
@@ -531,7 +1060,7 @@ class HeyGenLiveKitClient:
                 # Если нет аудио или FFmpeg недоступен, вернуть видео без звука
                 if not audio_saved:
                     logger.warning("Аудио не сохранено, возвращаем видео без звука")
-                if not self._check_ffmpeg_available():
+                if not ffmpeg_available:
                     logger.warning("FFmpeg недоступен, возвращаем видео без звука")
                     
                 return video_only_path
@@ -540,9 +1069,51 @@ class HeyGenLiveKitClient:
             logger.error(f"Ошибка сохранения записи: {e}")
             return None
         finally:
-            self.current_task_id = None
-            self.video_frames = []
-            self.audio_frames = []
+            if recording.video_writer is not None:
+                await self.workers.run(recording.video_writer.close)
+                recording.video_writer = None
+            if recording.muxer is not None:
+                await self.workers.run(recording.muxer.close)
+                recording.muxer = None
+            # Освобождаем кадры, файл выгрузки и аудио арену сразу, не дожидаясь сборки мусора
+            recording.frame_store.close()
+            recording.audio_buffer = AudioBuffer()
+    
+    def completed_segments(self) -> List[str]:
+        """Завершенные сегменты текущей сегментированной записи (доступны до ее окончания)"""
+        recording = self.recording
+        if recording is None or recording.muxer is None:
+            return []
+        return recording.muxer.completed_segments()
+    
+    async def extract_task_clips(
+        self,
+        recording_path: str,
+        task_ids: Optional[Iterable[str]] = None,
+        padding: float = 0.25
+    ) -> Dict[str, str]:
+        """
+        Вырезать клипы задач из записи сессии по ее индексу (без перекодирования)
+        
+        Args:
+            recording_path: Файл, записанный через start_session_recording
+            task_ids: Задачи для вырезания (None - все задачи из индекса)
+            padding: Запас в секундах до начала и после конца речи
+            
+        Returns:
+            Словарь task_id -> путь к клипу
+        """
+        index = TaskIndex.load(TaskIndex.sidecar_path(recording_path))
+        if index is None:
+            logger.warning(f"Индекс задач для {recording_path} не найден")
+            return {}
+        
+        segments = index.segments
+        if task_ids is not None:
+            wanted = set(task_ids)
+            segments = [segment for segment in segments if segment.task_id in wanted]
+        
+        return await extract_task_clips(recording_path, segments, self.output_directory, padding)
     
     async def send_message(self, message: str, task_id: str = None) -> bool:
         """Отправить сообщение через LiveKit room (если поддерживается)"""
@@ -565,6 +1136,7 @@ class HeyGenLiveKitClient:
         try:
             if self.is_recording:
                 await self.stop_recording()
+            await self.wait_for_pending_recordings()
             
             # Закрыть WebSocket соединение
             if self.websocket:
@@ -580,15 +1152,41 @@ class HeyGenLiveKitClient:
             self.is_connected = False
             self.room = None
             
+            if self.frame_publisher is not None:
+                # Сначала новые кадры перестают публиковаться, затем дожидаемся записи
+                # текущего (она идет в пуле потоков) и только после этого закрываем сегмент
+                publisher, self.frame_publisher = self.frame_publisher, None
+                try:
+                    if self._publish_task is not None:
+                        await asyncio.gather(self._publish_task, return_exceptions=True)
+                        self._publish_task = None
+                finally:
+                    publisher.close()
+            
         except Exception as e:
             logger.error(f"Ошибка отключения от LiveKit: {e}")
     
     def get_recording_stats(self) -> dict:
         """Получить статистику записи"""
+        recording = self.recording
         return {
-            "is_recording": self.is_recording,
-            "current_task_id": self.current_task_id,
-            "video_frames_count": len(self.video_frames),
-            "audio_frames_count": len(self.audio_frames),
-            "recording_duration": time.time() - self.recording_start_time if self.recording_start_time else 0
+            "is_recording": recording is not None,
+            "current_task_id": recording.task_id if recording else None,
+            "recording_mode": self.recording_mode,
+            "encoder_profile": self.encoder_profile,
+            "video_frames_count": recording.captured_video_frames if recording else 0,
+            "queued_frames": recording.pending_frames if recording else 0,
+            "dropped_video_frames": recording.dropped_frames["video"] if recording else 0,
+            "dropped_audio_frames": recording.dropped_frames["audio"] if recording else 0,
+            "video_source_gaps": recording.source_gaps if recording else 0,
+            "frame_queues": {name: q.get_stats() for name, q in self.frame_queues.items()},
+            "preroll_frames": {name: len(p) for name, p in self.prerolls.items()},
+            "shared_frames": self.frame_publisher.get_stats() if self.frame_publisher else None,
+            "pending_video_frames": recording.video_writer.pending_frames if recording and recording.video_writer else 0,
+            "audio_frames_count": recording.captured_audio_frames if recording else 0,
+            "audio_buffer_bytes": recording.audio_buffer.nbytes if recording else 0,
+            "frame_store": recording.frame_store.get_stats() if recording else None,
+            "deduplicated_frames": recording.dedup.duplicates if recording and recording.dedup else 0,
+            "finalizing_recordings": len(self._finalizing),
+            "recording_duration": time.time() - recording.start_time if recording else 0
         }
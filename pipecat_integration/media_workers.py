@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Any
+
+from heygen.config import Config
+
+logger = logging.getLogger(__name__)
+
+class MediaWorkerPool:
+    """
+    Исполнители для тяжелой обработки медиа вне event loop
+
+    Пул потоков - для преобразования кадров, кодирования и записи файлов:
+    cv2, numpy, FFI LiveKit и subprocess освобождают GIL, поэтому потоки
+    работают параллельно.
+    """
+
+    def __init__(self, max_threads: int = None):
+        self.max_threads = Config.MEDIA_WORKER_THREADS if max_threads is None else max_threads
+
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Статистика
+        self.tasks_submitted = 0
+        self.tasks_running = 0
+        self.tasks_failed = 0
+
+    def _thread_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(
+                    max_workers=max(1, self.max_threads),
+                    thread_name_prefix="media-worker"
+                )
+            return self._threads
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнить функцию в пуле потоков и дождаться результата"""
+        loop = asyncio.get_running_loop()
+        self.tasks_submitted += 1
+        self.tasks_running += 1
+        try:
+            return await loop.run_in_executor(self._thread_executor(), functools.partial(func, *args, **kwargs))
+        except Exception:
+            self.tasks_failed += 1
+            raise
+        finally:
+            self.tasks_running -= 1
+
+    def get_stats(self) -> dict:
+        """Получить статистику исполнителей"""
+        return {
+            "threads": self.max_threads,
+            "submitted": self.tasks_submitted,
+            "running": self.tasks_running,
+            "failed": self.tasks_failed
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Остановить исполнители (дождаться текущих задач при wait=True)"""
+        with self._lock:
+            threads, self._threads = self._threads, None
+
+        if threads is not None:
+            threads.shutdown(wait=wait)
+
+
+_shared_workers: Optional[MediaWorkerPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_media_workers() -> MediaWorkerPool:
+    """Общий пул медиа-исполнителей процесса (создается при первом обращении)"""
+    global _shared_workers
+    with _shared_lock:
+        if _shared_workers is None:
+            _shared_workers = MediaWorkerPool()
+        return _shared_workers
@@ -0,0 +1,147 @@
+import logging
+import os
+import queue
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from utils.av_sync import ConstantFrameRateSync
+from pipecat_integration.frame_formats import YUVFrame, VideoFrameData, bgr_to_i420, to_bgr
+from pipecat_integration.video_encoders import BACKENDS, EncoderBackend, open_video_writer
+
+logger = logging.getLogger(__name__)
+
+class StreamingVideoWriter:
+    """
+    Инкрементальная запись видео в фоновом потоке
+
+    Кадры кодируются по мере поступления, поэтому в памяти держится только
+    небольшая очередь кадров, независимо от длительности записи.
+    Если задан start_time, кадры раскладываются по слотам постоянной частоты
+    кадров по своим временным меткам (пропуски дублируются, лишние кадры отбрасываются).
+    Кодировщик FFmpeg получает кадры I420 как есть, без преобразования в BGR.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        fps: int = 30,
+        encoder: Optional[EncoderBackend] = None,
+        max_queue_size: int = 120,
+        start_time: Optional[float] = None
+    ):
+        self.output_path = output_path
+        self.fps = fps
+        self.encoder = encoder or BACKENDS["opencv-mp4v"]
+        self._yuv_input = False
+        self.sync = ConstantFrameRateSync(fps, start_time) if start_time is not None else None
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_queue_size)
+        self._last_frame: Optional[np.ndarray] = None
+        self._thread: Optional[threading.Thread] = None
+        self._writer: Optional[cv2.VideoWriter] = None
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.frame_size: Optional[tuple] = None
+        self.error: Optional[Exception] = None
+
+    def start(self):
+        """Запустить фоновый поток кодирования"""
+        self._thread = threading.Thread(target=self._run, name="StreamingVideoWriter", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending_frames(self) -> int:
+        return self._queue.qsize()
+
+    def write(self, frame: VideoFrameData, timestamp: Optional[float] = None) -> bool:
+        """Поставить кадр (BGR или YUV) в очередь на кодирование (не блокирует event loop)"""
+        if self.error is not None:
+            return False
+
+        try:
+            self._queue.put_nowait((frame, timestamp))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            logger.warning(f"Очередь кодирования переполнена, кадр пропущен (всего: {self.frames_dropped})")
+            return False
+
+    def _open_writer(self, frame: VideoFrameData):
+        height, width = frame.shape[:2]
+        self.frame_size = (width, height)
+        self._yuv_input = self.encoder.uses_ffmpeg and isinstance(frame, YUVFrame)
+        pix_fmt = 'yuv420p' if self._yuv_input else 'bgr24'
+        self._writer = open_video_writer(self.encoder, self.output_path, self.fps, self.frame_size, pix_fmt)
+        if not self._writer.isOpened():
+            raise RuntimeError(f"Не удалось открыть VideoWriter: {self.output_path}")
+
+    def _prepare(self, frame: VideoFrameData) -> np.ndarray:
+        """Кадр в формате входа кодировщика и размере записи"""
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            # Разрешение потока изменилось: приводим к размеру записи
+            frame = cv2.resize(to_bgr(frame), self.frame_size)
+            return bgr_to_i420(frame) if self._yuv_input else frame
+
+        if self._yuv_input:
+            return frame.data if isinstance(frame, YUVFrame) else bgr_to_i420(frame)
+        return to_bgr(frame)
+
+    def _write_repeated(self, frame: np.ndarray, repeats: int):
+        for _ in range(repeats):
+            self._writer.write(frame)
+        self.frames_written += repeats
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            if self.error is not None:
+                continue
+
+            frame, timestamp = item
+            try:
+                if self._writer is None:
+                    self._open_writer(frame)
+
+                # Преобразования (YUV -> BGR, масштабирование) выполняются здесь, в фоновом потоке
+                frame = self._prepare(frame)
+
+                if self.sync is not None and timestamp is not None:
+                    previous_repeats, repeats = self.sync.place(timestamp)
+                    if previous_repeats and self._last_frame is not None:
+                        self._write_repeated(self._last_frame, previous_repeats)
+                else:
+                    repeats = 1
+
+                self._write_repeated(frame, repeats)
+                self._last_frame = frame
+            except Exception as e:
+                self.error = e
+                logger.error(f"Ошибка кодирования кадра: {e}")
+
+    def close(self, end_time: Optional[float] = None) -> Optional[str]:
+        """Дописать оставшиеся кадры и закрыть файл (блокирующий вызов)"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+        # Дотянуть видео последним кадром до конца аудио
+        if end_time is not None and self.sync is not None and self._last_frame is not None and self.error is None:
+            self._write_repeated(self._last_frame, self.sync.padding_until(end_time))
+
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+        if self.frames_written == 0 or not os.path.exists(self.output_path):
+            return None
+
+        logger.info(f"Потоковая запись завершена: {self.output_path} ({self.frames_written} кадров)")
+        return self.output_path
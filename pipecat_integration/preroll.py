@@ -0,0 +1,48 @@
+import time
+from collections import deque
+from typing import Optional, Any, List
+
+class PrerollBuffer:
+    """
+    Кольцевой буфер последних N секунд кадров трека (pre-roll)
+
+    Наполняется всегда, даже без записи, и вклеивается в начало каждой новой
+    записи, поэтому запись можно начинать с опозданием (например, по событию
+    avatar_start_talking), не теряя первых слогов. Кадры LiveKit хранятся
+    как есть (нативный I420 для видео, PCM для аудио), без преобразований.
+    Объем ограничен и по времени, и по числу кадров.
+    """
+
+    def __init__(self, seconds: float, max_frames: int):
+        self.seconds = max(0.0, seconds)
+        self._frames: deque = deque(maxlen=max(1, max_frames))
+
+    @property
+    def enabled(self) -> bool:
+        return self.seconds > 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def oldest_time(self) -> Optional[float]:
+        return self._frames[0][2] if self._frames else None
+
+    def append(self, frame: Any, timestamp_us: Optional[int], arrival_time: float = None):
+        """Добавить кадр и вытеснить кадры старше окна pre-roll"""
+        if not self.enabled:
+            return
+
+        arrival_time = arrival_time or time.time()
+        self._frames.append((frame, timestamp_us, arrival_time))
+        while arrival_time - self._frames[0][2] > self.seconds:
+            self._frames.popleft()
+
+    def drain(self, since: float) -> List[tuple]:
+        """Забрать кадры (frame, timestamp_us, arrival_time), пришедшие не раньше since"""
+        frames = [item for item in self._frames if item[2] >= since]
+        self._frames.clear()
+        return frames
+
+    def clear(self):
+        self._frames.clear()
@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional, Deque, Set
+
+from heygen.config import Config
+from heygen.multi_session_manager import HeyGenMultiSessionManager, SessionState
+from heygen.session_manager import HeyGenSessionManager
+from pipecat_integration.livekit_client import HeyGenLiveKitClient
+
+logger = logging.getLogger(__name__)
+
+class PooledSession:
+    """Заранее подготовленная сессия: создана, запущена и подключена к LiveKit"""
+
+    def __init__(self, state: SessionState, livekit_client: HeyGenLiveKitClient, sessions: HeyGenMultiSessionManager):
+        self.state = state
+        self.livekit_client = livekit_client
+        self.sessions = sessions
+
+    @property
+    def session_manager(self) -> HeyGenSessionManager:
+        return self.state.manager
+
+    @property
+    def session_id(self) -> Optional[str]:
+        return self.state.session_id
+
+    @property
+    def created_at(self) -> float:
+        return self.state.opened_at
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        return self.state.expires_at
+
+    def is_usable(self, margin: float = 30.0) -> bool:
+        """Проверить, что сессию еще можно выдать пользователю"""
+        if not self.session_manager.is_active or not self.livekit_client.is_connected:
+            return False
+        if self.expires_at and time.time() + margin >= self.expires_at:
+            return False
+        return True
+
+    async def close(self):
+        """Отключиться от LiveKit и закрыть сессию HeyGen (место в квоте освобождается)"""
+        try:
+            await self.livekit_client.disconnect()
+        except Exception as e:
+            logger.error(f"Ошибка отключения LiveKit для сессии {self.session_id}: {e}")
+
+        await self.sessions.close_session(self.session_id)
+
+class HeyGenSessionPool:
+    """
+    Пул заранее прогретых streaming сессий HeyGen
+
+    Держит N сессий в состоянии "создана + запущена + подключена к LiveKit",
+    мгновенно выдает их по запросу и пополняется в фоне. Целевой размер пула
+    определяется недавним спросом и ограничен квотой одновременных сессий аккаунта.
+
+    Сессии открываются через HeyGenMultiSessionManager: квота, HTTP клиент и
+    планировщик keep-alive (в том числе закрытие по лимиту длительности) общие.
+    Если в процессе сессии открываются и вне пула, пулу нужно передать тот же
+    менеджер (sessions), иначе у каждого будет своя квота и лимит аккаунта
+    может быть превышен. Без sessions пул создает собственный менеджер и
+    закрывает его в close().
+    """
+
+    def __init__(
+        self,
+        sessions: Optional[HeyGenMultiSessionManager] = None,
+        min_size: int = None,
+        max_size: int = None,
+        demand_window: int = None
+    ):
+        self.min_size = Config.SESSION_POOL_SIZE if min_size is None else min_size
+        self.max_size = Config.SESSION_POOL_MAX_SIZE if max_size is None else max_size
+        self.demand_window = Config.SESSION_POOL_DEMAND_WINDOW if demand_window is None else demand_window
+        self.max_size = max(self.max_size, self.min_size)
+
+        self._owns_sessions = sessions is None
+        self.sessions = sessions or HeyGenMultiSessionManager()
+
+        self._idle: Deque[PooledSession] = deque()
+        self._in_use: Set[PooledSession] = set()
+        self._pending = 0
+        self._acquire_times: Deque[float] = deque()
+
+        self._refill_event: Optional[asyncio.Event] = None
+        self._refill_task: Optional[asyncio.Task] = None
+        self._creating: Set[asyncio.Task] = set()
+        # Фоновое закрытие устаревших и лишних сессий (дожидаемся в close)
+        self._closing: Set[asyncio.Task] = set()
+        self._is_running = False
+
+        # Статистика
+        self.created_count = 0
+        self.failed_count = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def start(self):
+        """Запустить фоновое пополнение пула"""
+        if self._is_running:
+            return
+
+        self._is_running = True
+        self._refill_event = asyncio.Event()
+        self._refill_task = asyncio.create_task(self._refill_loop())
+        self._refill_event.set()
+        logger.info(f"Пул сессий запущен (min={self.min_size}, max={self.max_size}, квота={self.sessions.max_concurrent})")
+
+    def _record_demand(self):
+        """Запомнить момент запроса сессии для оценки спроса"""
+        now = time.time()
+        self._acquire_times.append(now)
+        while self._acquire_times and now - self._acquire_times[0] > self.demand_window:
+            self._acquire_times.popleft()
+
+    def _target_size(self) -> int:
+        """Целевое число прогретых сессий с учетом спроса и квоты"""
+        now = time.time()
+        recent = sum(1 for t in self._acquire_times if now - t <= self.demand_window)
+        target = min(max(recent, self.min_size), self.max_size)
+
+        # Не превышаем квоту одновременных сессий аккаунта (общую с сессиями вне пула)
+        available_quota = len(self._idle) + self._pending + self.sessions.free_slots
+        return max(0, min(target, available_quota))
+
+    async def acquire(self) -> Optional[PooledSession]:
+        """Выдать готовую сессию (или создать новую, если пул пуст)"""
+        self._record_demand()
+
+        while self._idle:
+            pooled = self._idle.popleft()
+            if pooled.is_usable():
+                self._in_use.add(pooled)
+                self.hits += 1
+                logger.info(f"Выдана прогретая сессия из пула: {pooled.session_id}")
+                self._schedule_refill()
+                return pooled
+
+            logger.info(f"Сессия {pooled.session_id} устарела, закрываем")
+            self._close_in_background(pooled)
+
+        self.misses += 1
+        self._schedule_refill()
+
+        if not self.sessions.free_slots:
+            logger.error("Достигнута квота одновременных сессий")
+            return None
+
+        logger.info("Пул пуст, создаем сессию по запросу...")
+        self._pending += 1
+        try:
+            pooled = await self._create_pooled_session()
+        finally:
+            self._pending -= 1
+
+        if pooled:
+            self._in_use.add(pooled)
+        return pooled
+
+    async def release(self, pooled: PooledSession):
+        """Вернуть сессию после завершения разговора (сессия закрывается)"""
+        self._in_use.discard(pooled)
+        await pooled.close()
+        self._schedule_refill()
+
+    def _close_in_background(self, pooled: PooledSession):
+        """Закрыть сессию в фоне, сохранив ссылку на задачу до ее завершения"""
+        task = asyncio.create_task(pooled.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _schedule_refill(self):
+        if self._refill_event:
+            self._refill_event.set()
+
+    async def _create_pooled_session(self) -> Optional[PooledSession]:
+        """Открыть сессию через менеджер сессий и подключить к ней LiveKit"""
+        state = await self.sessions.open_session(label="pool")
+        if state is None:
+            self.failed_count += 1
+            return None
+
+        livekit_client = HeyGenLiveKitClient()
+        pooled = PooledSession(state, livekit_client, self.sessions)
+        try:
+            session_manager = state.manager
+            connected = await livekit_client.connect(
+                session_manager.websocket_url,
+                session_manager.access_token,
+                session_manager.session_id,
+                session_manager.base_url
+            )
+            if not connected:
+                raise RuntimeError("не удалось подключиться к LiveKit")
+
+            self.created_count += 1
+            return pooled
+
+        except Exception as e:
+            self.failed_count += 1
+            logger.error(f"Ошибка подготовки сессии для пула: {e}")
+            await pooled.close()
+            return None
+
+    async def _warm_one(self):
+        """Подготовить одну сессию и положить в пул"""
+        self._pending += 1
+        try:
+            pooled = await self._create_pooled_session()
+        finally:
+            self._pending -= 1
+
+        if not pooled:
+            return
+
+        if self._is_running:
+            self._idle.append(pooled)
+            logger.info(f"Сессия добавлена в пул: {pooled.session_id} (в пуле: {len(self._idle)})")
+        else:
+            await pooled.close()
+
+    def _prune_idle(self):
+        """
+        Удалить из пула устаревшие простаивающие сессии
+
+        Keep-alive всех сессий (в пуле и выданных) и закрытие по лимиту
+        длительности выполняет планировщик менеджера сессий.
+        """
+        for pooled in list(self._idle):
+            if not pooled.is_usable():
+                self._idle.remove(pooled)
+                self._close_in_background(pooled)
+
+    async def _refill_loop(self):
+        """Фоновое пополнение пула до целевого размера"""
+        interval = max(1, Config.KEEP_ALIVE_INTERVAL // 2)
+
+        while self._is_running:
+            try:
+                await asyncio.wait_for(self._refill_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_event.clear()
+
+            if not self._is_running:
+                break
+
+            try:
+                self._prune_idle()
+
+                # Лишние сессии (спрос упал) закрываем, недостающие создаем параллельно
+                target = self._target_size()
+                while len(self._idle) > target:
+                    self._close_in_background(self._idle.pop())
+
+                missing = target - len(self._idle) - self._pending
+                for _ in range(max(0, missing)):
+                    task = asyncio.create_task(self._warm_one())
+                    self._creating.add(task)
+                    task.add_done_callback(self._creating.discard)
+
+            except Exception as e:
+                logger.error(f"Ошибка пополнения пула сессий: {e}")
+
+    def get_stats(self) -> dict:
+        """Получить статистику пула"""
+        return {
+            "idle": len(self._idle),
+            "in_use": len(self._in_use),
+            "pending": self._pending,
+            "target_size": self._target_size(),
+            "created": self.created_count,
+            "failed": self.failed_count,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    async def close(self):
+        """Остановить пул и закрыть все простаивающие сессии"""
+        self._is_running = False
+        self._schedule_refill()
+
+        if self._refill_task:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+
+        if self._creating:
+            await asyncio.gather(*self._creating, return_exceptions=True)
+
+        while self._idle:
+            await self._idle.popleft().close()
+
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+        if self._owns_sessions:
+            await self.sessions.close()
+        logger.info("Пул сессий остановлен")
@@ -0,0 +1,266 @@
+import logging
+import os
+import sys
+import time
+from multiprocessing import shared_memory, resource_tracker
+from typing import Optional
+
+import numpy as np
+
+from pipecat_integration.frame_formats import YUVFrame, VideoFrameData
+
+logger = logging.getLogger(__name__)
+
+# Заголовок сегмента: magic, версия, число слотов, емкость слота, счетчик кадров, номер последнего слота
+MAGIC = 0x48474652414D4531  # "HGFRAME1"
+VERSION = 1
+CONTROL_DTYPE = np.dtype([
+    ('magic', '<u8'), ('version', '<u8'), ('slots', '<u8'),
+    ('capacity', '<u8'), ('sequence', '<u8'), ('latest', '<u8')
+])
+# Заголовок слота: sequence == 0 - слот перезаписывается, иначе номер кадра в слоте
+SLOT_DTYPE = np.dtype([
+    ('sequence', '<u8'), ('width', '<u4'), ('height', '<u4'),
+    ('format', '<u4'), ('reserved', '<u4'), ('nbytes', '<u8'), ('timestamp', '<f8')
+])
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+
+# Формат данных кадра в слоте
+FORMAT_BGR = 1
+FORMAT_I420 = 2
+
+def _slot_stride(capacity: int) -> int:
+    # Данные каждого слота выровнены на 64 байта (граница кэш-линии)
+    return SLOT_HEADER_SIZE + (capacity + 63) // 64 * 64
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Подключиться к существующему сегменту, не передавая его resource_tracker читателя"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    shm = shared_memory.SharedMemory(name=name)
+    # До Python 3.13 читатель регистрирует чужой сегмент и удаляет его при своем завершении;
+    # на POSIX resource_tracker хранит имя с ведущим "/", а shm.name возвращается без него
+    if os.name == "posix":
+        try:
+            resource_tracker.unregister(f"/{shm.name}", "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+class SharedFramePublisher:
+    """
+    Публикация последнего кадра в разделяемую память для других процессов
+
+    Сегмент состоит из заголовка и нескольких слотов (двойной или тройной
+    буфер). Кадр пишется в следующий слот по кругу, после чего слот
+    объявляется последним. Читатели берут последний кадр как view без
+    копирования и сериализации; номер кадра в заголовке слота позволяет
+    проверить, что слот не перезаписан, пока кадр читался.
+    """
+
+    def __init__(self, name: str, slots: int = 3, max_width: int = 1920, max_height: int = 1080):
+        if slots < 2:
+            raise ValueError("Нужно минимум 2 слота")
+
+        self.name = name
+        self.slots = slots
+        # Емкость слота рассчитана на BGR (I420 занимает вдвое меньше)
+        self.capacity = max_width * max_height * 3
+        self._stride = _slot_stride(self.capacity)
+
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + slots * self._stride)
+        except FileExistsError:
+            # Сегмент остался от упавшего процесса: пересоздаем
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + slots * self._stride)
+
+        self._control = np.ndarray((), dtype=CONTROL_DTYPE, buffer=self._shm.buf)
+        self._slot_headers = [
+            np.ndarray((), dtype=SLOT_DTYPE, buffer=self._shm.buf, offset=HEADER_SIZE + i * self._stride)
+            for i in range(slots)
+        ]
+        self._slot_data = [
+            np.ndarray((self.capacity,), dtype=np.uint8, buffer=self._shm.buf,
+                       offset=HEADER_SIZE + i * self._stride + SLOT_HEADER_SIZE)
+            for i in range(slots)
+        ]
+
+        self._control['version'] = VERSION
+        self._control['slots'] = slots
+        self._control['capacity'] = self.capacity
+        self._control['sequence'] = 0
+        self._control['latest'] = 0
+        # magic последним: читатель не подключится к недописанному заголовку
+        self._control['magic'] = MAGIC
+
+        self.frames_published = 0
+        self.frames_skipped = 0
+        logger.info(f"Публикация кадров в разделяемую память: {name} ({slots} слота)")
+
+    def publish(self, frame: VideoFrameData, timestamp: Optional[float] = None) -> bool:
+        """Записать кадр (BGR или I420) в следующий слот и объявить его последним"""
+        if isinstance(frame, YUVFrame):
+            data, frame_format = frame.data, FORMAT_I420
+        else:
+            data, frame_format = frame, FORMAT_BGR
+
+        nbytes = data.nbytes
+        if nbytes > self.capacity:
+            self.frames_skipped += 1
+            if self.frames_skipped == 1:
+                logger.warning(f"Кадр {frame.shape[1]}x{frame.shape[0]} не помещается в слот разделяемой памяти")
+            return False
+
+        sequence = int(self._control['sequence']) + 1
+        slot = sequence % self.slots
+        header = self._slot_headers[slot]
+
+        # Слот помечается занятым до записи данных, номер кадра ставится после
+        header['sequence'] = 0
+        self._slot_data[slot][:nbytes] = np.ascontiguousarray(data).reshape(-1)
+        header['width'] = frame.shape[1]
+        header['height'] = frame.shape[0]
+        header['format'] = frame_format
+        header['nbytes'] = nbytes
+        header['timestamp'] = timestamp if timestamp is not None else time.time()
+        header['sequence'] = sequence
+
+        self._control['latest'] = slot
+        self._control['sequence'] = sequence
+        self.frames_published += 1
+        return True
+
+    def get_stats(self) -> dict:
+        """Получить статистику публикации"""
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "published": self.frames_published,
+            "skipped": self.frames_skipped
+        }
+
+    def close(self):
+        """Освободить и удалить сегмент (читатели получат ошибку при следующем подключении)"""
+        if self._shm is None:
+            return
+        # Views на буфер должны быть освобождены до закрытия сегмента
+        self._control = None
+        self._slot_headers = []
+        self._slot_data = []
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+class SharedFrame:
+    """Кадр из разделяемой памяти (view без копирования)"""
+
+    def __init__(self, reader: "SharedFrameReader", slot: int, sequence: int, data: np.ndarray,
+                 width: int, height: int, frame_format: int, timestamp: float):
+        self._reader = reader
+        self.slot = slot
+        self.sequence = sequence
+        self.data = data
+        self.width = width
+        self.height = height
+        self.format = frame_format
+        self.timestamp = timestamp
+
+    @property
+    def valid(self) -> bool:
+        """Слот еще не перезаписан (проверять после обработки view)"""
+        return self._reader.slot_sequence(self.slot) == self.sequence
+
+    def _wrap(self, data: np.ndarray) -> VideoFrameData:
+        if self.format == FORMAT_I420:
+            return YUVFrame(data, self.width, self.height)
+        return data.reshape((self.height, self.width, 3))
+
+    def to_frame(self) -> VideoFrameData:
+        """Кадр в формате frame_formats (без копирования данных)"""
+        return self._wrap(self.data)
+
+    def copy(self) -> VideoFrameData:
+        """Копия кадра, которая остается валидной после перезаписи слота"""
+        return self._wrap(self.data.copy())
+
+class SharedFrameReader:
+    """
+    Чтение последнего кадра, опубликованного SharedFramePublisher, из другого процесса
+
+    Пример:
+        reader = SharedFrameReader("heygen_frames")
+        frame = reader.read_latest()
+        if frame is not None:
+            image = frame.to_frame()  # view без копирования
+            ...
+            if not frame.valid:       # кадр перезаписан во время обработки
+                ...
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._shm = _attach(name)
+        self._control = np.ndarray((), dtype=CONTROL_DTYPE, buffer=self._shm.buf)
+        if int(self._control['magic']) != MAGIC or int(self._control['version']) != VERSION:
+            self.close()
+            raise ValueError(f"Сегмент {name} не является буфером кадров версии {VERSION}")
+
+        self.slots = int(self._control['slots'])
+        self.capacity = int(self._control['capacity'])
+        self._stride = _slot_stride(self.capacity)
+        self._slot_headers = [
+            np.ndarray((), dtype=SLOT_DTYPE, buffer=self._shm.buf, offset=HEADER_SIZE + i * self._stride)
+            for i in range(self.slots)
+        ]
+        self._last_sequence = 0
+
+    @property
+    def sequence(self) -> int:
+        """Номер последнего опубликованного кадра (0 - кадров еще не было)"""
+        return int(self._control['sequence'])
+
+    def slot_sequence(self, slot: int) -> int:
+        return int(self._slot_headers[slot]['sequence'])
+
+    def read_latest(self, only_new: bool = False, retries: int = 3) -> Optional[SharedFrame]:
+        """
+        Последний кадр (None, если кадров нет или, при only_new, нет нового кадра)
+
+        Если слот перезаписывается прямо во время чтения заголовка, попытка повторяется.
+        """
+        for _ in range(retries):
+            sequence = int(self._control['sequence'])
+            if sequence == 0 or (only_new and sequence == self._last_sequence):
+                return None
+
+            slot = int(self._control['latest'])
+            header = self._slot_headers[slot]
+            if int(header['sequence']) != sequence:
+                continue
+
+            nbytes = int(header['nbytes'])
+            data = np.ndarray((nbytes,), dtype=np.uint8, buffer=self._shm.buf,
+                              offset=HEADER_SIZE + slot * self._stride + SLOT_HEADER_SIZE)
+            frame = SharedFrame(self, slot, sequence, data, int(header['width']), int(header['height']),
+                                int(header['format']), float(header['timestamp']))
+            if frame.valid:
+                self._last_sequence = sequence
+                return frame
+        return None
+
+    def close(self):
+        """Отключиться от сегмента (выданные кадры должны быть освобождены)"""
+        if self._shm is None:
+            return
+        self._control = None
+        self._slot_headers = []
+        try:
+            self._shm.close()
+        except BufferError:
+            logger.warning(f"Кадры из {self.name} еще используются, сегмент будет закрыт при их освобождении")
+        self._shm = None
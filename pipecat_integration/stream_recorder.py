@@ -6,25 +6,28 @@ from typing import Optional
 import cv2
 import numpy as np
 from heygen.config import Config
+from pipecat_integration.video_encoders import EncoderBackend, select_encoder, open_video_writer
 
 logger = logging.getLogger(__name__)
 
 class StreamRecorder:
     """Класс для записи видео и аудио потоков"""
     
-    def __init__(self, output_dir: str = None):
+    def __init__(self, output_dir: str = None, encoder_profile: Optional[str] = None):
         self.output_dir = output_dir or Config.OUTPUT_DIR
-        self.current_recording: Optional[cv2.VideoWriter] = None
+        self.encoder_profile = encoder_profile or Config.VIDEO_ENCODER_PROFILE
+        self.encoder: Optional[EncoderBackend] = None
+        self.current_recording = None
         self.recording_filename: Optional[str] = None
         self.is_recording = False
         
         # Создаем папку для выходных файлов
         os.makedirs(self.output_dir, exist_ok=True)
     
-    def generate_filename(self, prefix: str = "avatar_response") -> str:
+    def generate_filename(self, prefix: str = "avatar_response", extension: Optional[str] = None) -> str:
         """Генерировать имя файла с timestamp"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{prefix}_{timestamp}.{Config.VIDEO_FORMAT}"
+        filename = f"{prefix}_{timestamp}.{extension or Config.VIDEO_FORMAT}"
         return os.path.join(self.output_dir, filename)
     
     def start_recording(self, width: int = 720, height: int = 480, fps: int = 30) -> str:
@@ -32,15 +35,16 @@ class StreamRecorder:
         if self.is_recording:
             self.stop_recording()
         
-        self.recording_filename = self.generate_filename()
-        
-        # Настройка кодека
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        # Кодировщик профиля (доступные кодировщики определяются один раз за процесс)
+        self.encoder = select_encoder(self.encoder_profile)
+        self.recording_filename = self.generate_filename(
+            extension=self.encoder.extension if self.encoder.uses_ffmpeg else None
+        )
         
-        # Создание VideoWriter
-        self.current_recording = cv2.VideoWriter(
+        # Создание VideoWriter (OpenCV или FFmpeg с тем же интерфейсом)
+        self.current_recording = open_video_writer(
+            self.encoder,
             self.recording_filename,
-            fourcc,
             fps,
             (width, height)
         )
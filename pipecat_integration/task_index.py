@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+from typing import Optional, List, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Типы событий аватара, задающие границы задач (значения AvatarEventType)
+TASK_START_EVENTS = ('avatar_start_talking',)
+TASK_END_EVENTS = ('avatar_stop_talking', 'task_finished')
+
+class TaskSegment:
+    """Границы одной задачи в записи (секунды от начала записи)"""
+
+    def __init__(self, task_id: Optional[str], start: float, end: Optional[float] = None):
+        self.task_id = task_id
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.end - self.start if self.end is not None else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "start": round(self.start, 3),
+            "end": None if self.end is None else round(self.end, 3)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TaskSegment":
+        return cls(data.get("task_id"), data["start"], data.get("end"))
+
+    def __repr__(self) -> str:
+        return f"TaskSegment(task_id={self.task_id!r}, start={self.start:.3f}, end={self.end})"
+
+class TaskIndex:
+    """
+    Индекс границ задач внутри непрерывной записи сессии
+
+    Заполняется по событиям аватара из WebSocket: avatar_start_talking
+    открывает отрезок, avatar_stop_talking/task_finished закрывает его.
+    Сохраняется рядом с записью (<запись>.tasks.json), чтобы клипы задач
+    можно было вырезать позже, по запросу или все сразу.
+    """
+
+    def __init__(self, start_time: float):
+        self.start_time = start_time
+        self.segments: List[TaskSegment] = []
+        self._open: Optional[TaskSegment] = None
+
+    def _offset(self, timestamp: float) -> float:
+        return max(0.0, timestamp - self.start_time)
+
+    def on_event(self, event):
+        """Обработчик AvatarEvent (подписывается на шину событий клиента)"""
+        if event.type in TASK_START_EVENTS:
+            offset = self._offset(event.timestamp)
+            if self._open is not None:
+                # Новая речь без события окончания: закрываем предыдущий отрезок
+                self._open.end = offset
+            self._open = TaskSegment(event.task_id, offset)
+            self.segments.append(self._open)
+
+        elif event.type in TASK_END_EVENTS and self._open is not None:
+            if event.task_id and self._open.task_id and event.task_id != self._open.task_id:
+                return
+            self._open.end = self._offset(event.timestamp)
+            self._open.task_id = self._open.task_id or event.task_id
+            self._open = None
+
+    def close(self, end_time: float):
+        """Закрыть незавершенный отрезок концом записи"""
+        if self._open is not None:
+            self._open.end = self._offset(end_time)
+            self._open = None
+
+    def find(self, task_id: str) -> Optional[TaskSegment]:
+        for segment in self.segments:
+            if segment.task_id == task_id:
+                return segment
+        return None
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    @staticmethod
+    def sidecar_path(recording_path: str) -> str:
+        return f"{os.path.splitext(recording_path)[0]}.tasks.json"
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "start_time": self.start_time,
+                "segments": [segment.to_dict() for segment in self.segments]
+            }, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["TaskIndex"]:
+        """Загрузить индекс (None, если файла нет или он поврежден)"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            index = cls(data["start_time"])
+            index.segments = [TaskSegment.from_dict(item) for item in data["segments"]]
+            return index
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка чтения индекса задач {path}: {e}")
+            return None
@@ -0,0 +1,188 @@
+import functools
+import logging
+import subprocess
+import threading
+from collections import deque
+from typing import Optional, Dict, Tuple
+
+import cv2
+import numpy as np
+
+from utils.ffmpeg_runner import probe_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+class EncoderBackend:
+    """
+    Способ кодирования видео: fourcc OpenCV или кодировщик FFmpeg с параметрами
+
+    extension - контейнер, который поддерживает кодек (VP8/VP9 - WebM).
+    """
+
+    def __init__(self, name: str, kind: str, codec: str, extension: str = "mp4", options: Tuple[str, ...] = ()):
+        self.name = name
+        self.kind = kind
+        self.codec = codec
+        self.extension = extension
+        self.options = options
+
+    @property
+    def uses_ffmpeg(self) -> bool:
+        return self.kind == "ffmpeg"
+
+    def ffmpeg_options(self) -> list:
+        """Аргументы выходного видео для командной строки FFmpeg"""
+        return ['-c:v', self.codec, *self.options]
+
+    def __repr__(self) -> str:
+        return f"EncoderBackend({self.name!r}, {self.kind}/{self.codec})"
+
+# Известные способы кодирования (наличие кодировщиков FFmpeg проверяется при выборе)
+BACKENDS: Dict[str, EncoderBackend] = {
+    backend.name: backend for backend in (
+        EncoderBackend("opencv-mp4v", "opencv", "mp4v"),
+        EncoderBackend("x264-ultrafast", "ffmpeg", "libx264",
+                       options=('-preset', 'ultrafast', '-tune', 'zerolatency', '-crf', '28')),
+        EncoderBackend("x264-veryfast", "ffmpeg", "libx264",
+                       options=('-preset', 'veryfast', '-crf', '23')),
+        EncoderBackend("x264-slow", "ffmpeg", "libx264",
+                       options=('-preset', 'slow', '-crf', '26')),
+        EncoderBackend("vp8-realtime", "ffmpeg", "libvpx", "webm",
+                       options=('-deadline', 'realtime', '-cpu-used', '8', '-b:v', '1M')),
+        EncoderBackend("vp9-good", "ffmpeg", "libvpx-vp9", "webm",
+                       options=('-deadline', 'good', '-cpu-used', '4', '-row-mt', '1', '-crf', '36', '-b:v', '0')),
+    )
+}
+
+# Профиль - способы кодирования в порядке предпочтения; opencv-mp4v доступен всегда
+PROFILES: Dict[str, Tuple[str, ...]] = {
+    # Минимум CPU на кадр при записи в реальном времени
+    "realtime-cheap": ("x264-ultrafast", "vp8-realtime", "opencv-mp4v"),
+    "balanced": ("x264-veryfast", "opencv-mp4v"),
+    # Минимальный размер файла для хранения (CPU вторичен)
+    "archive-small": ("vp9-good", "x264-slow", "opencv-mp4v"),
+    # Прежнее поведение: OpenCV без FFmpeg
+    "compat": ("opencv-mp4v",),
+}
+
+DEFAULT_PROFILE = "realtime-cheap"
+
+@functools.lru_cache(maxsize=1)
+def detect_backends() -> Dict[str, EncoderBackend]:
+    """Доступные способы кодирования (проверка выполняется один раз за процесс)"""
+    capabilities = probe_ffmpeg()
+    available = {
+        name: backend for name, backend in BACKENDS.items()
+        if not backend.uses_ffmpeg or capabilities.has_encoder(backend.codec)
+    }
+    logger.info(f"Доступные кодировщики видео: {', '.join(available)}")
+    return available
+
+@functools.lru_cache(maxsize=None)
+def select_encoder(profile: Optional[str] = None) -> EncoderBackend:
+    """Первый доступный способ кодирования профиля (результат кэшируется)"""
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        logger.warning(f"Неизвестный профиль кодирования {profile}, используем {DEFAULT_PROFILE}")
+        profile = DEFAULT_PROFILE
+
+    available = detect_backends()
+    for name in PROFILES[profile]:
+        if name in available:
+            logger.info(f"Профиль кодирования {profile}: {name}")
+            return available[name]
+    return BACKENDS["opencv-mp4v"]
+
+class FFmpegVideoWriter:
+    """
+    Запись сырых кадров в файл через pipe FFmpeg
+
+    Повторяет интерфейс cv2.VideoWriter (write/release/isOpened), поэтому
+    подставляется вместо него без изменения вызывающего кода.
+    """
+
+    def __init__(self, backend: EncoderBackend, output_path: str, fps: int, frame_size: tuple, pix_fmt: str = 'bgr24'):
+        self.output_path = output_path
+        self.frame_size = frame_size
+        self.error: Optional[str] = None
+        self._stderr_tail = deque(maxlen=50)
+
+        width, height = frame_size
+        cmd = [
+            'ffmpeg',
+            '-loglevel', 'error',
+            '-y',
+            '-f', 'rawvideo',
+            '-pix_fmt', pix_fmt,
+            '-s', f'{width}x{height}',
+            '-r', str(fps),
+            '-i', 'pipe:0',
+            *backend.ffmpeg_options(),
+            '-pix_fmt', 'yuv420p',
+            output_path
+        ]
+        logger.info(f"Выполняем: {' '.join(cmd)}")
+
+        try:
+            self.process: Optional[subprocess.Popen] = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+        except (FileNotFoundError, OSError) as e:
+            logger.error(f"❌ Не удалось запустить FFmpeg: {e}")
+            self.process = None
+            return
+
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def _drain_stderr(self):
+        for line in self.process.stderr:
+            self._stderr_tail.append(line.decode(errors='replace').rstrip())
+
+    def isOpened(self) -> bool:
+        return self.process is not None and self.error is None
+
+    def write(self, frame: np.ndarray):
+        """Передать кадр FFmpeg (блокируется, пока кодировщик не примет данные)"""
+        if not self.isOpened():
+            return
+        try:
+            self.process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+        except (BrokenPipeError, OSError) as e:
+            self.error = str(e)
+            logger.error(f"❌ FFmpeg закрыл video pipe: {e}")
+
+    def release(self, timeout: Optional[float] = 60):
+        """Закрыть вход и дождаться, пока FFmpeg допишет файл"""
+        if self.process is None:
+            return
+
+        process, self.process = self.process, None
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            logger.error("❌ Таймаут завершения FFmpeg")
+        self._stderr_thread.join()
+
+        if process.returncode != 0:
+            self.error = "\n".join(self._stderr_tail)
+            logger.error(f"❌ Ошибка FFmpeg: {self.error}")
+
+def open_video_writer(backend: EncoderBackend, output_path: str, fps: int, frame_size: tuple, pix_fmt: str = 'bgr24'):
+    """
+    Открыть запись видео выбранным способом
+
+    pix_fmt задает формат входных кадров: 'bgr24' или, только для FFmpeg, 'yuv420p'
+    (кадры I420 передаются кодировщику без преобразования в BGR).
+    """
+    if backend.uses_ffmpeg:
+        return FFmpegVideoWriter(backend, output_path, fps, frame_size, pix_fmt)
+    fourcc = cv2.VideoWriter_fourcc(*backend.codec)
+    return cv2.VideoWriter(output_path, fourcc, fps, frame_size)
@@ -0,0 +1,333 @@
+import asyncio
+import html
+import logging
+import threading
+import time
+from typing import Optional, Dict, Set
+
+import cv2
+import numpy as np
+from aiohttp import web, WSMsgType
+from livekit.rtc import VideoFrame, VideoBufferType
+
+from pipecat_integration.frame_formats import YUVFrame
+from pipecat_integration.media_workers import MediaWorkerPool, get_media_workers
+
+logger = logging.getLogger(__name__)
+
+MJPEG_BOUNDARY = "frame"
+
+VIEWER_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>HeyGen Avatar</title></head>
+<body style="margin:0;background:#000;display:flex;justify-content:center;align-items:center;height:100vh">
+<img src="/mjpeg?quality={quality}" style="max-width:100%;max-height:100%">
+</body>
+</html>
+"""
+
+class QualityTier:
+    """
+    Уровень качества трансляции: JPEG кодируется один раз на кадр для всех его зрителей
+
+    Кодирование идет, только пока у уровня есть зрители, и всегда берет
+    последний кадр: если кодировщик не успевает, промежуточные кадры пропускаются.
+    """
+
+    def __init__(self, name: str, quality: int, max_width: Optional[int] = None):
+        self.name = name
+        self.quality = quality
+        self.max_width = max_width
+
+        self.jpeg: Optional[bytes] = None
+        self.sequence = 0
+        self.frame_ready = asyncio.Event()
+        self.encoder_task: Optional[asyncio.Task] = None
+        self._viewer_events: Set[asyncio.Event] = set()
+
+        self.frames_encoded = 0
+        self.encode_seconds = 0.0
+
+    @property
+    def viewers(self) -> int:
+        return len(self._viewer_events)
+
+    def add_viewer(self) -> asyncio.Event:
+        event = asyncio.Event()
+        if self.jpeg is not None:
+            # Новый зритель сразу получает последний кадр
+            event.set()
+        self._viewer_events.add(event)
+        return event
+
+    def remove_viewer(self, event: asyncio.Event):
+        self._viewer_events.discard(event)
+
+    def publish(self, jpeg: bytes):
+        self.jpeg = jpeg
+        self.sequence += 1
+        for event in self._viewer_events:
+            event.set()
+
+    def get_stats(self) -> dict:
+        return {
+            "quality": self.quality,
+            "max_width": self.max_width,
+            "viewers": self.viewers,
+            "frames_encoded": self.frames_encoded,
+            "avg_encode_ms": round(self.encode_seconds / self.frames_encoded * 1000, 2) if self.frames_encoded else 0.0
+        }
+
+class Viewer:
+    """Один зритель: отправляет последний JPEG своего уровня, пропуская кадры, если не успевает"""
+
+    def __init__(self, tier: QualityTier, max_fps: Optional[float] = None):
+        self.tier = tier
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self._last_sequence = 0
+        self._last_sent = 0.0
+        self._event = tier.add_viewer()
+
+    async def frames(self):
+        """Асинхронный генератор кадров для отправки (каждый раз - самый свежий)"""
+        while True:
+            await self._event.wait()
+
+            # Ограничение частоты зрителя: кадры, пришедшие за время ожидания, заменяются последним
+            delay = self._last_sent + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._event.clear()
+
+            sequence, jpeg = self.tier.sequence, self.tier.jpeg
+            if self._last_sequence and sequence - self._last_sequence > 1:
+                self.frames_dropped += sequence - self._last_sequence - 1
+            self._last_sequence = sequence
+            self._last_sent = time.monotonic()
+
+            yield jpeg
+            self.frames_sent += 1
+
+    def close(self):
+        self.tier.remove_viewer(self._event)
+
+class ViewerFanoutServer:
+    """
+    Локальная раздача одного аватара многим зрителям (MJPEG и WebSocket)
+
+    Кадры берутся из HeyGenLiveKitClient (декодируются один раз), JPEG кодируется
+    в пуле медиа-исполнителей один раз на кадр для каждого уровня качества, у
+    которого есть зрители. Каждый зритель отправляет кадры в своем темпе:
+    медленный клиент получает меньше кадров и не задерживает остальных.
+
+    Точки доступа:
+        GET /                          - страница просмотра
+        GET /mjpeg?quality=medium&fps=15 - MJPEG поток (multipart/x-mixed-replace)
+        GET /ws?quality=medium&fps=15    - WebSocket, каждый кадр - бинарное сообщение JPEG
+        GET /stats                     - статистика зрителей и кодирования
+    """
+
+    # Уровни качества: имя, качество JPEG, максимальная ширина кадра
+    DEFAULT_TIERS = (
+        ("low", 50, 640),
+        ("medium", 70, 1280),
+        ("high", 85, None),
+    )
+    DEFAULT_TIER = "medium"
+
+    def __init__(
+        self,
+        client,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        workers: Optional[MediaWorkerPool] = None
+    ):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.workers = workers or get_media_workers()
+        self.tiers: Dict[str, QualityTier] = {
+            name: QualityTier(name, quality, max_width) for name, quality, max_width in self.DEFAULT_TIERS
+        }
+
+        # Последний декодированный кадр; BGR общий для всех уровней качества
+        self._frame: Optional[VideoFrame] = None
+        self._frame_sequence = 0
+        self._bgr_lock = threading.Lock()
+        self._bgr_cache: tuple = (0, None)
+
+        self._viewers: Set[Viewer] = set()
+        self._runner: Optional[web.AppRunner] = None
+        self.frames_received = 0
+
+    def _on_frame(self, frame: VideoFrame, timestamp: float):
+        """Подписчик кадров клиента (в event loop): только запоминает кадр"""
+        self._frame = frame
+        self._frame_sequence += 1
+        self.frames_received += 1
+        for tier in self.tiers.values():
+            if tier.viewers:
+                tier.frame_ready.set()
+
+    def _frame_bgr(self, frame: VideoFrame, sequence: int) -> np.ndarray:
+        """BGR кадра: преобразуется один раз, даже если его кодируют несколько уровней"""
+        with self._bgr_lock:
+            cached_sequence, bgr = self._bgr_cache
+            if cached_sequence != sequence:
+                if frame.type != VideoBufferType.I420:
+                    frame = frame.convert(VideoBufferType.I420)
+                bgr = YUVFrame(np.frombuffer(frame.data, dtype=np.uint8), frame.width, frame.height).to_bgr()
+                self._bgr_cache = (sequence, bgr)
+            return bgr
+
+    def _encode(self, tier: QualityTier, frame: VideoFrame, sequence: int) -> Optional[bytes]:
+        bgr = self._frame_bgr(frame, sequence)
+        if tier.max_width and bgr.shape[1] > tier.max_width:
+            height = round(bgr.shape[0] * tier.max_width / bgr.shape[1])
+            bgr = cv2.resize(bgr, (tier.max_width, height), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, tier.quality])
+        return jpeg.tobytes() if ok else None
+
+    async def _run_encoder(self, tier: QualityTier):
+        """Кодировать последний кадр, пока у уровня есть зрители"""
+        try:
+            while True:
+                await tier.frame_ready.wait()
+                tier.frame_ready.clear()
+                if not tier.viewers:
+                    break
+                if self._frame is None:
+                    continue
+
+                started = time.monotonic()
+                jpeg = await self.workers.run(self._encode, tier, self._frame, self._frame_sequence)
+                tier.encode_seconds += time.monotonic() - started
+                if jpeg is not None:
+                    tier.frames_encoded += 1
+                    tier.publish(jpeg)
+        except Exception as e:
+            logger.error(f"Ошибка кодирования JPEG ({tier.name}): {e}")
+        finally:
+            tier.encoder_task = None
+
+    def _open_viewer(self, request: web.Request) -> Viewer:
+        tier = self.tiers.get(request.query.get("quality", self.DEFAULT_TIER), self.tiers[self.DEFAULT_TIER])
+        try:
+            max_fps = float(request.query["fps"]) if "fps" in request.query else None
+        except ValueError:
+            max_fps = None
+
+        viewer = Viewer(tier, max_fps)
+        self._viewers.add(viewer)
+        if tier.encoder_task is None:
+            tier.encoder_task = asyncio.create_task(self._run_encoder(tier))
+        # Последний кадр кодируется сразу, не дожидаясь следующего
+        tier.frame_ready.set()
+        logger.info(f"Подключен зритель ({tier.name}), всего: {len(self._viewers)}")
+        return viewer
+
+    def _close_viewer(self, viewer: Viewer):
+        viewer.close()
+        self._viewers.discard(viewer)
+        tier = viewer.tier
+        if not tier.viewers and tier.encoder_task is not None:
+            # Последний зритель уровня ушел: кодировщик завершится на следующем пробуждении
+            tier.frame_ready.set()
+        logger.info(f"Зритель отключен ({tier.name}), отправлено {viewer.frames_sent}, "
+                    f"пропущено {viewer.frames_dropped}, всего зрителей: {len(self._viewers)}")
+
+    async def _handle_index(self, request: web.Request) -> web.Response:
+        # В страницу попадает только имя известного уровня качества
+        quality = request.query.get("quality", self.DEFAULT_TIER)
+        if quality not in self.tiers:
+            quality = self.DEFAULT_TIER
+        return web.Response(text=VIEWER_PAGE.format(quality=html.escape(quality)), content_type="text/html")
+
+    async def _handle_mjpeg(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            "Content-Type": f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+            "Cache-Control": "no-cache"
+        })
+        await response.prepare(request)
+
+        viewer = self._open_viewer(request)
+        try:
+            async for jpeg in viewer.frames():
+                # write ждет, пока данные уйдут клиенту: медленный зритель пропускает кадры
+                await response.write(
+                    f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                    + jpeg + b"\r\n"
+                )
+        except ConnectionResetError:
+            pass
+        finally:
+            self._close_viewer(viewer)
+        return response
+
+    async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        viewer = self._open_viewer(request)
+        sender = asyncio.create_task(self._send_ws_frames(ws, viewer))
+        try:
+            # Входящие сообщения не используются, цикл нужен, чтобы заметить закрытие
+            async for message in ws:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            sender.cancel()
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            self._close_viewer(viewer)
+        return ws
+
+    @staticmethod
+    async def _send_ws_frames(ws: web.WebSocketResponse, viewer: Viewer):
+        try:
+            async for jpeg in viewer.frames():
+                await ws.send_bytes(jpeg)
+        except ConnectionResetError:
+            pass
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+    async def start(self):
+        """Подписаться на кадры клиента и запустить HTTP сервер"""
+        app = web.Application()
+        app.router.add_get("/", self._handle_index)
+        app.router.add_get("/mjpeg", self._handle_mjpeg)
+        app.router.add_get("/ws", self._handle_ws)
+        app.router.add_get("/stats", self._handle_stats)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.client.subscribe_frames(self._on_frame)
+        logger.info(f"Трансляция аватара: http://{self.host}:{self.port}/")
+
+    async def stop(self):
+        """Отключить зрителей и остановить сервер"""
+        self.client.unsubscribe_frames(self._on_frame)
+        for tier in self.tiers.values():
+            if tier.encoder_task is not None:
+                tier.encoder_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        logger.info("Трансляция аватара остановлена")
+
+    def get_stats(self) -> dict:
+        """Получить статистику трансляции"""
+        return {
+            "viewers": len(self._viewers),
+            "frames_received": self.frames_received,
+            "tiers": {name: tier.get_stats() for name, tier in self.tiers.items()},
+            "frames_sent": sum(viewer.frames_sent for viewer in self._viewers),
+            "frames_dropped": sum(viewer.frames_dropped for viewer in self._viewers)
+        }
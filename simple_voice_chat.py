@@ -122,7 +122,8 @@ class SimpleVoiceChat:
             success = await self.livekit_client.connect(
                 url=self.current_session["url"],
                 access_token=self.current_session["access_token"],
-                session_id=self.current_session["session_id"]
+                session_id=self.current_session["session_id"],
+                server_url=self.session_manager.base_url
             )
             
             if success:
@@ -269,13 +270,17 @@ class SimpleVoiceChat:
                                 self.livekit_client.start_recording(task_id)
                                 
                             # Отправляем сообщение аватару
-                            await self.session_manager.send_task(
-                                self.current_session["session_id"],
-                                llm_response
-                            )
+                            task_sent_at = time.time()
+                            result = await self.session_manager.send_task(llm_response)
                             
-                            # Ждем некоторое время для генерации ответа
-                            await asyncio.sleep(3.0)
+                            # Ждем окончания речи аватара по событию WebSocket (таймаут - страховка)
+                            if self.livekit_client and self.livekit_client.events_connected:
+                                heygen_task_id = (result or {}).get('data', {}).get('task_id')
+                                await self.livekit_client.wait_for_task_completion(
+                                    heygen_task_id, timeout=15.0, since=task_sent_at
+                                )
+                            else:
+                                await asyncio.sleep(3.0)
                             
                             # Останавливаем запись
                             if self.livekit_client:
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Синхронизация аудио и видео при записи
+Приведение видео к постоянной частоте кадров (CFR) по временным меткам кадров
+"""
+
+import math
+from typing import Optional
+
+import numpy as np
+
+
+def cfr_frame_indices(timestamps: np.ndarray, fps: float, start_time: float, duration: float) -> np.ndarray:
+    """
+    Для каждого слота CFR выхода вернуть индекс исходного кадра (векторизовано)
+
+    Слот k показывает последний кадр с временной меткой не позже середины слота,
+    поэтому пропуски заполняются повтором кадра, а лишние кадры отбрасываются.
+    До первого кадра показывается первый кадр.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    slot_count = max(0, int(round(duration * fps)))
+    if slot_count == 0 or timestamps.size == 0:
+        return np.empty(0, dtype=np.int64)
+
+    slot_times = start_time + (np.arange(slot_count, dtype=np.float64) + 0.5) / fps
+    indices = np.searchsorted(timestamps, slot_times, side='right') - 1
+    return np.clip(indices, 0, timestamps.size - 1)
+
+
+class ConstantFrameRateSync:
+    """
+    Инкрементальный вариант cfr_frame_indices для потоковой записи
+
+    Для каждого нового кадра говорит, сколько раз повторить предыдущий кадр
+    (заполнение пропуска) и сколько раз записать текущий (0 - кадр лишний).
+    """
+
+    def __init__(self, fps: float, start_time: float):
+        self.fps = fps
+        self.start_time = start_time
+        self.next_slot = 0
+
+    def _slot_for(self, timestamp: float) -> int:
+        return int(math.floor((timestamp - self.start_time) * self.fps + 0.5))
+
+    def place(self, timestamp: float) -> tuple:
+        """Вернуть (повторов_предыдущего_кадра, повторов_текущего_кадра)"""
+        slot = max(0, self._slot_for(timestamp))
+        if slot < self.next_slot:
+            # Слот уже занят: кадр пришел пачкой с предыдущим
+            return 0, 0
+
+        if self.next_slot == 0:
+            # Первый кадр закрывает и слоты до своего появления
+            self.next_slot = slot + 1
+            return 0, slot + 1
+
+        gap = slot - self.next_slot
+        self.next_slot = slot + 1
+        return gap, 1
+
+    def padding_until(self, end_time: float) -> int:
+        """Сколько повторов последнего кадра нужно, чтобы дотянуть видео до end_time"""
+        slot_count = int(round((end_time - self.start_time) * self.fps))
+        return max(0, slot_count - self.next_slot)
+
+
+class VideoTimestampMapper:
+    """
+    Перевод временных меток LiveKit (timestamp_us) на часы записи
+
+    Интервалы между кадрами берутся из timestamp_us (без джиттера доставки),
+    а привязка к настенным часам - по моменту прихода первого кадра.
+    """
+
+    def __init__(self):
+        self._base_us: Optional[int] = None
+        self._base_wall: Optional[float] = None
+
+    def reset(self):
+        self._base_us = None
+        self._base_wall = None
+
+    def to_wall_time(self, timestamp_us: Optional[int], arrival_time: float) -> float:
+        if not timestamp_us:
+            return arrival_time
+
+        if self._base_us is None or timestamp_us < self._base_us:
+            self._base_us = timestamp_us
+            self._base_wall = arrival_time
+
+        return self._base_wall + (timestamp_us - self._base_us) / 1_000_000
+
+
+def silence_bytes(seconds: float, sample_rate: int, channels: int) -> bytes:
+    """PCM s16le тишина заданной длительности (для выравнивания аудио по часам записи)"""
+    samples = max(0, int(round(seconds * sample_rate)))
+    return bytes(samples * channels * 2)
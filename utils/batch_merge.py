@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Пакетное объединение записей, оставшихся без звука
+Находит пары <имя>_video_only.mp4 (или .webm) + <имя>.wav и объединяет их параллельно
+
+Использование:
+    python -m utils.batch_merge [каталог] [--jobs N] [--keep-sources] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Optional, List
+
+from utils.ffmpeg_runner import FFmpegRunner, probe_duration
+from utils.video_audio_merge import merge_video_audio
+
+logger = logging.getLogger(__name__)
+
+VIDEO_SUFFIX = "_video_only"
+# Контейнеры видео без звука (WebM - для профилей кодирования VP8/VP9)
+VIDEO_EXTENSIONS = (".mp4", ".webm")
+AUDIO_EXTENSION = ".wav"
+# Незавершенный результат: переименовывается в итоговый файл только после успеха FFmpeg
+PARTIAL_SUFFIX = ".partial"
+
+class MergeJob:
+    """Пара файлов одной записи и итоговый файл"""
+
+    def __init__(self, directory: str, base_name: str, extension: str = ".mp4"):
+        self.base_name = base_name
+        self.video_path = os.path.join(directory, f"{base_name}{VIDEO_SUFFIX}{extension}")
+        self.audio_path = os.path.join(directory, f"{base_name}{AUDIO_EXTENSION}")
+        self.output_path = os.path.join(directory, f"{base_name}{extension}")
+        self.partial_path = os.path.join(directory, f"{base_name}{PARTIAL_SUFFIX}{extension}")
+
+        self.duration: Optional[float] = None
+        self.success = False
+
+    @property
+    def completed(self) -> bool:
+        """Итоговый файл уже создан (предыдущим запуском или при записи)"""
+        return os.path.exists(self.output_path) and os.path.getsize(self.output_path) > 0
+
+    def __repr__(self) -> str:
+        return f"MergeJob({self.base_name!r})"
+
+def discover_jobs(directory: str) -> List[MergeJob]:
+    """Найти пары видео/аудио по соглашению об именах файлов записи"""
+    jobs = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        if not stem.endswith(VIDEO_SUFFIX) or extension not in VIDEO_EXTENSIONS:
+            continue
+
+        job = MergeJob(directory, stem[:-len(VIDEO_SUFFIX)], extension)
+        if not os.path.exists(job.audio_path):
+            logger.warning(f"Нет аудио для {name}, пропускаем")
+            continue
+        jobs.append(job)
+    return jobs
+
+class BatchMerger:
+    """
+    Параллельное объединение записей через пул задач FFmpeg
+
+    Число одновременных процессов FFmpeg ограничено runner-ом (по умолчанию
+    по числу ядер). Результат пишется во временный файл и переименовывается
+    после успеха, поэтому прерванный запуск можно просто повторить: готовые
+    записи пропускаются, недописанные объединяются заново.
+    """
+
+    def __init__(self, jobs: Optional[int] = None, keep_sources: bool = False):
+        self.runner = FFmpegRunner(max_concurrent=jobs or os.cpu_count() or 1)
+        self.keep_sources = keep_sources
+
+        # Статистика
+        self.merged = 0
+        self.failed = 0
+        self.skipped = 0
+        self.media_seconds = 0.0
+        self.elapsed = 0.0
+
+    async def _merge(self, job: MergeJob, probe_limit: asyncio.Semaphore):
+        # Длительность по аудио: от нее зависят таймаут FFmpeg и итоговый realtime factor.
+        # ffprobe ограничен так же, как FFmpeg: иначе сотни пар запустят сотни процессов сразу
+        async with probe_limit:
+            job.duration = await probe_duration(job.audio_path)
+
+        job.success = await merge_video_audio(
+            job.video_path, job.audio_path, job.partial_path,
+            duration=job.duration, runner=self.runner
+        )
+        # Ошибка файловой системы в одной записи не прерывает остальные
+        try:
+            if not job.success:
+                if os.path.exists(job.partial_path):
+                    os.remove(job.partial_path)
+            else:
+                os.replace(job.partial_path, job.output_path)
+        except OSError as e:
+            logger.error(f"Ошибка сохранения результата {job.base_name}: {e}")
+            job.success = False
+
+        if not job.success:
+            self.failed += 1
+            return
+
+        self.merged += 1
+        self.media_seconds += job.duration or 0.0
+
+        if not self.keep_sources:
+            try:
+                os.remove(job.video_path)
+                os.remove(job.audio_path)
+            except OSError as e:
+                # Итоговый файл уже готов: повторный запуск его пропустит
+                logger.warning(f"Не удалось удалить исходные файлы {job.base_name}: {e}")
+
+    async def run(self, jobs: List[MergeJob]) -> bool:
+        """Объединить все незавершенные пары; True, если ошибок не было"""
+        pending = []
+        for job in jobs:
+            if job.completed:
+                self.skipped += 1
+                logger.info(f"Уже объединено, пропускаем: {job.output_path}")
+            else:
+                pending.append(job)
+
+        if not pending:
+            return True
+
+        if not await self.runner.is_available():
+            logger.error("❌ FFmpeg не найден в системе")
+            self.failed += len(pending)
+            return False
+
+        started = time.monotonic()
+        probe_limit = asyncio.Semaphore(self.runner.max_concurrent)
+        results = await asyncio.gather(*(self._merge(job, probe_limit) for job in pending),
+                                       return_exceptions=True)
+        for job, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка объединения {job.base_name}: {result}")
+                self.failed += 1
+        self.elapsed = time.monotonic() - started
+        return self.failed == 0
+
+    def get_stats(self) -> dict:
+        """Получить статистику: пропускная способность в файлах/с и realtime factor"""
+        return {
+            "merged": self.merged,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "media_seconds": self.media_seconds,
+            "elapsed": self.elapsed,
+            "files_per_second": self.merged / self.elapsed if self.elapsed else 0.0,
+            # Во сколько раз быстрее реального времени обработаны записи
+            "realtime_factor": self.media_seconds / self.elapsed if self.elapsed else 0.0,
+            "jobs": self.runner.max_concurrent
+        }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пакетное объединение видео и аудио записей")
+    parser.add_argument("directory", nargs="?", default=os.getenv('OUTPUT_DIR', 'outputs'),
+                        help="Каталог с записями (по умолчанию OUTPUT_DIR)")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="Число одновременных процессов FFmpeg (по умолчанию - число ядер)")
+    parser.add_argument("--keep-sources", action="store_true",
+                        help="Не удалять исходные файлы после объединения")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Только показать найденные пары")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if not os.path.isdir(args.directory):
+        logger.error(f"Каталог не найден: {args.directory}")
+        return 1
+
+    jobs = discover_jobs(args.directory)
+    print(f"🔍 Найдено пар видео/аудио: {len(jobs)}")
+    if args.dry_run:
+        for job in jobs:
+            status = "готово" if job.completed else "ожидает"
+            print(f"   {job.base_name} ({status})")
+        return 0
+
+    merger = BatchMerger(jobs=args.jobs, keep_sources=args.keep_sources)
+    success = asyncio.run(merger.run(jobs))
+
+    stats = merger.get_stats()
+    print("=" * 60)
+    print(f"✅ Объединено: {stats['merged']}, пропущено: {stats['skipped']}, ошибок: {stats['failed']}")
+    print(f"⏱️  Время: {stats['elapsed']:.1f} с, процессов FFmpeg: {stats['jobs']}")
+    print(f"📊 Пропускная способность: {stats['files_per_second']:.2f} файлов/с")
+    print(f"🚀 Realtime factor: {stats['realtime_factor']:.1f}x ({stats['media_seconds']:.1f} с медиа)")
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
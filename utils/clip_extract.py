@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Вырезание клипов задач из непрерывной записи сессии
+Копирование потоков без перекодирования (-c copy) с выравниванием по ключевым кадрам
+"""
+
+import asyncio
+import bisect
+import logging
+import os
+from typing import Optional, List, Dict
+
+from utils.ffmpeg_runner import FFmpegRunner, get_ffmpeg_runner, probe_duration
+
+logger = logging.getLogger(__name__)
+
+async def probe_keyframes(path: str, timeout: float) -> List[float]:
+    """Временные метки ключевых кадров видео (по пакетам, без декодирования)"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError as e:
+        logger.error(f"❌ Не удалось получить ключевые кадры: {e}")
+        return []
+
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        logger.error(f"❌ Таймаут ffprobe при поиске ключевых кадров ({timeout:.0f} с)")
+        return []
+    if process.returncode != 0:
+        logger.error(f"❌ Ошибка ffprobe: {stderr.decode(errors='replace')}")
+        return []
+
+    keyframes = []
+    for line in stdout.decode(errors='replace').splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+def keyframe_at_or_before(keyframes: List[float], timestamp: float) -> float:
+    """Ближайший ключевой кадр не позже timestamp (с него stream copy режет без артефактов)"""
+    position = bisect.bisect_right(keyframes, timestamp) - 1
+    return keyframes[position] if position >= 0 else 0.0
+
+async def extract_clip(
+    source_path: str,
+    output_path: str,
+    start: float,
+    end: float,
+    keyframes: Optional[List[float]] = None,
+    runner: Optional[FFmpegRunner] = None
+) -> bool:
+    """
+    Вырезать отрезок [start, end) копированием потоков без перекодирования
+
+    Таймаут FFmpeg зависит от длительности клипа.
+    """
+    if keyframes:
+        start = keyframe_at_or_before(keyframes, start)
+
+    duration = end - start
+    if duration <= 0:
+        logger.error(f"Пустой отрезок клипа: {start:.3f}-{end:.3f}")
+        return False
+
+    args = [
+        '-y',
+        '-ss', f'{start:.3f}',
+        '-i', source_path,
+        '-t', f'{duration:.3f}',
+        '-map', '0',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        *(['-movflags', '+faststart'] if output_path.endswith('.mp4') else []),
+        output_path
+    ]
+
+    runner = runner or get_ffmpeg_runner()
+    try:
+        result = await runner.run(args, duration=duration)
+    except FileNotFoundError:
+        logger.error("❌ FFmpeg не найден в системе")
+        return False
+
+    if result.ok:
+        logger.info(f"✅ Клип создан: {output_path} ({start:.2f}-{end:.2f} с)")
+        return True
+    if not result.timed_out:
+        logger.error(f"❌ Ошибка FFmpeg: {result.stderr}")
+    return False
+
+async def extract_task_clips(
+    source_path: str,
+    segments: list,
+    output_dir: Optional[str] = None,
+    padding: float = 0.25,
+    runner: Optional[FFmpegRunner] = None
+) -> Dict[str, str]:
+    """
+    Вырезать клипы для отрезков TaskSegment (ключевые кадры определяются один раз)
+
+    Returns:
+        Словарь task_id -> путь к клипу (для отрезков без task_id - task_<номер>)
+    """
+    output_dir = output_dir or os.path.dirname(source_path)
+    base_name, extension = os.path.splitext(os.path.basename(source_path))
+    if extension == '.m3u8':
+        # Сегментированная запись: плейлист лежит в каталоге с именем записи
+        base_name = os.path.basename(os.path.dirname(os.path.abspath(source_path)))
+        extension = '.mp4'
+
+    # ffprobe читает пакеты всей записи: таймаут - по ее длительности
+    runner = runner or get_ffmpeg_runner()
+    keyframes = await probe_keyframes(source_path, runner.timeout_for(await probe_duration(source_path)))
+
+    clips = {}
+    for number, segment in enumerate(segments, start=1):
+        if segment.end is None:
+            continue
+
+        task_id = segment.task_id or f"task_{number}"
+        output_path = os.path.join(output_dir, f"{base_name}_{task_id}{extension}")
+        start = max(0.0, segment.start - padding)
+        if await extract_clip(source_path, output_path, start, segment.end + padding, keyframes, runner):
+            clips[task_id] = output_path
+
+    return clips
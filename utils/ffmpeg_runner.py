@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Асинхронный запуск FFmpeg
+Ограничение параллельных задач, кэшированная проверка FFmpeg, прогресс из -progress,
+отмена и таймауты, зависящие от длительности медиа
+"""
+
+import asyncio
+import functools
+import logging
+import subprocess
+import time
+import weakref
+from collections import deque
+from typing import Optional, Callable, FrozenSet, Iterable
+
+logger = logging.getLogger(__name__)
+
+class FFmpegCapabilities:
+    """Результат однократной проверки FFmpeg в системе"""
+
+    def __init__(self, available: bool, version: str = "", encoders: FrozenSet[str] = frozenset()):
+        self.available = available
+        self.version = version
+        self.encoders = encoders
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.encoders
+
+    def __repr__(self) -> str:
+        return f"FFmpegCapabilities(available={self.available}, version={self.version!r}, encoders={len(self.encoders)})"
+
+@functools.lru_cache(maxsize=1)
+def probe_ffmpeg() -> FFmpegCapabilities:
+    """Проверить FFmpeg один раз за процесс: версия и список кодировщиков"""
+    try:
+        version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=5)
+        if version.returncode != 0:
+            return FFmpegCapabilities(False)
+
+        encoders = set()
+        listing = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True, timeout=5)
+        for line in listing.stdout.splitlines():
+            # Строки вида " V..... libx264   описание"
+            parts = line.split()
+            if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS':
+                encoders.add(parts[1])
+
+        first_line = version.stdout.splitlines()[0] if version.stdout else ""
+        return FFmpegCapabilities(True, first_line, frozenset(encoders))
+    except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+        return FFmpegCapabilities(False)
+
+class FFmpegJobResult:
+    """Результат задачи FFmpeg"""
+
+    def __init__(self, returncode: Optional[int], stderr: str, elapsed: float, timed_out: bool = False):
+        self.returncode = returncode
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+class FFmpegRunner:
+    """
+    Запуск задач FFmpeg из asyncio без блокировки event loop
+
+    Число одновременных процессов ограничено (отдельно для каждого event loop),
+    таймаут задачи равен base_timeout + длительность медиа * timeout_per_second,
+    при отмене корутины процесс FFmpeg завершается.
+    """
+
+    def __init__(self, max_concurrent: int = 2, base_timeout: float = 30.0, timeout_per_second: float = 1.0):
+        self.max_concurrent = max_concurrent
+        self.base_timeout = base_timeout
+        self.timeout_per_second = timeout_per_second
+        # Семафор asyncio привязан к своему event loop, поэтому - по одному на loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+        # Статистика
+        self.jobs_started = 0
+        self.jobs_failed = 0
+        self.jobs_cancelled = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def timeout_for(self, duration: Optional[float]) -> float:
+        """Таймаут задачи с учетом длительности обрабатываемого медиа"""
+        return self.base_timeout + max(0.0, duration or 0.0) * self.timeout_per_second
+
+    async def is_available(self) -> bool:
+        """Доступен ли FFmpeg (проверка выполняется один раз за процесс)"""
+        return (await asyncio.to_thread(probe_ffmpeg)).available
+
+    @staticmethod
+    async def _read_progress(stream, duration: Optional[float], progress: Optional[Callable]):
+        """Разобрать вывод -progress: строки key=value, out_time_us - обработанное время"""
+        async for raw_line in stream:
+            key, _, value = raw_line.decode(errors='replace').strip().partition('=')
+            if key in ('out_time_us', 'out_time_ms') and value.isdigit() and progress is not None:
+                # out_time_ms в FFmpeg исторически тоже в микросекундах
+                try:
+                    progress(int(value) / 1_000_000, duration)
+                except Exception as e:
+                    logger.error(f"Ошибка в обработчике прогресса FFmpeg: {e}")
+
+    @staticmethod
+    async def _read_stderr(stream, tail: deque):
+        async for raw_line in stream:
+            tail.append(raw_line.decode(errors='replace').rstrip())
+
+    @staticmethod
+    async def _write_input(stream, chunks: Iterable):
+        """Передать данные в stdin FFmpeg, соблюдая backpressure pipe"""
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+                await stream.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # FFmpeg завершился раньше: причина будет в stderr
+            pass
+        finally:
+            stream.close()
+
+    async def run(
+        self,
+        args: list,
+        duration: Optional[float] = None,
+        progress: Optional[Callable[[float, Optional[float]], None]] = None,
+        timeout: Optional[float] = None,
+        input_chunks: Optional[Iterable] = None
+    ) -> FFmpegJobResult:
+        """
+        Выполнить FFmpeg с аргументами args (без имени программы)
+
+        Args:
+            duration: Длительность медиа в секундах (для таймаута и прогресса)
+            progress: Обработчик прогресса (обработано_секунд, duration)
+            timeout: Явный таймаут вместо рассчитанного по длительности
+            input_chunks: Буферы для stdin (для входа 'pipe:0'), передаются по одному
+        """
+        timeout = timeout if timeout is not None else self.timeout_for(duration)
+        cmd = ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1', *args]
+
+        async with self._semaphore():
+            self.jobs_started += 1
+            started = time.monotonic()
+            logger.info(f"Выполняем: {' '.join(cmd)}")
+
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE if input_chunks is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stderr_tail: deque = deque(maxlen=50)
+            streams = [
+                self._read_progress(process.stdout, duration, progress),
+                self._read_stderr(process.stderr, stderr_tail)
+            ]
+            if input_chunks is not None:
+                streams.append(self._write_input(process.stdin, input_chunks))
+            readers = asyncio.gather(*streams)
+
+            try:
+                await asyncio.wait_for(asyncio.shield(readers), timeout=timeout)
+                await process.wait()
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                self.jobs_failed += 1
+                logger.error(f"❌ Таймаут выполнения FFmpeg ({timeout:.0f} с)")
+                return FFmpegJobResult(process.returncode, "\n".join(stderr_tail), time.monotonic() - started, timed_out=True)
+            except asyncio.CancelledError:
+                await self._kill(process)
+                self.jobs_cancelled += 1
+                logger.info("Задача FFmpeg отменена")
+                raise
+            finally:
+                if not readers.done():
+                    readers.cancel()
+
+            result = FFmpegJobResult(process.returncode, "\n".join(stderr_tail), time.monotonic() - started)
+            if not result.ok:
+                self.jobs_failed += 1
+            return result
+
+    @staticmethod
+    async def _kill(process):
+        if process.returncode is not None:
+            return
+        process.kill()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning("FFmpeg не завершился после kill")
+
+    def get_stats(self) -> dict:
+        """Получить статистику задач"""
+        return {
+            "max_concurrent": self.max_concurrent,
+            "started": self.jobs_started,
+            "failed": self.jobs_failed,
+            "cancelled": self.jobs_cancelled
+        }
+
+async def probe_duration(path: str) -> Optional[float]:
+    """Длительность медиа файла по ffprobe (None, если не удалось определить)"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+    except FileNotFoundError:
+        return None
+
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=10)
+        return float(stdout.decode().strip())
+    except asyncio.TimeoutError:
+        await FFmpegRunner._kill(process)
+        return None
+    except ValueError:
+        return None
+
+_shared_runner: Optional[FFmpegRunner] = None
+
+def get_ffmpeg_runner() -> FFmpegRunner:
+    """Общий исполнитель задач FFmpeg процесса"""
+    global _shared_runner
+    if _shared_runner is None:
+        _shared_runner = FFmpegRunner()
+    return _shared_runner
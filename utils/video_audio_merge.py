@@ -4,70 +4,423 @@
 Использует системный FFmpeg
 """
 
+import asyncio
 import subprocess
 import os
 import logging
+import queue
+import threading
+from collections import deque
+from typing import Optional, List, Callable
+
+from utils.av_sync import ConstantFrameRateSync, silence_bytes
+from utils.ffmpeg_runner import FFmpegRunner, get_ffmpeg_runner, probe_ffmpeg, probe_duration
 
 logger = logging.getLogger(__name__)
 
-def merge_video_audio_with_ffmpeg(video_path: str, audio_path: str, output_path: str) -> bool:
+async def merge_video_audio(
+    video_path: str,
+    audio_path: str,
+    output_path: str,
+    duration: Optional[float] = None,
+    progress: Optional[Callable] = None,
+    runner: Optional[FFmpegRunner] = None
+) -> bool:
     """
-    Объединить видео и аудио с помощью системного FFmpeg
+    Объединить видео и аудио с помощью системного FFmpeg (асинхронно)
+    
+    Таймаут зависит от длительности записи (если не задана - определяется ffprobe),
+    поэтому длинные записи не обрываются фиксированным таймаутом.
     """
-    try:
-        # Проверить наличие файлов
-        if not os.path.exists(video_path):
-            logger.error(f"Видео файл не найден: {video_path}")
-            return False
-            
-        if not os.path.exists(audio_path):
-            logger.error(f"Аудио файл не найден: {audio_path}")
-            return False
-        
-        # Команда FFmpeg для объединения видео и аудио
-        cmd = [
-            'ffmpeg',
-            '-i', video_path,  # Входное видео
-            '-i', audio_path,  # Входное аудио
-            '-c:v', 'copy',    # Копировать видео без перекодирования
-            '-c:a', 'aac',     # Кодировать аудио в AAC
-            '-shortest',       # Остановиться когда закончится самый короткий поток
-            '-y',              # Перезаписать выходной файл если существует
-            output_path
-        ]
-        
-        logger.info(f"Выполняем: {' '.join(cmd)}")
-        
-        # Выполнить команду
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30  # Таймаут 30 секунд
-        )
+    # Проверить наличие файлов
+    if not os.path.exists(video_path):
+        logger.error(f"Видео файл не найден: {video_path}")
+        return False
         
-        if result.returncode == 0:
-            logger.info(f"✅ Видео с аудио создано: {output_path}")
-            return True
-        else:
-            logger.error(f"❌ Ошибка FFmpeg: {result.stderr}")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        logger.error("❌ Таймаут выполнения FFmpeg")
+    if not os.path.exists(audio_path):
+        logger.error(f"Аудио файл не найден: {audio_path}")
         return False
-    except FileNotFoundError:
+    
+    runner = runner or get_ffmpeg_runner()
+    if not await runner.is_available():
         logger.error("❌ FFmpeg не найден в системе")
         logger.info("💡 Установите FFmpeg: brew install ffmpeg")
         return False
+    
+    if duration is None:
+        duration = await probe_duration(video_path)
+    
+    # WebM (VP8/VP9) допускает только Opus/Vorbis
+    audio_codec = 'libopus' if output_path.endswith('.webm') else 'aac'
+    
+    # Аргументы FFmpeg для объединения видео и аудио
+    args = [
+        '-i', video_path,  # Входное видео
+        '-i', audio_path,  # Входное аудио
+        '-c:v', 'copy',    # Копировать видео без перекодирования
+        '-c:a', audio_codec,  # Кодировать аудио в AAC (Opus для WebM)
+        '-shortest',       # Остановиться когда закончится самый короткий поток
+        '-y',              # Перезаписать выходной файл если существует
+        output_path
+    ]
+    
+    try:
+        result = await runner.run(args, duration=duration, progress=progress)
     except Exception as e:
         logger.error(f"❌ Ошибка объединения: {e}")
         return False
+    
+    if result.ok:
+        logger.info(f"✅ Видео с аудио создано: {output_path} ({result.elapsed:.1f} с)")
+        return True
+    if not result.timed_out:
+        logger.error(f"❌ Ошибка FFmpeg: {result.stderr}")
+    return False
+
+def merge_video_audio_with_ffmpeg(video_path: str, audio_path: str, output_path: str) -> bool:
+    """
+    Объединить видео и аудио с помощью системного FFmpeg
+    
+    Синхронная обертка над merge_video_audio для кода без event loop.
+    """
+    return asyncio.run(merge_video_audio(video_path, audio_path, output_path))
 
 def check_ffmpeg_available() -> bool:
-    """Проверить доступность FFmpeg в системе"""
+    """Проверить доступность FFmpeg в системе (результат кэшируется)"""
+    return probe_ffmpeg().available
+
+# Кодеки для сохранения аудио без видео: формат -> (кодек FFmpeg, битрейт)
+AUDIO_CODECS = {
+    'opus': ('libopus', '32k'),
+    'aac': ('aac', '96k'),
+}
+
+async def encode_pcm_audio(
+    segments: list,
+    output_path: str,
+    sample_rate: int,
+    channels: int,
+    audio_format: str,
+    leading_silence: float = 0.0,
+    runner: Optional[FFmpegRunner] = None
+) -> bool:
+    """
+    Закодировать PCM s16le (последовательность буферов) в Opus или AAC через pipe FFmpeg
+    
+    Буферы передаются в stdin как есть, без объединения в один массив. Процесс
+    запускается через FFmpegRunner: event loop не блокируется, а таймаут
+    растет с длительностью записи.
+    """
+    codec, bitrate = AUDIO_CODECS[audio_format]
+    args = [
+        '-f', 's16le',
+        '-ar', str(sample_rate),
+        '-ac', str(channels),
+        '-i', 'pipe:0',
+        '-c:a', codec,
+        '-b:a', bitrate,
+        '-y',
+        output_path
+    ]
+    
+    views = [memoryview(segment).cast('B') for segment in segments]
+    duration = leading_silence + sum(view.nbytes for view in views) / (sample_rate * channels * 2)
+    
+    def chunks():
+        if leading_silence > 0:
+            yield silence_bytes(leading_silence, sample_rate, channels)
+        yield from views
+    
+    runner = runner or get_ffmpeg_runner()
     try:
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, timeout=5)
-        return result.returncode == 0
-    except:
+        result = await runner.run(args, duration=duration, input_chunks=chunks())
+    except FileNotFoundError:
+        logger.error("❌ FFmpeg не найден в системе")
+        return False
+    except Exception as e:
+        logger.error(f"❌ Ошибка кодирования аудио: {e}")
         return False
+    
+    if result.ok:
+        logger.info(f"✅ Аудио закодировано ({audio_format}): {output_path}")
+        return True
+    if not result.timed_out:
+        logger.error(f"❌ Ошибка FFmpeg: {result.stderr}")
+    return False
+
+def read_playlist_segments(playlist_path: str) -> List[str]:
+    """Пути к сегментам из HLS плейлиста (в плейлисте только завершенные сегменты)"""
+    try:
+        with open(playlist_path, 'r') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    
+    playlist_dir = os.path.dirname(playlist_path)
+    return [os.path.join(playlist_dir, line) for line in lines if line and not line.startswith('#')]
+
+
+class FFmpegPipeMuxer:
+    """
+    Однопроходный мультиплексор: сырое видео и PCM аудио подаются через pipe
+    в один долгоживущий процесс FFmpeg, который сразу пишет итоговый файл.
+    
+    Видео идет в stdin, аудио - через отдельный pipe (pipe:N), поэтому
+    промежуточные _video_only.mp4 и .wav файлы не создаются.
+    
+    Если задан start_time, видео приводится к постоянной частоте кадров по
+    временным меткам, а аудио выравнивается тишиной по часам записи.
+    """
+    
+    def __init__(
+        self,
+        output_path: str,
+        fps: int = 30,
+        sample_rate: int = 48000,
+        channels: int = 1,
+        pix_fmt: str = 'bgr24',
+        video_codec: str = 'libx264',
+        preset: str = 'veryfast',
+        audio_codec: str = 'aac',
+        max_video_queue: int = 120,
+        start_time: Optional[float] = None,
+        keyframe_interval: Optional[float] = None,
+        segment_duration: Optional[float] = None,
+        video_options: Optional[list] = None
+    ):
+        self.output_path = output_path
+        self.fps = fps
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.pix_fmt = pix_fmt
+        self.video_codec = video_codec
+        self.preset = preset
+        # Готовые параметры кодировщика (профиль) вместо video_codec/preset
+        self.video_options = video_options
+        self.audio_codec = audio_codec
+        self.start_time = start_time
+        # Частые ключевые кадры позволяют точнее вырезать клипы без перекодирования
+        self.keyframe_interval = keyframe_interval
+        # Сегментированный выход: output_path - HLS плейлист, сегменты fMP4 рядом с ним
+        self.segment_duration = segment_duration
+        self.sync = ConstantFrameRateSync(fps, start_time) if start_time is not None else None
+        self._last_frame = None
+        self._audio_started = False
+        
+        self.process: Optional[subprocess.Popen] = None
+        self.frame_size: Optional[tuple] = None
+        self._video_queue = queue.Queue(maxsize=max_video_queue)
+        # Аудио никогда не отбрасываем: очередь без ограничения (PCM компактен)
+        self._audio_queue = queue.Queue()
+        self._threads = []
+        self._stderr_tail = deque(maxlen=50)
+        
+        self.video_frames_written = 0
+        self.video_frames_dropped = 0
+        self.audio_bytes_written = 0
+        self.audio_bytes_queued = 0
+        self.error: Optional[str] = None
+    
+    @staticmethod
+    def is_supported() -> bool:
+        """Передача дополнительного pipe в FFmpeg требует POSIX (pass_fds)"""
+        return os.name == 'posix' and check_ffmpeg_available()
+    
+    @property
+    def is_started(self) -> bool:
+        return self.process is not None
+    
+    def _output_options(self) -> list:
+        # Сегмент может начаться только с ключевого кадра
+        intervals = [i for i in (self.keyframe_interval, self.segment_duration) if i]
+        options = ['-force_key_frames', f'expr:gte(t,n_forced*{min(intervals)})'] if intervals else []
+        
+        if self.segment_duration:
+            # Завершенный сегмент сразу попадает на диск и в плейлист (temp_file - без недописанных
+            # сегментов), поэтому после падения процесса остаются все сегменты, кроме текущего
+            segment_dir = os.path.dirname(self.output_path)
+            options += [
+                '-f', 'hls',
+                '-hls_time', str(self.segment_duration),
+                '-hls_list_size', '0',
+                '-hls_playlist_type', 'event',
+                '-hls_segment_type', 'fmp4',
+                '-hls_fmp4_init_filename', 'init.mp4',
+                '-hls_flags', 'independent_segments+temp_file',
+                '-hls_segment_filename', os.path.join(segment_dir, 'segment_%05d.m4s')
+            ]
+        
+        return options + [self.output_path]
+    
+    def completed_segments(self) -> List[str]:
+        """Сегменты, уже записанные на диск (для обработки до конца записи)"""
+        if not self.segment_duration:
+            return []
+        return read_playlist_segments(self.output_path)
+    
+    def _build_command(self, width: int, height: int, audio_fd: int) -> list:
+        return [
+            'ffmpeg',
+            '-loglevel', 'error',
+            '-y',
+            # Вход 0: сырое видео из stdin
+            '-f', 'rawvideo',
+            '-pix_fmt', self.pix_fmt,
+            '-s', f'{width}x{height}',
+            '-r', str(self.fps),
+            '-i', 'pipe:0',
+            # Вход 1: PCM s16le из дополнительного pipe
+            '-f', 's16le',
+            '-ar', str(self.sample_rate),
+            '-ac', str(self.channels),
+            '-i', f'pipe:{audio_fd}',
+            '-map', '0:v',
+            '-map', '1:a',
+            *(self.video_options or ['-c:v', self.video_codec, '-preset', self.preset]),
+            '-pix_fmt', 'yuv420p',
+            '-c:a', self.audio_codec,
+            *self._output_options()
+        ]
+    
+    def start(self, width: int, height: int):
+        """Запустить FFmpeg, когда известно разрешение видео"""
+        audio_read_fd, audio_write_fd = os.pipe()
+        cmd = self._build_command(width, height, audio_read_fd)
+        logger.info(f"Выполняем: {' '.join(cmd)}")
+        
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                pass_fds=(audio_read_fd,)
+            )
+        finally:
+            # Читающий конец теперь принадлежит FFmpeg
+            os.close(audio_read_fd)
+        
+        self.frame_size = (width, height)
+        audio_pipe = os.fdopen(audio_write_fd, 'wb')
+        
+        self._threads = [
+            threading.Thread(target=self._pump, args=(self._video_queue, self.process.stdin, 'video'), daemon=True),
+            threading.Thread(target=self._pump, args=(self._audio_queue, audio_pipe, 'audio'), daemon=True),
+            threading.Thread(target=self._drain_stderr, daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+    
+    def _pump(self, source: queue.Queue, pipe, kind: str):
+        """Переливать данные из очереди в pipe FFmpeg (отдельный поток на каждый вход)"""
+        try:
+            while True:
+                item = source.get()
+                if item is None:
+                    break
+                if self.error is not None:
+                    continue
+                chunk, repeats = item
+                try:
+                    for _ in range(repeats):
+                        pipe.write(chunk)
+                    if kind == 'video':
+                        self.video_frames_written += repeats
+                    else:
+                        self.audio_bytes_written += len(chunk)
+                except (BrokenPipeError, OSError) as e:
+                    self.error = f"{kind} pipe: {e}"
+                    logger.error(f"❌ FFmpeg закрыл {kind} pipe: {e}")
+        finally:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+    
+    def _drain_stderr(self):
+        """Читать stderr FFmpeg, чтобы процесс не заблокировался на переполненном pipe"""
+        for line in self.process.stderr:
+            self._stderr_tail.append(line.decode(errors='replace').rstrip())
+    
+    def write_video(self, frame, timestamp: Optional[float] = None) -> bool:
+        """Поставить кадр (numpy массив в формате pix_fmt) в очередь"""
+        chunk = memoryview(frame).cast('B')
+        
+        if self.sync is not None and timestamp is not None:
+            previous_repeats, repeats = self.sync.place(timestamp)
+            if previous_repeats and self._last_frame is not None:
+                self._put_video(self._last_frame, previous_repeats)
+            if repeats == 0:
+                return False
+        else:
+            repeats = 1
+        
+        self._last_frame = chunk
+        return self._put_video(chunk, repeats)
+    
+    def _put_video(self, chunk, repeats: int) -> bool:
+        try:
+            self._video_queue.put_nowait((chunk, repeats))
+            return True
+        except queue.Full:
+            self.video_frames_dropped += repeats
+            return False
+    
+    def write_audio(self, pcm: bytes, timestamp: Optional[float] = None):
+        """Поставить PCM s16le данные в очередь (можно до start)"""
+        if not self._audio_started:
+            self._audio_started = True
+            if self.start_time is not None and timestamp is not None:
+                # Аудио началось позже записи: дополняем начало тишиной
+                self._put_audio(silence_bytes(timestamp - self.start_time, self.sample_rate, self.channels))
+        
+        self._put_audio(bytes(pcm))
+    
+    def _put_audio(self, chunk: bytes):
+        self.audio_bytes_queued += len(chunk)
+        self._audio_queue.put((chunk, 1))
+    
+    @property
+    def audio_end_time(self) -> Optional[float]:
+        """Конец аудио по часам записи (с учетом поставленных в очередь данных)"""
+        if self.start_time is None or not self.audio_bytes_queued:
+            return None
+        return self.start_time + self.audio_bytes_queued / (self.sample_rate * self.channels * 2)
+    
+    def close(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Закрыть входы, дождаться FFmpeg и вернуть путь к файлу (блокирующий вызов)"""
+        if self.process is None:
+            logger.warning("FFmpeg мультиплексор не был запущен (нет видео кадров)")
+            return None
+        
+        # Дотягиваем видео последним кадром до конца аудио (аудио - ведущие часы)
+        if self.sync is not None and self._last_frame is not None:
+            end_time = self.audio_end_time
+            if end_time is not None:
+                padding = self.sync.padding_until(end_time)
+                if padding:
+                    self._video_queue.put((self._last_frame, padding))
+        
+        self._video_queue.put(None)
+        self._audio_queue.put(None)
+        
+        # Входные потоки закрывают свои pipe сами, после чего FFmpeg дописывает файл
+        pump_threads, stderr_thread = self._threads[:2], self._threads[2]
+        for thread in pump_threads:
+            thread.join()
+        
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            logger.error("❌ Таймаут завершения FFmpeg")
+            return None
+        finally:
+            stderr_thread.join()
+        
+        if self.process.returncode != 0:
+            logger.error(f"❌ Ошибка FFmpeg: {chr(10).join(self._stderr_tail)}")
+            return None
+        
+        logger.info(f"✅ Видео с аудио создано за один проход: {self.output_path}")
+        return self.output_path
@@ -89,7 +89,8 @@ class VoiceChatDemo:
             success = await self.livekit_client.connect(
                 url=self.current_session["url"],
                 access_token=self.current_session["access_token"],
-                session_id=self.current_session["session_id"]
+                session_id=self.current_session["session_id"],
+                server_url=self.session_manager.base_url
             )
             
             if success:
@@ -148,14 +149,23 @@ class VoiceChatDemo:
                 await self.livekit_client.start_recording(task_id)
                 
                 # Отправляем текст аватару
-                await self.session_manager.send_task(
+                task_sent_at = time.time()
+                result = await self.session_manager.send_task(
                     text=llm_response,
                     task_type="repeat"
                 )
                 
-                # Ждем генерации ответа
                 logger.info("⏳ Ожидание ответа аватара...")
-                await asyncio.sleep(4.0)  # Время на генерацию + проговаривание
+                if self.livekit_client.events_connected:
+                    # Ждем окончания речи аватара по событию WebSocket (таймаут - страховка)
+                    heygen_task_id = (result or {}).get('data', {}).get('task_id')
+                    event = await self.livekit_client.wait_for_task_completion(
+                        heygen_task_id, timeout=15.0, since=task_sent_at
+                    )
+                    if not event:
+                        logger.warning("⚠️ Событие завершения ответа не получено, останавливаем по таймауту")
+                else:
+                    await asyncio.sleep(4.0)  # Время на генерацию + проговаривание
                 
                 # Останавливаем запись
                 video_file = await self.livekit_client.stop_recording()
@@ -212,6 +222,9 @@ class VoiceChatDemo:
             # Закрываем сессию с аватаром
             if self.current_session:
                 await self.session_manager.close_session()
+            
+            # Закрываем общий HTTP клиент
+            await self.session_manager.close_http_session()
                 
             logger.info("✅ Очистка завершена")
             
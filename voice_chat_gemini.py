@@ -30,8 +30,10 @@ from deepgram import (
 import google.generativeai as genai
 
 # Локальные импорты
+from heygen.config import Config
 from heygen.session_manager import HeyGenSessionManager
 from pipecat_integration.livekit_client import HeyGenLiveKitClient
+from pipecat_integration.viewer_server import ViewerFanoutServer
 
 # Настройка логирования
 logging.basicConfig(
@@ -60,6 +62,7 @@ class VoiceChatWithGemini:
         # Инициализация клиентов
         self.session_manager = HeyGenSessionManager(self.heygen_api_key)
         self.livekit_client = None
+        self.viewer_server = None
         self.current_session = None
         
         # Инициализация Deepgram
@@ -161,12 +164,13 @@ class VoiceChatWithGemini:
                 logger.error("❌ Нет активной сессии для подключения к LiveKit")
                 return False
                 
-            self.livekit_client = HeyGenLiveKitClient()
+            self.livekit_client = HeyGenLiveKitClient(recording_mode="muxed", pixel_format="i420")  # Запись всей сессии за один проход FFmpeg
             
             success = await self.livekit_client.connect(
                 url=self.current_session["url"],
                 access_token=self.current_session["access_token"],
-                session_id=self.current_session["session_id"]
+                session_id=self.current_session["session_id"],
+                server_url=self.session_manager.base_url  # WebSocket событий для индекса задач
             )
             
             if success:
@@ -174,9 +178,14 @@ class VoiceChatWithGemini:
                 
                 # Начинаем непрерывную запись сессии
                 session_task_id = f"session_{self.current_session['session_id']}"
-                await self.livekit_client.start_recording(session_task_id)
+                await self.livekit_client.start_session_recording(session_task_id)
                 logger.info("🎬 Началась непрерывная запись всей сессии")
                 
+                if Config.VIEWER_PORT:
+                    # Один декодированный поток аватара для любого числа зрителей
+                    self.viewer_server = ViewerFanoutServer(self.livekit_client, Config.VIEWER_HOST, Config.VIEWER_PORT)
+                    await self.viewer_server.start()
+                
                 return True
             else:
                 logger.error("❌ Не удалось подключиться к LiveKit")
@@ -395,14 +404,23 @@ class VoiceChatWithGemini:
                 video_file = await self.livekit_client.stop_recording()
                 if video_file:
                     logger.info(f"📹 Полная запись сессии сохранена: {video_file}")
+                    if Config.EXTRACT_TASK_CLIPS:
+                        clips = await self.livekit_client.extract_task_clips(video_file)
+                        logger.info(f"✂️ Вырезано клипов задач: {len(clips)}")
                 else:
                     logger.warning("⚠️ Запись сессии не была сохранена")
                     
+                if self.viewer_server:
+                    await self.viewer_server.stop()
+                    self.viewer_server = None
                 await self.livekit_client.disconnect()
                 
             # Закрываем сессию с аватаром
             if self.current_session:
                 await self.session_manager.close_session()
+            
+            # Закрываем общий HTTP клиент
+            await self.session_manager.close_http_session()
                 
             logger.info("✅ Очистка завершена")
             
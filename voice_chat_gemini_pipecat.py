@@ -30,8 +30,10 @@ from deepgram import (
 import google.generativeai as genai
 
 # Локальные импорты
+from heygen.config import Config
 from heygen.session_manager import HeyGenSessionManager
 from pipecat_integration.livekit_client import HeyGenLiveKitClient
+from pipecat_integration.viewer_server import ViewerFanoutServer
 
 # Настройка логирования
 logging.basicConfig(
@@ -257,6 +259,7 @@ class HeyGenAvatarProcessor(FrameProcessor):
         super().__init__()
         self.session_manager = HeyGenSessionManager(api_key)
         self.livekit_client = None
+        self.viewer_server = None
         self.current_session = None
         self.is_recording = False
         
@@ -299,12 +302,13 @@ class HeyGenAvatarProcessor(FrameProcessor):
     async def _setup_livekit(self):
         """Настройка LiveKit для записи"""
         try:
-            self.livekit_client = HeyGenLiveKitClient()
+            self.livekit_client = HeyGenLiveKitClient(recording_mode="muxed", pixel_format="i420")  # Запись всей сессии за один проход FFmpeg
             
             success = await self.livekit_client.connect(
                 url=self.current_session["url"],
                 access_token=self.current_session["access_token"],
-                session_id=self.current_session["session_id"]
+                session_id=self.current_session["session_id"],
+                server_url=self.session_manager.base_url  # WebSocket событий для индекса задач
             )
             
             if success:
@@ -312,10 +316,15 @@ class HeyGenAvatarProcessor(FrameProcessor):
                 
                 # Начинаем непрерывную запись
                 session_task_id = f"pipecat_session_{self.current_session['session_id']}"
-                await self.livekit_client.start_recording(session_task_id)
+                await self.livekit_client.start_session_recording(session_task_id)
                 self.is_recording = True
                 logger.info("🎬 Началась непрерывная запись сессии (Pipecat-style)")
                 
+                if Config.VIEWER_PORT:
+                    # Один декодированный поток аватара для любого числа зрителей
+                    self.viewer_server = ViewerFanoutServer(self.livekit_client, Config.VIEWER_HOST, Config.VIEWER_PORT)
+                    await self.viewer_server.start()
+                
             else:
                 logger.error("❌ Не удалось подключиться к LiveKit")
                 
@@ -357,12 +366,21 @@ class HeyGenAvatarProcessor(FrameProcessor):
                 video_file = await self.livekit_client.stop_recording()
                 if video_file:
                     logger.info(f"📹 Полная запись сессии сохранена: {video_file}")
+                    if Config.EXTRACT_TASK_CLIPS:
+                        clips = await self.livekit_client.extract_task_clips(video_file)
+                        logger.info(f"✂️ Вырезано клипов задач: {len(clips)}")
                     
+                if self.viewer_server:
+                    await self.viewer_server.stop()
+                    self.viewer_server = None
                 await self.livekit_client.disconnect()
                 
             # Закрываем сессию
             if self.current_session:
                 await self.session_manager.close_session()
+            
+            # Закрываем общий HTTP клиент
+            await self.session_manager.close_http_session()
                 
             logger.info("✅ Очистка HeyGen завершена")
             